@@ -0,0 +1,166 @@
+# batch.py
+"""多进程批量模拟：把同一存档的 N 局冒险分发到进程池，并合并统计结果"""
+import json, os, random, sys, time
+from multiprocessing import Pool
+
+import dungeon
+import sim
+
+MAX_WAVE = 12  # 3层×4关
+
+# 每个工作进程各自持有的存档与策略（由 _init_worker 设置）
+_worker_save = None
+_worker_policy = None
+
+
+def run_seed(master_seed, index):
+    """第 index 局的种子只由主种子和局号决定，与工作进程数量无关"""
+    return f'{master_seed}:{index}'
+
+
+def summarize(index, result):
+    """把一局结果压缩为 (局号, 阵亡关卡, Boss击杀, 是否击败贪婪宝箱, 碎片)，通关时阵亡关卡为 0"""
+    return (index, 0 if result.cleared else result.wave,
+            result.boss_kills, result.defeated_greed, result.fragments)
+
+
+def _init_worker(save, policy):
+    global _worker_save, _worker_policy
+    _worker_save, _worker_policy = save, policy
+
+
+def _init_pool_worker(save, policy):
+    _init_worker(save, policy)
+    # 只在工作进程里替换全局 random，不与其它进程共享，每局开始前按 run_seed 重新播种
+    dungeon.rng = random.Random()
+
+
+def _run_chunk(task):
+    master_seed, start, stop = task
+    return [summarize(i, sim.simulate(_worker_save, _worker_policy, run_seed(master_seed, i)))
+            for i in range(start, stop)]
+
+
+class BatchStats:
+    """可合并的批量统计，合并顺序不影响结果"""
+    def __init__(self):
+        self.runs = 0
+        self.cleared = 0
+        self.boss_kills = 0
+        self.greed_kills = 0
+        self.fragments = 0
+        self.fragments_sq = 0
+        self.death_waves = [0] * (MAX_WAVE + 1)  # 下标为阵亡关卡，0 表示通关
+
+    def add(self, summary):
+        _, death_wave, boss_kills, greed, fragments = summary
+        self.runs += 1
+        self.cleared += death_wave == 0
+        self.boss_kills += boss_kills
+        self.greed_kills += greed
+        self.fragments += fragments
+        self.fragments_sq += fragments * fragments
+        self.death_waves[death_wave] += 1
+
+    def merge(self, other):
+        self.runs += other.runs
+        self.cleared += other.cleared
+        self.boss_kills += other.boss_kills
+        self.greed_kills += other.greed_kills
+        self.fragments += other.fragments
+        self.fragments_sq += other.fragments_sq
+        self.death_waves = [a + b for a, b in zip(self.death_waves, other.death_waves)]
+
+    def to_dict(self):
+        """将统计转换为可序列化的字典"""
+        runs = self.runs or 1
+        mean = self.fragments / runs
+        return {
+            'runs': self.runs,
+            'clear_rate': self.cleared / runs,
+            'avg_boss_kills': self.boss_kills / runs,
+            'greed_kill_rate': self.greed_kills / runs,
+            'avg_fragments': mean,
+            'fragments_std': max(0.0, self.fragments_sq / runs - mean * mean) ** 0.5,
+            'death_waves': {wave: n for wave, n in enumerate(self.death_waves) if wave and n},
+        }
+
+
+def run_batch(save, runs, master_seed=0, workers=None, policy=None, chunk_size=250, keep_runs=False):
+    """并行模拟 runs 局，返回 (BatchStats, 按局号排序的摘要列表或 None)
+
+    每局的种子由 master_seed 和局号推导，因此无论 workers 取多少结果都相同。
+    """
+    # 模拟不读写仓库（sim.simulate 同样丢弃它），仓库也可能是 EquipmentRows 等视图，不传给工作进程
+    save = dict(save, equipment_storage=[])
+    policy = policy or sim.Policy()
+    workers = workers or os.cpu_count() or 1
+    tasks = [(master_seed, start, min(start + chunk_size, runs))
+             for start in range(0, runs, chunk_size)]
+    stats = BatchStats()
+    summaries = [] if keep_runs else None
+
+    def consume(chunk):
+        for summary in chunk:
+            stats.add(summary)
+        if keep_runs:
+            summaries.extend(chunk)
+
+    if workers == 1:
+        # 在调用方的进程里模拟：每局会重新播种 dungeon.rng，结束后恢复原来的状态
+        _init_worker(save, policy)
+        state = dungeon.rng.getstate()
+        try:
+            for task in tasks:
+                consume(_run_chunk(task))
+        finally:
+            dungeon.rng.setstate(state)
+    else:
+        with Pool(workers, initializer=_init_pool_worker, initargs=(save, policy)) as pool:
+            for chunk in pool.imap_unordered(_run_chunk, tasks):
+                consume(chunk)
+
+    if keep_runs:
+        summaries.sort()
+    return stats, summaries
+
+
+def _apply_overrides(save, shop, talents):
+    """把命令行上的 key=level 覆盖写入存档副本（不含装备仓库），用于参数扫描"""
+    save = json.loads(json.dumps(dict(save, equipment_storage=[])))
+    for item in shop:
+        key, level = item.split('=')
+        save['shop'][key] = int(level)
+    for item in talents:
+        path, level = item.split('=')
+        class_name, talent_name = path.split('.')
+        save['talent_tree'][class_name][talent_name] = int(level)
+    return save
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='多进程批量模拟冒险')
+    parser.add_argument('-n', '--runs', type=int, default=10000, help='模拟局数')
+    parser.add_argument('--seed', type=int, default=0, help='主种子')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='进程数（默认 CPU 核数）')
+    parser.add_argument('--mage', action='store_true', help='使用法师（默认战士）')
+    parser.add_argument('--danger', action='store_true', help='始终选择危险通道')
+    parser.add_argument('--shop', action='append', default=[], metavar='KEY=LV',
+                        help='覆盖商店等级，如 atk+5=3')
+    parser.add_argument('--talent', action='append', default=[], metavar='CLASS.NAME=LV',
+                        help='覆盖天赋等级，如 warrior.strength=2')
+    args = parser.parse_args(argv)
+
+    save = _apply_overrides(dungeon.load_save(), args.shop, args.talent)
+    policy = sim.Policy('2' if args.mage else '1', '2' if args.danger else '1')
+    start = time.perf_counter()
+    stats, _ = run_batch(save, args.runs, args.seed, args.workers, policy)
+    elapsed = time.perf_counter() - start
+
+    print(json.dumps(stats.to_dict(), ensure_ascii=False, indent=2))
+    print(f'{args.runs} 局，用时 {elapsed:.2f}s（{args.runs / elapsed:.0f} 局/秒）', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
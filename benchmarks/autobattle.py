@@ -0,0 +1,93 @@
+# benchmarks/autobattle.py
+"""自动战斗基准：同样的种子和策略下，逐回合作答与自动战斗每局需要的输入往返和绘制次数
+
+"往返" 是等待玩家的 ask 和 pause 调用，"绘制" 是交互式终端会重画战斗画面的次数
+（进入和结束战斗、战斗中的每次 ask 与 pause）。两种方式的决策相同，结局也应完全一致。
+自动战斗分三档：只自动战斗和换装（--auto），再加上自动选路线（--auto-path），再加上自动处理事件（--auto-events）。
+"""
+import os, sys, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import dungeon
+import sim
+
+
+class CountingUI(sim.HeadlessUI):
+    """统计往返与绘制次数的无头界面"""
+    def __init__(self, policy):
+        super().__init__(policy)
+        self.round_trips = 0
+        self.redraws = 0
+        self.lines = 0
+        self._in_battle = False
+
+    def say(self, *args, **kwargs):
+        self.lines += 1
+
+    def log(self, name, **fields):
+        self.lines += 1
+
+    def battle(self, title, *entities):
+        self._in_battle = True
+        self.redraws += 1
+
+    def end_battle(self):
+        self._in_battle = False
+        self.redraws += 1
+
+    def ask(self, kind, prompt, **ctx):
+        self.round_trips += 1
+        self.redraws += self._in_battle
+        return super().ask(kind, prompt, **ctx)
+
+    def pause(self, prompt=''):
+        self.round_trips += 1
+        self.redraws += self._in_battle
+
+
+def measure(save, policy, runs, kinds=None):
+    """返回 (每局往返次数, 每局绘制次数, 每局输出行数, 每局毫秒数, 各局结局)；kinds 为 None 时逐回合作答"""
+    trips = redraws = lines = 0
+    results = []
+    start = time.perf_counter()
+    for i in range(runs):
+        inner = CountingUI(policy)
+        ui = inner if kinds is None else sim.AutoBattleUI(inner, policy, kinds)
+        result = sim.simulate(save, seed=i, ui=ui)
+        ui.clear()  # 回到主菜单时的清屏，自动战斗在这里写出最后的汇总
+        results.append(vars(result))
+        trips += inner.round_trips
+        redraws += inner.redraws
+        lines += inner.lines
+    elapsed = time.perf_counter() - start
+    return trips / runs, redraws / runs, lines / runs, elapsed / runs * 1000, results
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='比较逐回合作答与自动战斗的输入往返次数')
+    parser.add_argument('-n', '--runs', type=int, default=500, help='模拟局数')
+    parser.add_argument('--mage', action='store_true', help='使用法师（默认战士）')
+    args = parser.parse_args(argv)
+
+    save = dungeon.new_save()
+    save['shop'] = {'atk+5': 8, 'hp+20': 10, 'potion+1': 5}  # 与 suite.py 的整局基准相同，能打满 12 关
+    policy = sim.Policy('2' if args.mage else '1')
+    auto = sim.AutoBattleUI.AUTO_KINDS
+    path = auto + sim.AutoBattleUI.PATH_KINDS
+    modes = [('逐回合', None), ('--auto', auto), ('+路线', path), ('+路线和事件', path + sim.AutoBattleUI.EVENT_KINDS)]
+    rows = [(name, measure(save, policy, args.runs, kinds)) for name, kinds in modes]
+    manual = rows[0][1]
+    if any(row[4] != manual[4] for _, row in rows):
+        print('自动战斗与逐回合作答的结局不一致', file=sys.stderr)
+        return 1
+    print(f'{args.runs} 局，每局平均（倍数为逐回合的往返、往返加绘制分别是该方式的几倍）：')
+    print(f'{"":<12}{"往返":>8}{"绘制":>8}{"输出行":>8}{"耗时":>10}{"往返倍数":>10}{"合计倍数":>10}')
+    for name, (trips, redraws, lines, ms, _) in rows:
+        print(f'{name:<12}{trips:>8.1f}{redraws:>8.1f}{lines:>8.1f}{ms:>8.2f}ms'
+              f'{manual[0] / trips:>10.1f}{(manual[0] + manual[1]) / (trips + redraws):>10.1f}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
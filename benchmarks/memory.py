@@ -0,0 +1,123 @@
+# benchmarks/memory.py
+"""内存基准：每个对象的字节数，以及批量模拟和大量对象常驻时进程的峰值 RSS
+
+每项测量都在新起的解释器里进行，互不影响峰值。先在 --baseline 指定的提交上测一遍
+（用 git archive 导出到临时目录，默认是加 __slots__ 之前的 c5cdb44），再测当前工作区，
+最后逐项列出基线、当前值和两者之比。--baseline '' 只测当前工作区。
+
+    python benchmarks/memory.py
+    python benchmarks/memory.py --runs 5000 --objects 200000 --baseline HEAD~3
+"""
+import json, os, shutil, subprocess, sys, tempfile, tracemalloc, unicodedata
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE = 'c5cdb44'
+
+
+def measure(factory, n):
+    """返回 factory() 创建 n 个对象后每个对象平均占用的字节数"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = [factory() for _ in range(n)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    # 扣除保存对象引用的列表本身
+    return (after - before - sys.getsizeof(objects)) / n
+
+
+def pad(text, width):
+    """按终端显示宽度左对齐，中文字符占两格"""
+    shown = sum(2 if unicodedata.east_asian_width(ch) in 'WF' else 1 for ch in text)
+    return text + ' ' * max(width - shown, 0)
+
+
+def peak_rss():
+    """本进程到目前为止的峰值 RSS（MB）"""
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+def child(tree, scenario, n):
+    """在 tree 目录下的游戏代码上测量一项，把 [[项目, 数值, 单位], ...] 以 JSON 打印到标准输出"""
+    sys.path.insert(0, tree)
+    try:
+        import dungeon as game
+    except ImportError:  # 拆分 dungeon.py 之前游戏本体在 rogue.py 里
+        import rogue as game
+    import batch
+    save = game.new_save() if hasattr(game, 'new_save') else game.load_save()
+    name, hp, atk, souls = game.NORMAL_NAMES[0]
+    start = peak_rss()
+    if scenario == 'sizes':
+        result = [[label, measure(factory, n), '字节/对象'] for label, factory in (
+            ('Monster', lambda: game.Monster(name, hp, atk, souls)),
+            ('Equipment(普通)', lambda: game.Equipment('武器', 0)),
+            ('Equipment(史诗)', lambda: game.Equipment('护甲', 2)),
+            ('Warrior', lambda: game.Warrior(save)),
+        )]
+    elif scenario == 'batch':
+        batch.run_batch(save, n, master_seed=1, workers=1)
+        result = [['批量模拟 峰值 RSS', peak_rss(), 'MB'], ['批量模拟 增长', peak_rss() - start, 'MB']]
+    else:
+        # 长时间模拟中常驻的大量怪物和装备
+        objects = [game.Monster(name, hp, atk, souls) for _ in range(n)]
+        objects += [game.Equipment('护甲', 2) for _ in range(n)]
+        result = [['常驻对象 峰值 RSS', peak_rss(), 'MB'], ['常驻对象 增长', peak_rss() - start, 'MB']]
+    print(json.dumps(result, ensure_ascii=False))
+
+
+def run_tree(tree, args):
+    """对 tree 依次运行各项测量，返回 {项目: (数值, 单位)}"""
+    results = {}
+    for scenario, n in (('sizes', args.n), ('batch', args.runs), ('objects', args.objects)):
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', tree, scenario, str(n)],
+                             cwd=tree, capture_output=True, text=True, encoding='utf-8', check=True).stdout
+        results.update((label, (value, unit)) for label, value, unit in json.loads(out.splitlines()[-1]))
+    return results
+
+
+def export(rev, target):
+    """把提交 rev 的代码导出到 target 目录"""
+    archive = subprocess.run(['git', 'archive', rev], cwd=ROOT, capture_output=True, check=True).stdout
+    subprocess.run(['tar', '-x', '-C', target], input=archive, check=True)
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='每对象内存占用与峰值 RSS 基准')
+    parser.add_argument('-n', type=int, default=100_000, help='统计每对象字节数时每种对象创建的数量')
+    parser.add_argument('--runs', type=int, default=20_000, help='批量模拟的局数')
+    parser.add_argument('--objects', type=int, default=1_000_000, help='常驻的怪物和装备各多少个')
+    parser.add_argument('--baseline', default=BASELINE, help='作为基线的提交，空串表示不比较')
+    parser.add_argument('--child', nargs=3, metavar=('TREE', 'SCENARIO', 'N'), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        tree, scenario, n = args.child
+        return child(tree, scenario, int(n))
+
+    current = run_tree(ROOT, args)
+    baseline = {}
+    if args.baseline:
+        tmp = tempfile.mkdtemp(prefix='memory-baseline-')
+        try:
+            export(args.baseline, tmp)
+            baseline = run_tree(tmp, args)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    print(pad('', 20) + (f'{"基线 " + args.baseline:>16}' if baseline else '') + f'{"当前":>12}'
+          + (f'{"当前/基线":>10}' if baseline else ''))
+    for label, (value, unit) in current.items():
+        line = pad(label, 20)
+        if label in baseline:
+            base = baseline[label][0]
+            ratio = f'{value / base:.2f}' if base >= 0.05 else '-'
+            line += f'{base:>16.1f}{value:>12.1f}{ratio:>10}'
+        else:
+            line += f'{value:>12.1f}'
+        print(f'{line}  {unit}')
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
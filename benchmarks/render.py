@@ -0,0 +1,88 @@
+# benchmarks/render.py
+"""渲染基准：比较战斗画面按行增量重绘与每回合整屏重画的输出字节数和耗时
+
+按固定种子模拟若干回合的战斗，每回合修改双方血量并追加两行日志，
+输出写入内存缓冲区而不是终端，只统计写出的字节数。
+每回合的耗时主要是重新渲染状态面板，另外单独测量逐行比较（BattleFrame.render）本身的耗时，
+以及转义码清屏与启动子进程执行 clear 的耗时。
+"""
+import io, os, sys, time
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import dungeon
+
+
+def fight(ui, turns, full):
+    """模拟 turns 回合，返回 (写出的字节数, 耗时秒)；full 为 True 时每回合整屏重画"""
+    save = dungeon.new_save()
+    hero = dungeon.Warrior(save)
+    buffer = io.StringIO()
+    with redirect_stdout(buffer):
+        start = time.perf_counter()
+        for turn in range(turns):
+            if turn % 20 == 0:
+                hero.hp = hero.max_hp
+                monster = dungeon.Monster(*dungeon.NORMAL_NAMES[0])
+                ui.battle('--- 第 1 层 1/4 关 [安全通道] ---', hero, monster)
+            elif full:
+                ui._frame.lines = []  # 丢掉上一帧，迫使整屏重画
+            monster.hp -= 1
+            hero.hp -= 1
+            ui.log('attack', amount=1)
+            ui.log('counter', monster=monster.name, amount=1)
+            ui.redraw()
+        ui.end_battle()
+        elapsed = time.perf_counter() - start
+    return len(buffer.getvalue().encode()), elapsed
+
+
+def diff_only(ui, turns, full):
+    """只测逐行比较：各回合的面板行预先渲染好，返回 BattleFrame.render 的总耗时秒"""
+    hero = dungeon.Warrior(dungeon.new_save())
+    monster = dungeon.Monster(*dungeon.NORMAL_NAMES[0])
+    ui.battle('--- 第 1 层 1/4 关 [安全通道] ---', hero, monster)
+    panels = []
+    for turn in range(turns):
+        hero.hp = hero.max_hp - turn % 50
+        monster.hp = dungeon.NORMAL_NAMES[0][1] - turn % 20
+        panels.append([line for entity in (hero, monster) for line in ui.panel_lines(entity)])
+    ui._frame = None
+    frame = dungeon.BattleFrame('--- 第 1 层 1/4 关 [安全通道] ---', (hero, monster))
+    start = time.perf_counter()
+    for lines in panels:
+        if full:
+            frame.lines = []
+        frame.add('造成1点伤害!')
+        frame.render(lines)
+    return time.perf_counter() - start
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='战斗画面重绘基准')
+    parser.add_argument('-n', '--turns', type=int, default=1000, help='模拟的回合数')
+    args = parser.parse_args(argv)
+
+    for label, ui in (('rich', dungeon.TerminalUI()), ('plain', dungeon.PlainUI())):
+        for mode, full in (('增量', False), ('整屏', True)):
+            size, elapsed = fight(ui, args.turns, full)
+            print(f'{label:<6}{mode}  {size / args.turns:>8.0f} 字节/回合  '
+                  f'{elapsed / args.turns * 1e6:>8.0f} µs/回合  '
+                  f'其中逐行比较 {diff_only(ui, args.turns, full) / args.turns * 1e6:>6.1f} µs')
+
+    start = time.perf_counter()
+    for _ in range(20):
+        os.system('cls' if os.name == 'nt' else 'clear >/dev/null')
+    print(f'子进程清屏  {(time.perf_counter() - start) / 20 * 1e3:.2f} ms/次')
+    start = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        for _ in range(1000):
+            ui = dungeon.TerminalUI()
+            ui.clear()
+            ui._flush()  # 清屏只是缓冲转义码，写出时才真正输出
+    print(f'转义码清屏  {(time.perf_counter() - start) / 1000 * 1e3:.4f} ms/次')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,124 @@
+# benchmarks/server_load.py
+"""多会话服务器压测：启动 server.py，同时打开大量连接模拟玩家，统计每次按键的响应延迟
+
+每个客户端登录自己的档案后不停地冒险：按提示选择职业、路线、攻击、接受事件和装备，
+阵亡后回到主菜单再开一局。每收到一个完整的输入提示先停顿约 --think 秒（模拟玩家思考），
+再发送下一行；延迟是从发出一行到收到下一个完整提示的时间。
+p95 延迟超过 --budget 毫秒时以非零状态退出。
+"""
+import asyncio, codecs, os, random, re, shutil, statistics, subprocess, sys, tempfile, time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVER = os.path.join(ROOT, 'server.py')
+
+ESCAPES = re.compile(r'\x1b\[[0-9;?]*[A-Za-z]')
+PROMPT_END = re.compile(r'(> |…|\.\.\.)$')  # 服务器只在等待输入前发送，输出以提示结尾即为完整
+# 最后一行的关键字 -> 回答，按顺序匹配；都不匹配的 "> " 提示（主菜单、职业、路线）回答 1
+ANSWERS = [
+    ('按 Enter', ''),
+    ('档案名', None),             # 回答档案名
+    ('选择(1/2)', '1'),
+    ('接受？', 'y'),
+    ('是否装备', 'y'),
+    ('是否保存', 'n'),
+    ('重新开始', 'q'),
+]
+
+
+def answer(screen, name):
+    """根据屏幕末尾的提示决定要发送的一行"""
+    if '[A]攻击' in screen[-80:]:
+        return 'A'
+    last = screen.rstrip().rsplit('\n', 1)[-1]
+    for key, reply in ANSWERS:
+        if key in last:
+            return name if reply is None else reply
+    return '1'
+
+
+async def player(host, port, name, deadline, think, latencies):
+    """一个模拟玩家，直到 deadline 为止不停地作答"""
+    reader, writer = await asyncio.open_connection(host, port)
+    decoder = codecs.getincrementaldecoder('utf-8')('replace')
+    screen, sent = '', None
+    try:
+        while time.perf_counter() < deadline:
+            data = await reader.read(65536)
+            if not data:
+                break
+            screen = (screen + ESCAPES.sub('', decoder.decode(data).replace('\r', '')))[-400:]
+            if not PROMPT_END.search(screen):
+                continue
+            if sent is not None:
+                latencies.append(time.perf_counter() - sent)
+            line = answer(screen, name)
+            screen = ''
+            await asyncio.sleep(think * random.uniform(0.5, 1.5))
+            writer.write(f'{line}\n'.encode('utf-8'))
+            await writer.drain()
+            sent = time.perf_counter()
+    finally:
+        writer.close()
+
+
+async def load(host, port, sessions, duration, think):
+    latencies = []
+    deadline = time.perf_counter() + duration
+    results = await asyncio.gather(
+        *(player(host, port, f'load{i}', deadline, think, latencies) for i in range(sessions)),
+        return_exceptions=True)
+    failed = [r for r in results if isinstance(r, Exception)]
+    return latencies, failed
+
+
+def start_server(workdir, sessions, plain):
+    """在空闲端口上启动服务器，返回 (进程, 端口)"""
+    command = [sys.executable, SERVER, '--port', '0', '--max-sessions', str(sessions),
+               '--db', os.path.join(workdir, 'load.db'), '--replay-dir', os.path.join(workdir, 'replays')]
+    if plain:
+        command.append('--plain')
+    proc = subprocess.Popen(command, stdout=subprocess.PIPE, text=True, encoding='utf-8')
+    banner = proc.stdout.readline()
+    match = re.search(r':(\d+)', banner)
+    if not match:
+        proc.kill()
+        raise RuntimeError(f'服务器启动失败：{banner!r}')
+    return proc, int(match.group(1))
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='多会话服务器压测')
+    parser.add_argument('-n', '--sessions', type=int, default=200, help='同时在线的模拟玩家数')
+    parser.add_argument('-t', '--duration', type=float, default=20.0, help='压测秒数')
+    parser.add_argument('--think', type=float, default=0.5, help='每次作答前的平均停顿秒数')
+    parser.add_argument('--plain', action='store_true', help='服务器使用纯文本界面')
+    parser.add_argument('--budget', type=float, default=100.0, help='允许的 p95 延迟毫秒数')
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='rogue-load-')
+    proc, port = start_server(workdir, args.sessions, args.plain)
+    try:
+        latencies, failed = asyncio.run(load('127.0.0.1', port, args.sessions, args.duration, args.think))
+    finally:
+        proc.terminate()
+        proc.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if not latencies:
+        print('没有收到任何响应', file=sys.stderr)
+        return 1
+    ms = sorted(x * 1000 for x in latencies)
+    p95 = ms[int(len(ms) * 0.95)]
+    print(f'{args.sessions} 个会话，{len(failed)} 个连接失败，{len(ms)} 次按键'
+          f'（{len(ms) / args.duration:,.0f} 次/秒）')
+    print(f'延迟 中位数 {statistics.median(ms):.1f} ms  p95 {p95:.1f} ms  '
+          f'p99 {ms[int(len(ms) * 0.99)]:.1f} ms  最大 {ms[-1]:.1f} ms')
+    if failed or p95 > args.budget:
+        print(f'p95 延迟超过 {args.budget:.0f} ms 或有连接失败', file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
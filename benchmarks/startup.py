@@ -0,0 +1,52 @@
+# benchmarks/startup.py
+"""启动基准：测量 `python rogue.py` 从进程启动到画出主菜单再退出的耗时
+
+每次都起一个新的解释器，向标准输入写入 7（退出），取多次运行的中位数。
+同时测量空解释器作为基线，以及 --plain 与默认 rich 界面的差别。
+纯文本模式或默认界面的中位数超过 --budget 时以非零状态退出。
+"""
+import os, statistics, subprocess, sys, time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GAME = os.path.join(ROOT, 'rogue.py')
+
+
+def measure(args, repeat):
+    """返回运行 repeat 次 args 的耗时中位数（毫秒）"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(args, input=b'7\n', stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                       cwd=ROOT, check=False)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='冷启动到主菜单的耗时基准')
+    parser.add_argument('-n', '--repeat', type=int, default=20, help='每种情况运行的次数')
+    parser.add_argument('--budget', type=float, default=100.0, help='纯文本模式和默认界面各自允许的毫秒数')
+    args = parser.parse_args(argv)
+
+    cases = [
+        ('python -c pass', [sys.executable, '-c', 'pass']),
+        ('import dungeon', [sys.executable, '-c', 'import dungeon']),
+        ('rogue.py --plain', [sys.executable, GAME, '--plain']),
+        ('rogue.py', [sys.executable, GAME]),
+    ]
+    results = {}
+    for label, command in cases:
+        measure(command, 2)  # 预热磁盘缓存
+        results[label] = measure(command, args.repeat)
+        print(f'{label:<20}{results[label]:>8.1f} ms')
+
+    over = [label for label in ('rogue.py --plain', 'rogue.py') if results[label] > args.budget]
+    if over:
+        print(f'{"、".join(over)} 启动超过 {args.budget:.0f} ms', file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,59 @@
+# benchmarks/status.py
+"""状态面板基准：1000 回合内每回合构建并渲染角色、敌人面板的耗时和内存分配
+
+"缓存" 为正常情况，status() 复用未变化的部分；"重建" 每回合清掉缓存，相当于每次从头构建。
+每回合双方各掉 1 点血，与实际战斗中每回合都会变化的内容一致。
+"""
+import io, os, sys, time, tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import dungeon
+
+
+def run(turns, cached, trace=False):
+    """返回每回合的微秒数；trace 为 True 时改为返回每回合分配的峰值字节数"""
+    from rich.console import Console
+    console = Console(file=io.StringIO(), width=80, force_terminal=True)
+    hero = dungeon.Warrior(dungeon.new_save())
+    hero.talents.append('暴击')
+    hero.equip(dungeon.Equipment('武器', 2))
+    monster = dungeon.Monster('哥布林王', 10**6, 20, 50, is_boss=True)
+    peak = elapsed = 0.0
+    if trace:
+        tracemalloc.start()
+    for turn in range(turns):
+        hero.hp = hero.max_hp - turn % hero.max_hp
+        monster.hp -= 1
+        if not cached:
+            hero._status_cache = monster._status_cache = None
+        if trace:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        console.print(hero.status())
+        console.print(monster.status())
+        elapsed += time.perf_counter() - start
+        if trace:
+            peak += tracemalloc.get_traced_memory()[1] - base
+        console.file.seek(0)
+        console.file.truncate()
+    if trace:
+        tracemalloc.stop()
+        return peak / turns
+    return elapsed / turns * 1e6
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='状态面板渲染基准')
+    parser.add_argument('-n', '--turns', type=int, default=1000, help='回合数')
+    args = parser.parse_args(argv)
+
+    run(50, True)  # 预热：导入 rich 并填充其内部缓存
+    for label, cached in (('重建', False), ('缓存', True)):
+        us, peak = run(args.turns, cached), run(args.turns, cached, trace=True)
+        print(f'{label}  {us:>8.0f} µs/回合  {peak / 1024:>8.1f} KiB 峰值分配/回合')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
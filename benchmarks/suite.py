@@ -0,0 +1,279 @@
+# benchmarks/suite.py
+"""热点基准套件：对战斗、整局模拟、装备、事件、存档读写和状态面板分别计时
+
+每项先自动确定循环次数（单个样本不少于 --min-time 秒），预热一个样本后再取 --repeat 个样本，
+以每次操作耗时的中位数作为指标。结果可写成 JSON，供不同提交之间比较：
+
+    python benchmarks/suite.py --json before.json
+    python benchmarks/suite.py --baseline before.json --threshold 0.2
+
+给出 --baseline 时，任何一项比基准慢超过 threshold（默认 20%）即以非零状态退出。
+"""
+import io, json, os, platform, shutil, statistics, sys, tempfile, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import dungeon
+import sim
+
+# 整局模拟使用的存档：商店升满一些，保证能打满 12 关
+STRONG_SHOP = {'atk+5': 8, 'hp+20': 10, 'potion+1': 5}
+
+
+def _hero():
+    hero = dungeon.Warrior(dungeon.new_save())
+    hero.talents.append('暴击')
+    hero.equip(dungeon.Equipment('武器', 2))
+    hero.equip(dungeon.Equipment('护甲', 1))
+    return hero
+
+
+def bench_combat_turn():
+    """一个攻击回合（含反击），怪物血量足够，不会结束战斗"""
+    hero = _hero()
+    monster = dungeon.Monster('木桩', 10**12, 1, 0)
+    def turn():
+        hero.hp = hero.max_hp
+        dungeon.combat_turn(hero, monster, 'A')
+    return turn
+
+
+def bench_full_run():
+    """无头模拟一整局（12 关通关）"""
+    save = dict(dungeon.new_save(), shop=dict(STRONG_SHOP))
+    policy = sim.Policy()
+    seeds = iter(range(10**9))
+    return lambda: sim.simulate(save, policy, next(seeds))
+
+
+def bench_equipment_init():
+    return lambda: dungeon.Equipment('武器', 2)
+
+
+def bench_equipment_reforge():
+    eq = dungeon.Equipment('武器', 2)
+    return eq.reforge
+
+
+def bench_equipment_reforge_until():
+    """批量重铸到暴击 ≥ 6，最多 100 次（稀有武器单次成功率 13%）"""
+    eq = dungeon.Equipment('武器', 1)
+    def reforge():
+        eq.values = dungeon.Equipment._NO_AFFIXES[:]
+        eq.reforge_until('暴击', 6, 100)
+    return reforge
+
+
+def bench_equipment_get_stats():
+    return dungeon.Equipment('武器', 2).get_stats
+
+
+def bench_equipment_from_dict():
+    data = dungeon.Equipment('护甲', 2).to_dict()
+    return lambda: dungeon.Equipment.from_dict(data)
+
+
+def bench_character_power():
+    return _hero().power
+
+
+def bench_event_select():
+    """按事件链状态取别名表并抽一个事件"""
+    flags = _hero().event_flags
+    return lambda: dungeon.event_table(flags).sample(dungeon.rng)
+
+
+def bench_random_event():
+    """完整走一次 random_event（40% 概率触发事件），角色不带装备，状态不会无限累积"""
+    hero = dungeon.Warrior(dungeon.new_save())
+    def event():
+        hero.souls = 100
+        dungeon.random_event(hero)
+    return event
+
+
+def bench_status_render():
+    """角色和敌人面板各渲染一次，每次双方血量都有变化"""
+    from rich.console import Console
+    console = Console(file=io.StringIO(), width=80, force_terminal=True)
+    hero = _hero()
+    monster = dungeon.Monster('哥布林王', 10**9, 20, 50, is_boss=True)
+    def render():
+        hero.hp = hero.hp - 1 if hero.hp > 1 else hero.max_hp
+        monster.hp -= 1
+        console.print(hero.status())
+        console.print(monster.status())
+        console.file.seek(0)
+        console.file.truncate()
+    return render
+
+
+def bench_markov_floor():
+    """清空缓存后精确求解两条路线上所有怪物的胜率（法师，带暴击和吸血，有血瓶）"""
+    import markov
+    hero = dungeon.Mage(dungeon.new_save())
+    hero.talents[:] = ['暴击', '吸血']
+    hero.items['血瓶'] = 3
+    def solve():
+        markov.model.cache_clear()
+        for path in dungeon.PATHS.values():
+            markov.floor_table(hero, path)
+    return solve
+
+
+class SaveFiles:
+    """把存档路径临时指向一个空目录，避免读写玩家真实的存档"""
+    def __enter__(self):
+        self.dir = tempfile.mkdtemp(prefix='rogue-bench-')
+        self.saved = (dungeon.SAVE_FILE, dungeon.BINARY_SAVE_FILE, dungeon.JOURNAL_FILE, dungeon.profile_store)
+        dungeon.SAVE_FILE = os.path.join(self.dir, 'save.json')
+        dungeon.BINARY_SAVE_FILE = os.path.join(self.dir, 'save.bin')
+        dungeon.JOURNAL_FILE = os.path.join(self.dir, 'save.journal')
+        dungeon.profile_store = None
+        return self
+
+    def __exit__(self, *exc):
+        dungeon.save_writer.flush()
+        dungeon.SAVE_FILE, dungeon.BINARY_SAVE_FILE, dungeon.JOURNAL_FILE, dungeon.profile_store = self.saved
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+
+def _warehouse_save(items):
+    save = dungeon.new_save()
+    dungeon.rng.seed(items)
+    save['equipment_storage'] = [
+        dungeon.Equipment(dungeon.rng.choice(dungeon.Equipment.TYPES), dungeon.rng.randint(0, 2)).to_dict()
+        for _ in range(items)]
+    return save
+
+
+def bench_save(items):
+    def factory():
+        save = _warehouse_save(items)
+        return lambda: dungeon.save_save(save)
+    factory.__doc__ = f'save_save，仓库 {items} 件'
+    return factory
+
+
+def bench_load(items):
+    def factory():
+        dungeon.save_save(_warehouse_save(items))
+        return dungeon.load_save
+    factory.__doc__ = f'load_save，仓库 {items} 件'
+    return factory
+
+
+def bench_warehouse_best():
+    """仓库 100000 件，按法师权重找出最佳武器和护甲（索引已建好）"""
+    index = dungeon.WarehouseIndex(_warehouse_save(100_000)['equipment_storage'])
+    weights = dungeon.Mage(dungeon.new_save()).affix_weights()
+    return lambda: [index.best(weights, type_) for type_ in dungeon.Equipment.TYPES]
+
+
+def bench_warehouse_open():
+    """读取仓库 100000 件的二进制存档，做首次筛选、首次按词条排序和翻页（含建立索引）"""
+    dungeon.save_save(_warehouse_save(100_000))
+    affix = dungeon.Equipment.AFFIX_NAMES[0]
+    def open_warehouse():
+        index = dungeon.warehouse_index(dungeon.load_save()['equipment_storage'])
+        index.select([('type', '武器')])
+        index.select([('type', '武器')], affix)
+        index.select([('type', '武器')], affix, 10)
+    return open_warehouse
+
+
+CASES = {
+    'combat_turn': bench_combat_turn,
+    'full_run': bench_full_run,
+    'equipment_init': bench_equipment_init,
+    'equipment_reforge': bench_equipment_reforge,
+    'equipment_reforge_until': bench_equipment_reforge_until,
+    'equipment_get_stats': bench_equipment_get_stats,
+    'equipment_from_dict': bench_equipment_from_dict,
+    'character_power': bench_character_power,
+    'event_select': bench_event_select,
+    'random_event': bench_random_event,
+    'status_render': bench_status_render,
+    'markov_floor': bench_markov_floor,
+    'warehouse_best_100000': bench_warehouse_best,
+    'warehouse_open_100000': bench_warehouse_open,
+}
+for _items in (10, 1000, 100_000):
+    CASES[f'save_save_{_items}'] = bench_save(_items)
+    CASES[f'load_save_{_items}'] = bench_load(_items)
+
+
+def measure(func, repeat, min_time):
+    """返回 (每次操作的中位耗时秒数, 最短耗时秒数, 每个样本的循环次数)"""
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        loops *= 10 if elapsed < min_time / 10 else 2
+    samples = []
+    for _ in range(repeat + 1):  # 第一个样本用于预热，不计入
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        samples.append((time.perf_counter() - start) / loops)
+    samples = samples[1:]
+    return statistics.median(samples), min(samples), loops
+
+
+def compare(results, baseline, threshold):
+    """返回比基准慢超过 threshold 的项目列表 [(名称, 基准, 当前)]"""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get('results', {}).get(name)
+        if base and result['median_us'] > base['median_us'] * (1 + threshold):
+            regressions.append((name, base['median_us'], result['median_us']))
+    return regressions
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='游戏热点基准套件')
+    parser.add_argument('-k', '--only', action='append', default=[], help='只运行名称包含该字符串的项目')
+    parser.add_argument('--repeat', type=int, default=5, help='每项取样次数')
+    parser.add_argument('--min-time', type=float, default=0.2, help='每个样本的最短秒数')
+    parser.add_argument('--json', help='把结果写入 JSON 文件')
+    parser.add_argument('--baseline', help='与之前写出的 JSON 结果比较')
+    parser.add_argument('--threshold', type=float, default=0.2, help='允许的变慢比例')
+    args = parser.parse_args(argv)
+
+    names = [name for name in CASES if not args.only or any(k in name for k in args.only)]
+    results = {}
+    # 只测游戏逻辑本身，输出一律丢弃（面板渲染项自带输出到内存的控制台）
+    dungeon.ui = sim.HeadlessUI(sim.Policy())
+    with SaveFiles():
+        for name in names:
+            func = CASES[name]()
+            median, best, loops = measure(func, args.repeat, args.min_time)
+            results[name] = {'median_us': median * 1e6, 'min_us': best * 1e6, 'loops': loops}
+            print(f'{name:<26}{median * 1e6:>14.2f} µs  (最短 {best * 1e6:.2f} µs，{loops} 次/样本)')
+
+    report = {
+        'meta': {'python': platform.python_version(), 'platform': platform.platform(),
+                 'time': time.strftime('%Y-%m-%d %H:%M:%S')},
+        'results': results,
+    }
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for name, base, now in regressions:
+            print(f'✗ {name} 变慢 {now / base - 1:.0%}：{base:.2f} → {now:.2f} µs', file=sys.stderr)
+        if regressions:
+            return 1
+        print(f'没有超过 {args.threshold:.0%} 的性能回退')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
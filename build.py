@@ -30,8 +30,8 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[],
-    hiddenimports=['rich', 'rich.console', 'rich.table', 'rich.panel', 
-                   'rich.progress', 'rich.text', 'rich.layout'],
+    hiddenimports=['rich', 'rich.console', 'rich.table', 'rich.panel',
+                   'rich.progress_bar', 'rich.text'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
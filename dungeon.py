@@ -0,0 +1,2571 @@
+# dungeon.py
+"""游戏本体：存档、装备、角色、战斗和菜单；由 rogue.py 启动，其它工具按模块导入"""
+import random, os, re, sys, textwrap, json, threading, atexit, time, struct, functools, math, itertools, operator
+import unicodedata
+from array import array
+
+# 获取当前脚本文件的绝对路径
+if getattr(sys, 'frozen', False):
+    # 如果是打包后的 exe 运行
+    SCRIPT_DIR = os.path.dirname(sys.executable)
+else:
+    # 如果是 Python 脚本运行
+    SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 存档文件路径
+SAVE_FILE = os.path.join(SCRIPT_DIR, 'save.json')
+# 仓库较大时使用的二进制快照，存在时优先于 save.json 读取
+BINARY_SAVE_FILE = os.path.join(SCRIPT_DIR, 'save.bin')
+# 存档日志：两次快照之间的增量变更逐行追加在这里
+JOURNAL_FILE = os.path.join(SCRIPT_DIR, 'save.journal')
+# 最近一局冒险的种子和全部输入，可用 replay.py 重放
+REPLAY_FILE = os.path.join(SCRIPT_DIR, 'last_run.replay')
+# --instrument 写出的分阶段耗时统计与 --cprofile 写出的 cProfile 结果
+PROFILE_FILE = os.path.join(SCRIPT_DIR, 'session_profile.json')
+CPROFILE_FILE = os.path.join(SCRIPT_DIR, 'session.prof')
+
+# 创建游戏目录（如果不存在）
+os.makedirs(SCRIPT_DIR, exist_ok=True)
+
+# 颜色主题
+COLORS = {
+    'damage': '[red]{}[/red]',
+    'heal': '[green]{}[/green]',
+    'event': '[yellow]{}[/yellow]',
+    'normal': '[white]{}[/white]',
+    'rare': '[blue]{}[/blue]',
+    'epic': '[purple]{}[/purple]',
+    'boss': '[red bold]{}[/red bold]',
+    'elite': '[yellow bold]{}[/yellow bold]',
+    'soul': '[cyan]{}[/cyan]',
+    'item': '[green]{}[/green]',
+}
+
+# ---------- 输入输出 ----------
+CLEAR_SCREEN = '\033[H\033[2J\033[3J'  # 光标回到左上角、清屏并清空回滚缓冲区
+
+# 战斗日志：游戏逻辑用 ui.log(名字, **字段) 记一条带类型的记录，由 ui 决定如何呈现。
+# 名字 -> (记录类型, 显示模板)；类型有 damage/heal/crit/thorns/flee/drop/upgrade/event，
+# 交互界面按模板渲染（含 [ 的模板带 rich 标记），无头模拟直接丢弃或按 JSONL 写出字段。
+LOG_MESSAGES = {
+    # 战斗
+    'attack': ('damage', '造成[red bold]{amount}[/red bold]点伤害!'),
+    'magic': ('damage', '✨ 魔法飞弹！额外 {amount} 点伤害'),
+    'counter': ('damage', '{monster}反击{amount}点伤害!'),
+    'crit': ('crit', '⚡暴击!'),
+    'thorns': ('thorns', '⚔ 反弹{amount}点伤害!'),
+    'potion': ('heal', '🧪 使用血瓶，恢复 {amount} HP!'),
+    'lifesteal': ('heal', '吸血恢复{amount}HP'),
+    'flee': ('flee', '成功逃跑!'),
+    'flee_failed': ('flee', '逃跑失败!'),
+    # 击杀与掉落
+    'kill': ('drop', '\n{monster}被击败!'),
+    'souls': ('drop', '💀 获得 {amount} 灵魂，当前 {total}'),
+    'potion_drop': ('drop', '🧪 获得血瓶×1!'),
+    'boss_potion': ('drop', '🧪 Boss 必掉血瓶×1!'),
+    'greed_potions': ('drop', '💎 击败贪婪宝箱！获得3个血瓶！'),
+    'equipment': ('drop', '\n{title}：\n{item}'),
+    # 成长
+    'talent': ('upgrade', '✨ 获得天赋：{talent}'),
+    'attribute': ('upgrade', '📈 属性提升：{attr}+1'),
+    # 事件结果
+    'spring': ('event', '💧 生命值已回满，但失去了所有血瓶！'),
+    'treasure_potions': ('event', '🎁 获得 {count} 个血瓶！'),
+    'treasure_souls': ('event', '💀 获得 {amount} 灵魂！'),
+    'merchant': ('event', '🛒 购买血瓶×1'),
+    'altar_power': ('event', '⚔️ 获得永久攻击加成！'),
+    'altar_curse': ('event', '💀 失去{amount}生命值，获得诅咒加成！\n当前诅咒等级：{level}'),
+    'demon_pact': ('event', '👿 你与恶魔达成契约！攻击翻倍，但更容易受伤...'),
+    'demon_refused': ('event', '你拒绝了恶魔的诱惑。'),
+    'redemption': ('event', '� 你获得了天使的救赎！所有诅咒被移除。'),
+    'fallen': ('event', '😈 你选择了堕落之路...'),
+    'blessing': ('event', '天使给予你祝福！\n😇 获得天使祝福：最大生命值+20'),
+    'mirror_empty': ('event', '你没有装备，镜像无法生效！'),
+    'mirror_boost': ('event', '✨ {item}的{affix}词条得到了强化！'),
+    'mirror_hurt': ('event', '💔 镜像伤害了你！损失{amount}生命值'),
+}
+
+
+def _enable_ansi():
+    """Windows 控制台默认不解析转义码，打开虚拟终端模式；其它系统无需处理"""
+    if os.name == 'nt':
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        kernel32.SetConsoleMode(kernel32.GetStdHandle(-11), 7)
+
+
+class BattleFrame:
+    """战斗画面：标题、角色面板、敌人面板和战斗日志固定在屏幕上
+
+    每次重绘只重写和上一帧不同的行，布局高度变化时才整屏重画。
+    """
+    LOG_LINES = 8  # 战斗日志区域显示的行数
+
+    def __init__(self, title, entities):
+        self.title = title
+        self.entities = entities
+        self.log = []
+        self.lines = []  # 上一帧写到屏幕上的各行
+
+    def add(self, text):
+        self.log.extend(text.split('\n'))
+        del self.log[:-self.LOG_LINES]
+
+    def render(self, panels):
+        """根据面板行生成本帧的输出，返回需要写到终端的字符串"""
+        log = self.log + [''] * (self.LOG_LINES - len(self.log))
+        lines = [self.title, *panels, '', *log]
+        previous = self.lines
+        out = []
+        if len(lines) != len(previous):
+            out.append(CLEAR_SCREEN)
+            previous = []
+        for row, line in enumerate(lines, 1):
+            if row > len(previous) or previous[row - 1] != line:
+                out.append(f'\033[{row};1H{line}\033[K')
+        # 光标停在画面下方，之后的输入提示从这里开始
+        out.append(f'\033[{len(lines) + 1};1H\033[J')
+        self.lines = lines
+        return ''.join(out)
+
+
+class TerminalUI:
+    """交互式终端：决策来自键盘输入，信息用 rich 渲染到屏幕
+
+    rich 导入较慢，第一次渲染时才导入；主菜单的面板直接按 rich 的样式画出，第一屏不需要 rich。
+    清屏和战斗画面的重绘都直接写转义码，不启动子进程。
+    输出写到 file（为 None 时是 sys.stdout），输入由 _read 读取，网络会话只需替换这两处。
+    say、log 的输出先缓冲，等待输入时连同提示一次写出；清屏前未写出的内容直接丢弃。
+    """
+    headless = False  # 无头模式下不渲染任何内容
+    persist = True    # 是否把结算写入存档文件
+    file = None       # 输出流
+    width = None      # 终端列数，为 None 时按 rich 的方式检测
+    replay_file = REPLAY_FILE  # 本会话的回放文件
+    _console = None
+    _frame = None     # 进行中的战斗画面
+    _panels = None    # 本场战斗中各角色/怪物的面板及其渲染结果，面板没变时不再渲染
+    _pending = None   # 尚未写出的文本
+    _ansi_ready = False
+
+    @property
+    def console(self):
+        if self._console is None:
+            from rich.console import Console
+            self._console = Console(file=self.file)
+        return self._console
+
+    def say(self, *args, sep=' ', end='\n'):
+        self._emit(sep.join(map(str, args)), end)
+
+    def log(self, name, **fields):
+        """记一条战斗日志，按 LOG_MESSAGES 中的模板渲染"""
+        template = LOG_MESSAGES[name][1]
+        text = template.format(**fields)
+        self._emit(self.markup(text) if '[' in template else text)
+
+    def markup(self, msg):
+        """把 rich 标记渲染为带转义码的字符串"""
+        with self.console.capture() as capture:
+            self.console.print(msg, end='')
+        return capture.get()
+
+    def panel_lines(self, entity):
+        """角色/怪物状态面板渲染后的各行；status() 返回的还是上次那个面板时直接复用渲染结果"""
+        panel = entity.status()
+        cached = self._panels.get(id(entity))
+        if cached is None or cached[0] is not panel:
+            cached = self._panels[id(entity)] = (panel, self.markup(panel).rstrip('\n').split('\n'))
+        return cached[1]
+
+    def menu(self, title, options, show_souls=None):
+        """渲染带编号选项的菜单面板
+
+        面板与 rich 的 Panel(Table) 输出相同，但直接拼出边框，不导入 rich；
+        内容超出宽度需要折行，或终端不支持 UTF-8 边框时才交给 rich。
+        """
+        rows = []
+        if show_souls is not None:
+            rows += [f'[cyan]当前灵魂碎片：{show_souls}[/cyan]', '']
+        rows += [f'[green]{idx})[/green] {option}' for idx, option in enumerate(options, 1)]
+        width = self.columns()
+        # 圆角边框、左右各 1 列面板内边距和 1 列表格内边距，标题两侧各留一个空格和一段横线
+        widths = [cell_width(_MARKUP.sub('', row)) for row in rows]
+        encoding = getattr(self.file or sys.stdout, 'encoding', None) or ''
+        if max(widths) > width - 6 or cell_width(title) > width - 6 or not encoding.lower().startswith('utf'):
+            self._rich_menu(title, rows)
+            return
+        side = width - 6 - cell_width(title)
+        lines = ['╭─' + '─' * (side // 2) + ' ' + ansi(f'[bold cyan]{title}[/bold cyan]') + ' '
+                 + '─' * (side - side // 2) + '─╮']
+        lines += [f'│  {ansi(row)}' + ' ' * (width - 4 - cells) + '│' for row, cells in zip(rows, widths)]
+        lines.append('╰' + '─' * (width - 2) + '╯')
+        self._emit('\n'.join(lines))
+
+    def _rich_menu(self, title, rows):
+        from rich.table import Table
+        from rich.panel import Panel
+        menu = Table(show_header=False, box=None)
+        menu.add_column("Option")
+        for row in rows:
+            menu.add_row(row)
+        self._flush()
+        self.console.print(Panel(menu, title=f"[bold cyan]{title}[/bold cyan]"))
+
+    def columns(self):
+        """终端列数：与 rich 的 Console 检测方式相同，COLUMNS 环境变量优先，其次是标准流所在的终端，默认 80"""
+        if self.width:
+            return self.width
+        if self._console is not None:
+            return self._console.width
+        columns = os.environ.get('COLUMNS', '')
+        if columns.isdigit():
+            return int(columns)
+        for fd in (0, 1, 2):
+            try:
+                return os.get_terminal_size(fd).columns or 80
+            except (AttributeError, ValueError, OSError):
+                pass
+        return 80
+
+    def battle(self, title, *entities):
+        """进入战斗画面，结束前的输出都写进战斗日志区域；第一帧在等待输入时清屏画出"""
+        self._pending = None
+        self._frame = BattleFrame(title, entities)
+        self._panels = {}
+
+    def end_battle(self):
+        """画出最后一帧，和之后的输出一起缓冲，恢复为逐行输出"""
+        if self._frame:
+            self._pending = [self._render_frame()]
+            self._frame = None
+
+    def redraw(self, tail=''):
+        """重绘战斗画面，tail 紧接在画面之后一起写出（例如输入提示）"""
+        self._write(self._render_frame() + tail)
+
+    def _render_frame(self):
+        frame = self._frame
+        panels = [line for entity in frame.entities for line in self.panel_lines(entity)]
+        return frame.render(panels)
+
+    def ask(self, kind, prompt, **ctx):
+        """请求一个决策，kind 为决策类型，ctx 为决策时可参考的上下文"""
+        self._show_prompt(prompt.lstrip('\n') if self._frame else prompt)
+        return self._read('')
+
+    def pause(self, prompt='按 Enter 继续…'):
+        self._show_prompt(prompt)
+        self._read('')
+
+    def _show_prompt(self, prompt):
+        """等待输入前把战斗画面或缓冲的输出连同提示一次写出"""
+        if self._frame:
+            self.redraw(prompt)
+        else:
+            self._flush(prompt)
+
+    def clear(self):
+        self._pending = [CLEAR_SCREEN]  # 之前没写出的内容反正会被清掉
+
+    def _emit(self, text, end='\n'):
+        """战斗中写进战斗日志区域，否则缓冲到下一次等待输入"""
+        if self._frame:
+            self._frame.add(text)
+        elif self._pending is None:
+            self._pending = [text, end]
+        else:
+            self._pending += (text, end)
+
+    def _flush(self, tail=''):
+        """把缓冲的输出和 tail 一次写出"""
+        if self._pending:
+            tail = ''.join(self._pending) + tail
+            self._pending = None
+        if tail:
+            self._write(tail)
+
+    def _read(self, prompt):
+        return input(prompt)
+
+    def _write(self, text):
+        if not self._ansi_ready:
+            _enable_ansi()
+            self._ansi_ready = True
+        out = self.file or sys.stdout
+        out.write(text)
+        out.flush()
+
+
+# rich 标记到 ANSI 转义码的对照，纯文本模式只支持游戏里用到的这些样式
+ANSI_CODES = {
+    'bold': '1', 'red': '31', 'green': '32', 'yellow': '33',
+    'blue': '34', 'purple': '35', 'cyan': '36', 'white': '37',
+}
+_MARKUP = re.compile(r'\[(/?)([a-z ]+)\]')
+
+
+def ansi(markup):
+    """把 [red bold]…[/red bold] 形式的标记转换为 ANSI 转义码，不认识的标记原样保留"""
+    def replace(match):
+        if match.group(1):
+            return '\033[0m'
+        codes = [ANSI_CODES.get(word) for word in match.group(2).split()]
+        if None in codes:
+            return match.group(0)
+        return f'\033[{";".join(codes)}m'
+    return _MARKUP.sub(replace, markup)
+
+
+def cell_width(text):
+    """文本在终端上占的列数：全角和宽字符占两列"""
+    return sum(2 if unicodedata.east_asian_width(ch) in 'WF' else 1 for ch in text)
+
+
+def hp_bar(current, maximum, width=20):
+    """用方块字符画血条"""
+    filled = round(width * max(0, current) / maximum) if maximum else 0
+    return '█' * filled + '░' * (width - filled)
+
+
+class CachedRenderable:
+    """包装一个构建后不再修改的 rich 渲染对象，按宽度缓存渲染结果，重复绘制时直接输出缓存的片段"""
+    __slots__ = ('renderable', '_width', '_lines', '_measure')
+
+    def __init__(self, renderable):
+        self.renderable = renderable
+        self._width = None
+        self._lines = None
+        self._measure = None
+
+    def __rich_measure__(self, console, options):
+        if self._measure is None or self._measure[0] != options.max_width:
+            from rich.measure import Measurement
+            self._measure = (options.max_width, Measurement.get(console, options, self.renderable))
+        return self._measure[1]
+
+    def __rich_console__(self, console, options):
+        from rich.segment import Segment
+        if self._width != options.max_width:
+            self._lines = console.render_lines(self.renderable, options, pad=False)
+            self._width = options.max_width
+        new_line = Segment.line()
+        for line in self._lines:
+            yield from line
+            yield new_line
+
+
+def status_table(rows):
+    """状态面板用的无边框表格，第一列是固定宽度的加粗标签"""
+    from rich.table import Table
+    table = Table(show_header=False, box=None)
+    table.add_column("Key", style="bold cyan", width=4)
+    for _ in range(max(map(len, rows)) - 1):
+        table.add_column("Value")
+    for row in rows:
+        table.add_row(*row)
+    return table
+
+
+class PlainUI(TerminalUI):
+    """纯文本终端（--plain）：直接输出 ANSI 转义码，完全不导入 rich"""
+
+    def markup(self, msg):
+        return ansi(str(msg))
+
+    def panel_lines(self, entity):
+        if isinstance(entity, Character):
+            return self._hero_lines(entity)
+        return self._monster_lines(entity)
+
+    def menu(self, title, options, show_souls=None):
+        lines = [f'[bold cyan]== {title} ==[/bold cyan]']
+        if show_souls is not None:
+            lines += [f'[cyan]当前灵魂碎片：{show_souls}[/cyan]', '']
+        lines += [f'[green]{idx})[/green] {option}' for idx, option in enumerate(options, 1)]
+        self._emit(ansi('\n'.join(lines)))
+
+    def _hero_lines(self, hero):
+        ratio = hero.hp / hero.max_hp
+        color = 'green' if ratio > 0.5 else 'yellow' if ratio > 0.25 else 'red'
+        lines = [
+            '== 角色状态 ==',
+            f'[bold cyan]角色[/bold cyan] [bold]{hero.name}[/bold]',
+            f'[bold cyan]生命[/bold cyan] [{color}]{hp_bar(hero.hp, hero.max_hp)}[/{color}] {hero.hp}/{hero.max_hp}',
+            f'[bold cyan]攻击[/bold cyan] {hero.power()}',
+            '[bold cyan]天赋[/bold cyan] ' + ' '.join(f'[cyan]{t}[/cyan]' for t in hero.talents),
+            '[bold cyan]属性[/bold cyan] ' + ' '.join(f'{k}:{v}' for k, v in hero.attrs.items()),
+            '[bold cyan]道具[/bold cyan] ' + ' '.join(f'{k}×{v}' for k, v in hero.items.items()),
+        ]
+        for slot, eq in hero.equipment.items():
+            if eq:
+                color = ['white', 'blue', 'purple'][eq.rarity]
+                lines.append(f'[bold cyan]装备[/bold cyan] [{color}]{slot}: {eq.type}[/{color}]')
+        return [ansi(line) for line in lines]
+
+    def _monster_lines(self, monster):
+        prefix = '👹BOSS' if monster.is_boss else '👾ELITE' if monster.is_elite else '👾'
+        style = 'red bold' if monster.is_boss else 'yellow bold' if monster.is_elite else 'white'
+        return ['== 敌人状态 ==',
+                ansi(f'[{style}]{prefix} {monster.name}  HP: {monster.hp}  ATK: {monster.atk}[/{style}]')]
+
+
+# 当前会话的输入输出，无头模拟时会被替换
+ui = TerminalUI()
+
+# 游戏内所有随机数都来自这个实例，模拟时可按局重新播种或替换
+rng = random.Random()
+
+
+class SessionLocal:
+    """线程局部代理：属性访问转发给当前线程 bind() 的对象，未绑定的线程使用 default
+
+    多会话服务器调用 enable_sessions() 后，ui、rng、profile_store 都换成这个代理，
+    每个会话线程绑定自己的一份，游戏逻辑照常使用模块级名字。单机游戏不经过代理。
+    """
+    __slots__ = ('_local', '_default')
+
+    def __init__(self, default):
+        self._local = threading.local()
+        self._default = default
+
+    def bind(self, obj):
+        """把当前线程绑定到 obj，返回原来绑定的对象"""
+        previous = self.get()
+        self._local.obj = obj
+        return previous
+
+    def get(self):
+        return getattr(self._local, 'obj', self._default)
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+
+def enable_sessions():
+    """把 ui、rng、profile_store 换成 SessionLocal，之后每个线程可以运行独立的游戏会话"""
+    global ui, rng, profile_store
+    if not isinstance(ui, SessionLocal):
+        ui, rng, profile_store = SessionLocal(ui), SessionLocal(rng), SessionLocal(profile_store)
+
+
+def session_ui():
+    """当前会话实际使用的 ui 对象"""
+    return ui.get() if isinstance(ui, SessionLocal) else ui
+
+
+def set_ui(new):
+    """替换当前会话的 ui，返回原来的 ui；启用多会话时只影响当前线程"""
+    global ui
+    if isinstance(ui, SessionLocal):
+        return ui.bind(new)
+    previous, ui = ui, new
+    return previous
+
+
+class AliasTable:
+    """Vose 别名法加权抽样表：构建 O(n)，每次抽样只需一个随机数、O(1) 时间"""
+    __slots__ = ('items', '_prob', '_alias')
+
+    def __init__(self, items, weights):
+        n = len(items)
+        total = sum(weights)
+        scaled = [w * n / total for w in weights]
+        self.items = list(items)
+        self._prob = [1.0] * n
+        self._alias = list(range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1]
+        large = [i for i, p in enumerate(scaled) if p >= 1]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            self._prob[s] = scaled[s]
+            self._alias[s] = l
+            scaled[l] -= 1 - scaled[s]
+            (small if scaled[l] < 1 else large).append(l)
+
+    def __len__(self):
+        return len(self.items)
+
+    def sample(self, rand):
+        """用 rand（random.Random 实例）抽取一项"""
+        u = rand.random() * len(self._prob)
+        i = int(u)
+        return self.items[i if u - i < self._prob[i] else self._alias[i]]
+
+# ---------- 存档 ----------
+SAVE_VERSION = 2  # 当前存档结构版本，结构变化时加一并在 MIGRATIONS 中登记迁移函数
+
+def new_save():
+    """返回一份全新的默认存档"""
+    return {
+        'version': SAVE_VERSION,
+        'fragments': 0,
+        'shop': {'atk+5': 0, 'hp+20': 0, 'potion+1': 0},
+        'forge_level': 0,  # 铁匠铺等级
+        'records': {
+            'highest_wave': 0,        # 最高波次
+            'total_boss_kills': 0,    # 总Boss击杀
+            'total_runs': 0,          # 总游戏次数
+            'greed_boss_kills': 0,    # 贪婪宝箱击杀次数
+        },
+        'talent_tree': {
+            'warrior': {
+                'strength': 0,        # 力量精通
+                'vitality': 0,        # 生命精通
+                'shield_master': 0,   # 护盾精通
+            },
+            'mage': {
+                'intelligence': 0,    # 智力精通
+                'spellpower': 0,      # 法术强度
+                'mana_shield': 0,     # 法力护盾
+            }
+        },
+        'equipment_storage': []       # 装备仓库
+    }
+
+def _fill_defaults(data, defaults):
+    """递归补齐 data 中缺少的字段"""
+    for key, value in defaults.items():
+        if key not in data:
+            data[key] = value
+        elif isinstance(value, dict):
+            _fill_defaults(data[key], value)
+
+def _migrate_v1(data):
+    """v1 → v2：没有版本号的旧存档，补齐后来新增的字段"""
+    _fill_defaults(data, new_save())
+
+# 迁移函数：MIGRATIONS[n] 把 n 版存档升级到 n+1 版
+MIGRATIONS = {
+    1: _migrate_v1,
+}
+
+def migrate_save(data):
+    """把存档逐版升级到 SAVE_VERSION，返回是否做过迁移"""
+    version = data.get('version', 1)
+    if version == SAVE_VERSION:
+        return False
+    while version < SAVE_VERSION:
+        MIGRATIONS[version](data)
+        version += 1
+    data['version'] = version
+    return True
+
+# 可选的存档后端（如 profiledb.SQLiteProfileStore），为 None 时使用本地存档文件
+profile_store = None
+
+def load_save():
+    if profile_store is not None:
+        return profile_store.load()
+    save_writer.flush()  # 先落盘后台队列中的变更，避免读到旧数据
+    if os.path.exists(BINARY_SAVE_FILE):
+        with open(BINARY_SAVE_FILE, 'rb') as f:
+            save_data = decode_binary_save(f.read())
+    elif os.path.exists(SAVE_FILE):
+        with open(SAVE_FILE, 'r', encoding='utf-8') as f:
+            save_data = json.load(f)
+    else:
+        save_data = new_save()
+    
+    # 迁移只在版本落后时执行一次，随后写入带新版本号的快照
+    migrated = migrate_save(save_data)
+    # 在快照上重放日志中尚未合并的变更
+    if _replay_journal(save_data) or migrated:
+        save_save(save_data)  # 日志末尾有写了一半的记录或刚完成迁移，立即写成新快照
+    return save_data
+
+def save_save(data):
+    """同步写入完整快照并清空日志，返回时已经落盘"""
+    global _journal_entries
+    if profile_store is not None:
+        profile_store.save(data)
+        return
+    save_writer.submit_snapshot(encode_snapshot(data))
+    save_writer.flush()
+    _journal_entries = 0
+
+def encode_snapshot(data):
+    """按仓库大小选择快照格式，返回 (文件路径, 字节内容)
+
+    仓库达到 BINARY_THRESHOLD 件（或已经是二进制存档）时使用二进制格式，否则写 JSON。
+    """
+    storage = data['equipment_storage']
+    if isinstance(storage, EquipmentRows) or len(storage) >= BINARY_THRESHOLD:
+        return BINARY_SAVE_FILE, encode_binary_save(data)
+    return SAVE_FILE, json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
+
+def _write_snapshot(path, payload):
+    """先写临时文件再原子替换，中途崩溃不会损坏旧存档"""
+    tmp_file = path + '.tmp'
+    with open(tmp_file, 'wb') as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file, path)
+    # 切换到二进制格式后旧的 JSON 快照作废（读取时二进制优先）
+    if path == BINARY_SAVE_FILE and os.path.exists(SAVE_FILE):
+        os.remove(SAVE_FILE)
+    # 快照已包含 journal_seq 之前的全部变更，截断日志即使失败也不会重复应用
+    open(JOURNAL_FILE, 'w').close()
+
+def _append_journal(records):
+    with open(JOURNAL_FILE, 'a', encoding='utf-8') as f:
+        f.write(''.join(record + '\n' for record in records))
+        f.flush()
+        os.fsync(f.fileno())
+
+# ---------- 二进制存档 ----------
+# 布局：文件头 | 其余字段的 JSON | 装备仓库定长行
+# 每行为 类型编号(B) 稀有度(B) 各词条数值(H×词条数)，类型和词条的名字表记录在 JSON 部分，
+# 因此文件自描述，以后新增词条也能读取旧文件。
+BINARY_MAGIC = b'RGSV'
+BINARY_HEADER = struct.Struct('<4sHII')  # 魔数, 格式版本, JSON 长度, 仓库行数
+BINARY_FORMAT_VERSION = 1
+BINARY_THRESHOLD = 1000  # 仓库达到多少件后改用二进制快照
+
+class EquipmentRows:
+    """二进制存档中装备仓库的零拷贝视图
+
+    已有的行直接引用读入的字节缓冲区，访问时才解码成字典；新存入和被替换（如重铸）的装备以字典形式保存。
+    支持 len、下标读写、迭代和 append，可以直接替代 save['equipment_storage'] 列表。
+    """
+    def __init__(self, buffer=b'', count=0, types=(), affixes=(), appended=(), replaced=None):
+        self._view = memoryview(buffer)
+        self._count = count
+        self._types = list(types)
+        self._affixes = list(affixes)
+        self._row = struct.Struct(f'<BB{len(self._affixes)}H')
+        self._appended = []
+        self._replaced = {}  # 缓冲区中被替换的行：下标 -> 装备字典
+        # 读取时直接由各列建好仓库索引，之后随存入的装备更新，首次筛选和排序不必再扫描整个仓库
+        self.index = WarehouseIndex.from_rows(self._view, count, self._types, self._affixes)
+        for item in appended:
+            self.append(item)
+        for index, item in (replaced or {}).items():
+            self[index] = item
+
+    def __len__(self):
+        return self._count + len(self._appended)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('装备仓库下标越界')
+        if index >= self._count:
+            return self._appended[index - self._count]
+        if index in self._replaced:
+            return self._replaced[index]
+        type_id, rarity, *values = self._row.unpack_from(self._view, index * self._row.size)
+        return {
+            'type': self._types[type_id],
+            'rarity': rarity,
+            'affixes': {self._affixes[i]: v for i, v in enumerate(values) if v},
+        }
+
+    def __setitem__(self, index, item):
+        """替换一件装备（如重铸后）；缓冲区只读，被替换的行记在 _replaced 中，写快照时再编码"""
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('装备仓库下标越界')
+        self._check(item)
+        if index >= self._count:
+            self._appended[index - self._count] = item
+        else:
+            self._replaced[index] = item
+        self.index.replace(index, item)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __reduce__(self):
+        # memoryview 不能直接序列化，pickle（如进程池的参数）时按字节复制一份
+        return EquipmentRows, (self._view.tobytes(), self._count, self._types, self._affixes,
+                               self._appended, self._replaced)
+
+    def to_list(self):
+        """解码成普通的字典列表，用于 JSON 等只接受 list 的场合"""
+        return list(self)
+
+    def append(self, item):
+        """存入一件装备"""
+        self._check(item)
+        self._appended.append(item)
+        self.index.append(item)
+
+    @staticmethod
+    def _check(item):
+        """类型或词条不在当前的名字表中时拒绝，否则写快照时无法编码"""
+        if item['type'] not in Equipment.TYPES or not Equipment.AFFIX_IDS.keys() >= item['affixes'].keys():
+            raise ValueError(f'无法存入仓库的装备：{item}')
+
+    def encode(self, types, affixes):
+        """按给定的名字表编码所有行；名字表与读入时一致则已有行原样复制，只重新打包被替换的行"""
+        if self._types == types and self._affixes == affixes:
+            rows = bytearray(self._view)
+            size = self._row.size
+            for index, item in self._replaced.items():
+                rows[index * size:(index + 1) * size] = _pack_rows([item], types, affixes)
+            return bytes(rows) + _pack_rows(self._appended, types, affixes)
+        return _pack_rows(self, types, affixes)
+
+def _pack_rows(items, types, affixes):
+    """把装备字典逐条打包为定长行"""
+    row = struct.Struct(f'<BB{len(affixes)}H')
+    type_ids = {name: i for i, name in enumerate(types)}
+    affix_ids = {name: i for i, name in enumerate(affixes)}
+    out = bytearray()
+    for item in items:
+        values = [0] * len(affixes)
+        try:
+            for affix, value in item['affixes'].items():
+                values[affix_ids[affix]] = value
+            out += row.pack(type_ids[item['type']], item['rarity'], *values)
+        except KeyError:
+            raise ValueError(f'无法编码的装备：{item}') from None
+    return bytes(out)
+
+def encode_binary_save(data):
+    """把存档编码为二进制：仓库为定长行，其余字段仍是 JSON"""
+    types, affixes = list(Equipment.TYPES), list(Equipment.AFFIX_NAMES)
+    storage = data['equipment_storage']
+    if isinstance(storage, EquipmentRows):
+        rows = storage.encode(types, affixes)
+    else:
+        rows = _pack_rows(storage, types, affixes)
+    meta = {key: value for key, value in data.items() if key != 'equipment_storage'}
+    meta.update(_types=types, _affixes=affixes)
+    meta = json.dumps(meta, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    header = BINARY_HEADER.pack(BINARY_MAGIC, BINARY_FORMAT_VERSION, len(meta), len(storage))
+    return header + meta + rows
+
+def decode_binary_save(payload):
+    """解码二进制存档；仓库行不逐条解析，以 EquipmentRows 视图直接引用缓冲区"""
+    magic, fmt, meta_len, count = BINARY_HEADER.unpack_from(payload)
+    if magic != BINARY_MAGIC or fmt != BINARY_FORMAT_VERSION:
+        raise ValueError('无法识别的二进制存档')
+    start = BINARY_HEADER.size
+    data = json.loads(payload[start:start + meta_len].decode('utf-8'))
+    types, affixes = data.pop('_types'), data.pop('_affixes')
+    rows = memoryview(payload)[start + meta_len:]
+    data['equipment_storage'] = EquipmentRows(rows, count, types, affixes)
+    return data
+
+class SaveWriter:
+    """后台存档写入线程：排队中的日志记录合并为一次追加、一次 fsync
+
+    界面线程只负责提交，磁盘 I/O 在后台完成；新快照会取代排在它之前的日志记录。
+    """
+    DEBOUNCE = 0.2  # 收到第一条记录后再等待多久，让连续操作合并成一次写入
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._io_lock = threading.Lock()  # 保证多批写入按提交顺序落盘
+        self._records = []
+        self._snapshot = None
+        self._thread = None
+        self.submitted = 0  # 提交的日志记录与快照数
+        self.writes = 0     # 实际落盘的批次数
+        self.coalesced = 0  # 被合并或被快照取代、没有单独写盘的提交数
+
+    def submit(self, record):
+        with self._cond:
+            self._records.append(record)
+            self.submitted += 1
+            self._start()
+            self._cond.notify()
+
+    def submit_snapshot(self, snapshot):
+        """提交 encode_snapshot() 返回的 (路径, 内容)"""
+        with self._cond:
+            self.coalesced += len(self._records) + (self._snapshot is not None)
+            self._records.clear()
+            self._snapshot = snapshot
+            self.submitted += 1
+            self._start()
+            self._cond.notify()
+
+    def flush(self):
+        """在当前线程写完所有排队内容后返回"""
+        self._write_pending()
+
+    def stats(self):
+        with self._cond:
+            return {'submitted': self.submitted, 'writes': self.writes, 'coalesced': self.coalesced}
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='save-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._records and self._snapshot is None:
+                    self._cond.wait()
+            time.sleep(self.DEBOUNCE)
+            self._write_pending()
+
+    def _write_pending(self):
+        with self._io_lock:
+            with self._cond:
+                snapshot, records = self._snapshot, self._records
+                self._snapshot, self._records = None, []
+            if snapshot is None and not records:
+                return
+            if snapshot is not None:
+                _write_snapshot(*snapshot)
+            if records:
+                _append_journal(records)
+            # 计数器与 submit_snapshot 一样只在 _cond 下修改
+            with self._cond:
+                self.writes += 1
+                self.coalesced += (snapshot is not None) + len(records) - 1
+
+save_writer = SaveWriter()
+atexit.register(save_writer.flush)
+
+# ---------- 存档日志 ----------
+COMPACT_EVERY = 200   # 日志累计多少条记录后合并为快照
+_journal_entries = 0  # 当前日志中的记录数
+
+def apply_changes(data, changes):
+    """把变更应用到存档；每个变更为 (操作, 键路径, 值)，操作为 add/set/append"""
+    for op, path, value in changes:
+        target = data
+        for key in path[:-1]:
+            target = target[key]
+        key = path[-1]
+        if op == 'add':
+            target[key] += value
+        elif op == 'set':
+            target[key] = value
+        elif op == 'append':
+            target[key].append(value)
+        else:
+            raise ValueError(f'未知的存档操作：{op}')
+
+def update_save(data, *changes, persist=True):
+    """应用一组变更，并把它们作为一条记录交给后台线程追加到日志（写入量只与变更大小有关）
+
+    一次操作的所有变更写在同一行，崩溃时要么整条生效要么整条丢弃。
+    persist=False 时只修改内存中的存档，用于无头模拟；启用 profile_store 时在其事务中写入。
+    """
+    global _journal_entries
+    if persist and profile_store is not None:
+        profile_store.update(data, changes)
+        return
+    apply_changes(data, changes)
+    if not persist:
+        return
+    data['journal_seq'] = data.get('journal_seq', 0) + 1
+    save_writer.submit(json.dumps({'seq': data['journal_seq'], 'changes': changes},
+                                  ensure_ascii=False, separators=(',', ':')))
+    _journal_entries += 1
+    if _journal_entries >= COMPACT_EVERY:
+        save_writer.submit_snapshot(encode_snapshot(data))
+        _journal_entries = 0
+
+def _replay_journal(data):
+    """重放快照之后的日志记录，返回日志末尾是否有损坏的记录"""
+    global _journal_entries
+    _journal_entries = 0
+    if not os.path.exists(JOURNAL_FILE):
+        return False
+    with open(JOURNAL_FILE, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                return True
+            # 已经合并进快照的记录跳过
+            if record['seq'] <= data.get('journal_seq', 0):
+                continue
+            apply_changes(data, record['changes'])
+            data['journal_seq'] = record['seq']
+            _journal_entries += 1
+    return False
+
+# ---------- 装备系统 ----------
+def _affix_coefficients(funcs, stats):
+    """把词条函数编译成系数矩阵：第 i 行是词条 i 每点数值提供的各项属性（词条函数都是线性的）"""
+    return [tuple(func(1).get(stat, 0) for stat in stats) for func in funcs]
+
+class Equipment:
+    RARITY = ['普通', '稀有', '史诗']
+    TYPES = ['武器', '护甲']
+    AFFIXES = {
+        '力量': lambda val: {'atk': val * 3},
+        '生命': lambda val: {'max_hp': val * 10},
+        '吸血': lambda val: {'lifesteal': val * 0.05},  # 5%/级
+        '反伤': lambda val: {'thorns': val * 2},  # 2点/级
+        '暴击': lambda val: {'crit_chance': val * 0.05},  # 5%/级
+    }
+    # 词条编号：词条数值按编号存放在定长整数向量里，名字只用于显示和存档
+    AFFIX_NAMES = list(AFFIXES)
+    AFFIX_IDS = {name: i for i, name in enumerate(AFFIX_NAMES)}
+    _AFFIX_FUNCS = list(AFFIXES.values())
+    STATS = ('atk', 'max_hp', 'lifesteal', 'thorns', 'crit_chance')
+    AFFIX_COEFFS = _affix_coefficients(_AFFIX_FUNCS, STATS)  # AFFIX_COEFFS[词条编号][属性编号]
+    # 每个词条只保留非零系数 [(属性, 系数)]，get_stats 逐件计算时不必遍历整行
+    _AFFIX_TERMS = [[term for term in terms if term[1]] for terms in map(zip, itertools.repeat(STATS), AFFIX_COEFFS)]
+    _NO_AFFIXES = array('H', [0] * len(AFFIX_NAMES))
+    _OUTCOMES = {}  # 稀有度 -> 一次生成词条的全部结果
+    _SPLITS = {}    # (稀有度, 词条, 目标值) -> (满足条件的结果, 不满足的结果)
+
+    __slots__ = ('type', 'rarity', 'values')
+
+    def __init__(self, type_, rarity, affixes=None):
+        self.type = type_
+        self.rarity = rarity  # 0=普通, 1=稀有, 2=史诗
+        if affixes is None:
+            self.values = self._NO_AFFIXES[:]  # values[词条编号] = 词条数值，0 表示没有该词条
+            self._generate_affixes()
+        else:
+            self.affixes = affixes  # 使用给定词条，不消耗随机数
+    
+    def _generate_affixes(self):
+        # 根据稀有度决定词条数量
+        affix_count = self.rarity + 1
+        chosen = rng.sample(range(len(self.AFFIX_NAMES)), affix_count)
+        
+        for affix_id in chosen:
+            # 稀有度越高，词条数值越大
+            value = rng.randint(1, 3) * (self.rarity + 1)
+            self.values[affix_id] = value
+
+    @property
+    def affixes(self):
+        """按词条名展开的 {词条: 数值}，用于显示和存档"""
+        return {self.AFFIX_NAMES[i]: v for i, v in enumerate(self.values) if v}
+
+    @affixes.setter
+    def affixes(self, affixes):
+        self.values = self._NO_AFFIXES[:]
+        for affix, value in affixes.items():
+            self.values[self.AFFIX_IDS[affix]] = value
+
+    def reforge(self):
+        """重铸装备，重新随机所有词条"""
+        self.values = self._NO_AFFIXES[:]
+        self._generate_affixes()
+
+    @classmethod
+    def outcomes(cls, rarity):
+        """一次 _generate_affixes 的全部结果（词条数值元组），按稀有度缓存
+
+        不放回地抽 rarity+1 个词条，每个词条的数值独立取 1~3 倍，
+        所以每种 (词条组合, 数值) 都等概率，共 C(5, k)·3^k 种。
+        """
+        outcomes = cls._OUTCOMES.get(rarity)
+        if outcomes is None:
+            count = step = rarity + 1
+            outcomes = []
+            for chosen in itertools.combinations(range(len(cls.AFFIX_NAMES)), count):
+                for levels in itertools.product((1, 2, 3), repeat=count):
+                    values = [0] * len(cls.AFFIX_NAMES)
+                    for affix_id, level in zip(chosen, levels):
+                        values[affix_id] = level * step
+                    outcomes.append(tuple(values))
+            cls._OUTCOMES[rarity] = outcomes
+        return outcomes
+
+    @classmethod
+    def reforge_split(cls, rarity, affix, minimum):
+        """把重铸结果分成 affix ≥ minimum 和不满足的两组"""
+        key = (rarity, affix, minimum)
+        split = cls._SPLITS.get(key)
+        if split is None:
+            affix_id = cls.AFFIX_IDS[affix]
+            outcomes = cls.outcomes(rarity)
+            split = cls._SPLITS[key] = ([o for o in outcomes if o[affix_id] >= minimum],
+                                        [o for o in outcomes if o[affix_id] < minimum])
+        return split
+
+    @classmethod
+    def reforge_odds(cls, rarity, affix, minimum, attempts):
+        """最多重铸 attempts 次、达到 affix ≥ minimum 即停时的 (单次成功率, 总成功率, 期望重铸次数)"""
+        hits, misses = cls.reforge_split(rarity, affix, minimum)
+        single = len(hits) / (len(hits) + len(misses))
+        if not single:
+            return 0.0, 0.0, float(attempts)
+        success = 1 - (1 - single) ** attempts
+        return single, success, success / single
+
+    def reforge_until(self, affix, minimum, attempts):
+        """重铸直到 affix ≥ minimum 或用完 attempts 次，返回实际重铸的次数；已满足条件时不重铸
+
+        不逐次重铸：按几何分布一次抽出首次成功的次数，再从成功或失败的那组结果中抽出最终词条，
+        结果分布与逐次调用 reforge() 相同。
+        """
+        if attempts <= 0 or self.values[self.AFFIX_IDS[affix]] >= minimum:
+            return 0
+        hits, misses = self.reforge_split(self.rarity, affix, minimum)
+        if not misses:
+            used = 1
+        elif not hits:
+            used = attempts + 1
+        else:
+            single = len(hits) / (len(hits) + len(misses))
+            # P(次数 > n) = (1 - single)^n 的反函数，1 - random() 落在 (0, 1]
+            used = int(math.log(1 - rng.random()) / math.log1p(-single)) + 1
+        if used <= attempts:
+            self.values = array('H', rng.choice(hits))
+            return used
+        self.values = array('H', rng.choice(misses))
+        return attempts
+    
+    def get_stats(self):
+        """计算装备提供的所有属性加成"""
+        stats = dict.fromkeys(self.STATS, 0)
+        for value, terms in zip(self.values, self._AFFIX_TERMS):
+            if value:
+                for stat, coeff in terms:
+                    stats[stat] += value * coeff
+        return stats
+
+    @classmethod
+    def affix_weights(cls, weights):
+        """按属性权重 {属性: 分值} 折算出每点词条数值的分值，即系数矩阵乘以权重向量"""
+        return [sum(coeff * weights[stat] for stat, coeff in zip(cls.STATS, coeffs))
+                for coeffs in cls.AFFIX_COEFFS]
+
+    def score(self, affix_weights):
+        """装备评分：各词条数值乘以 affix_weights 给出的每点分值后求和"""
+        return sum(map(operator.mul, self.values, affix_weights))
+    
+    def __str__(self):
+        rarity_symbols = ['⚪', '🔵', '🟣']
+        text = f"{rarity_symbols[self.rarity]}{self.RARITY[self.rarity]}{self.type}\n"
+        for affix, value in self.affixes.items():
+            text += f"  {affix} +{value}\n"
+        return text
+    
+    def to_dict(self):
+        """将装备转换为可序列化的字典"""
+        return {
+            'type': self.type,
+            'rarity': self.rarity,
+            'affixes': self.affixes
+        }
+    
+    @classmethod
+    def from_dict(cls, data):
+        """从字典创建装备实例"""
+        return cls(data['type'], data['rarity'], data['affixes'])
+
+# ---------- 角色 ----------
+class Character:
+    # 给装备打分时各项属性的分值，以 1 点攻击力为单位：10 点生命约抵 2.5 点攻击；
+    # 反伤每回合生效，与攻击同价；吸血按击杀一击约 30 点伤害折算；暴击率目前不参与战斗结算
+    STAT_WEIGHTS = {'atk': 1.0, 'max_hp': 0.25, 'lifesteal': 8.0, 'thorns': 1.0, 'crit_chance': 0.0}
+    _AFFIX_WEIGHTS = {}  # (职业, 诅咒等级) -> Equipment.affix_weights 的结果
+
+    __slots__ = ('name', 'hp', 'max_hp', 'atk', 'souls', 'talents', 'attrs', 'items',
+                 'equipment', 'lifesteal', 'thorns', 'crit_chance', '_equip_max_hp', '_power',
+                 'event_flags', 'boss_kills', 'defeated_greed', 'save_data', 'stored_equipment',
+                 '_status_cache')
+
+    def __init__(self, name):
+        self.name = name
+        self.hp = 100
+        self.max_hp = 100
+        self.atk = 10
+        self.souls = 0
+        self.talents = []
+        self.attrs = {'力量': 0, '敏捷': 0, '智力': 0}
+        self.items = {'血瓶': 0}
+        self.equipment = {'武器': None, '护甲': None}
+        # 派生属性表：只在装备、词条、攻击、属性或诅咒变化时由 refresh_stats() 重算
+        self.lifesteal = 0
+        self.thorns = 0
+        self.crit_chance = 0
+        self._equip_max_hp = 0     # 已计入 max_hp 的装备生命加成
+        self._power = self.atk     # 含装备与诅咒加成的攻击力
+        # 事件状态追踪
+        self.event_flags = {
+            'demon_pact': False,     # 是否签订恶魔契约
+            'altar_sacrifice': 0,    # 祭坛献祭次数
+            'holy_blessing': False,  # 是否受到天使祝福
+            'curse_level': 0,        # 诅咒等级
+        }
+        # 结局追踪
+        self.boss_kills = 0         # 击杀Boss数量
+        self.defeated_greed = False # 是否击败贪婪宝箱
+        
+        # 持久化存档数据
+        self.save_data = None      # 存档数据引用
+        self.stored_equipment = [] # 装备仓库引用
+        self._status_cache = None  # status() 上次构建的面板及其对应的状态
+
+    def refresh_stats(self):
+        """重新计算派生属性表，在装备、重铸、词条、攻击、属性或诅咒变化后调用"""
+        bonus = {'atk': 0, 'max_hp': 0, 'lifesteal': 0, 'thorns': 0, 'crit_chance': 0}
+        for eq in self.equipment.values():
+            if eq:
+                for stat, value in eq.get_stats().items():
+                    bonus[stat] += value
+        
+        # 装备生命加成只计入一次，换装时按差值调整
+        self.max_hp += bonus['max_hp'] - self._equip_max_hp
+        self.hp = min(self.hp, self.max_hp)
+        self._equip_max_hp = bonus['max_hp']
+        self.lifesteal = bonus['lifesteal']
+        self.thorns = bonus['thorns']
+        self.crit_chance = bonus['crit_chance']
+        
+        base = self.atk + self.attrs['力量'] * 2 + bonus['atk']
+        # 计算诅咒加成
+        if self.event_flags['curse_level'] > 0:
+            curse_bonus = base * (self.event_flags['curse_level'] * 0.1)
+            base += curse_bonus
+        self._power = int(base)
+
+    def power(self):
+        return self._power
+
+    def stat_weights(self):
+        """装备评分用的属性权重；诅咒按比例放大攻击加成"""
+        weights = dict(self.STAT_WEIGHTS)
+        weights['atk'] *= 1 + self.event_flags['curse_level'] * 0.1
+        return weights
+
+    def affix_weights(self):
+        """stat_weights 折算成的每点词条分值，只随职业和诅咒等级变化，按两者缓存"""
+        key = (type(self), self.event_flags['curse_level'])
+        weights = self._AFFIX_WEIGHTS.get(key)
+        if weights is None:
+            weights = self._AFFIX_WEIGHTS[key] = Equipment.affix_weights(self.stat_weights())
+        return weights
+
+    def equip(self, eq):
+        """穿上装备，替换同部位的旧装备"""
+        self.equipment[eq.type] = eq
+        self.refresh_stats()
+
+    def collect(self, n):
+        self.souls += n
+        ui.log('souls', amount=n, total=self.souls)
+        while self.souls >= 20:
+            self.souls -= 20
+            self.random_upgrade()
+
+    def random_upgrade(self):
+        if rng.randrange(2):
+            t = rng.choice(['暴击', '吸血', '护盾'])
+            self.talents.append(t)
+            ui.log('talent', talent=t)
+        else:
+            k = rng.choice(list(self.attrs))
+            self.attrs[k] += 1
+            if k == '力量':  # 派生属性表里只有攻击力用到属性，其它属性在使用时读取
+                self.refresh_stats()
+            ui.log('attribute', attr=k)
+
+    def status(self):
+        """返回角色状态面板（rich 渲染对象）
+
+        面板按状态缓存：状态没变时直接返回上次的面板；只有血量变化时只重建血条一行，
+        其余各行沿用已经渲染好的结果。
+        """
+        from rich.console import Group
+        from rich.panel import Panel
+        from rich.progress_bar import ProgressBar
+
+        info = (self.name, self._power, tuple(self.talents), tuple(self.attrs.values()),
+                tuple(self.items.values()),
+                tuple((slot, eq.type, eq.rarity) for slot, eq in self.equipment.items() if eq))
+        cache = self._status_cache
+        if cache is None:
+            cache = self._status_cache = {}
+        elif cache['hp'] == (self.hp, self.max_hp) and cache['info'] == info:
+            return cache['panel']
+
+        if cache.get('info') != info:
+            rows = [
+                ("攻击", f"{self._power}"),
+                ("天赋", " ".join(f"[cyan]{t}[/cyan]" for t in self.talents)),
+                ("属性", " ".join(f"{k}:{v}" for k, v in self.attrs.items())),
+                ("道具", " ".join(f"{k}×{v}" for k, v in self.items.items())),
+            ]
+            # 显示装备
+            if any(self.equipment.values()):
+                rows.append(("装备", ""))
+                for slot, eq in self.equipment.items():
+                    if eq:
+                        rarity_color = ["white", "blue", "purple"][eq.rarity]
+                        rows.append(("", f"[{rarity_color}]{slot}: {eq.type}[/{rarity_color}]"))
+            cache['head'] = CachedRenderable(status_table([("角色", f"[bold]{self.name}[/bold]")]))
+            cache['body'] = CachedRenderable(status_table(rows))
+
+        # 生命值进度条
+        hp_percentage = self.hp / self.max_hp * 100
+        hp_color = "green" if hp_percentage > 50 else "yellow" if hp_percentage > 25 else "red"
+        hp_bar = ProgressBar(completed=hp_percentage, width=20, complete_style=hp_color)
+        hp_row = status_table([("生命", hp_bar, f"{self.hp}/{self.max_hp}")])
+
+        panel = CachedRenderable(Panel(Group(cache['head'], hp_row, cache['body']), title="角色状态"))
+        cache.update(hp=(self.hp, self.max_hp), info=info, panel=panel)
+        return panel
+
+    def use_item(self, key):
+        key = str(key)
+        if key == '1' and self.items['血瓶'] > 0:
+            heal = min(40, self.max_hp - self.hp)
+            self.hp += heal
+            self.items['血瓶'] -= 1
+            ui.log('potion', amount=heal)
+            return True
+        return False
+
+
+class Warrior(Character):
+    __slots__ = ('shield_reduction',)
+
+    def __init__(self, save):
+        super().__init__('战士')
+        self.save_data = save
+        
+        # 应用商店升级
+        base_hp = 100 + save['shop']['hp+20'] * 20
+        base_atk = 10 + save['shop']['atk+5'] * 5
+        
+        # 应用天赋树加成
+        talents = save['talent_tree']['warrior']
+        hp_bonus = base_hp * (talents['vitality'] * 0.05)  # 每级生命精通+5%生命
+        atk_bonus = base_atk * (talents['strength'] * 0.1)  # 每级力量精通+10%攻击
+        shield_bonus = talents['shield_master'] * 2  # 每级护盾精通多减伤2点
+        
+        self.hp = self.max_hp = int(base_hp + hp_bonus)
+        self.atk = int(base_atk + atk_bonus)
+        self.shield_reduction = shield_bonus  # 护盾减伤值
+        
+        self.items['血瓶'] += save['shop']['potion+1']
+        self.refresh_stats()
+
+
+class Mage(Character):
+    __slots__ = ('spell_power', 'magic_chance')
+    STAT_WEIGHTS = dict(Character.STAT_WEIGHTS, max_hp=0.3)  # 法师血量低，生命更值钱
+
+    def __init__(self, save):
+        super().__init__('法师')
+        self.save_data = save
+        
+        # 应用商店升级
+        base_hp = 80 + save['shop']['hp+20'] * 20
+        base_atk = 8 + save['shop']['atk+5'] * 5
+        
+        # 应用天赋树加成
+        talents = save['talent_tree']['mage']
+        hp_bonus = base_hp * (talents['mana_shield'] * 0.03)  # 每级法力护盾+3%生命
+        spell_power = talents['spellpower'] * 0.15  # 每级法术强度+15%法术伤害
+        intelligence = talents['intelligence'] * 0.1  # 每级智力精通+10%触发概率
+        
+        self.hp = self.max_hp = int(base_hp + hp_bonus)
+        self.atk = base_atk
+        self.spell_power = spell_power
+        self.magic_chance = 0.3 + intelligence  # 基础30%触发率
+        
+        self.items['血瓶'] += save['shop']['potion+1']
+        self.refresh_stats()
+
+    def magic_damage(self):
+        if rng.random() < self.magic_chance:
+            base_dmg = 10 + self.attrs['智力'] * 3
+            total_dmg = int(base_dmg * (1 + self.spell_power))
+            ui.log('magic', amount=total_dmg)
+            return total_dmg
+        return 0
+
+
+class Monster:
+    __slots__ = ('name', 'hp', 'atk', 'souls', 'is_boss', 'is_elite', '_status_cache')
+
+    def __init__(self, name, hp, atk, souls, is_boss=False, is_elite=False):
+        self.name = name
+        self.hp = hp
+        self.atk = atk
+        self.souls = souls
+        self.is_boss = is_boss
+        self.is_elite = is_elite
+        self._status_cache = None  # (血量, 攻击, 面板)
+
+    def status(self):
+        """返回敌人状态面板（rich 渲染对象），血量和攻击不变时复用上次的面板"""
+        cache = self._status_cache
+        if cache is not None and cache[0] == self.hp and cache[1] == self.atk:
+            return cache[2]
+        from rich.panel import Panel
+        from rich.text import Text
+
+        prefix = '👹BOSS' if self.is_boss else '👾ELITE' if self.is_elite else '👾'
+        style = 'red bold' if self.is_boss else 'yellow bold' if self.is_elite else 'white'
+        line = Text(f" {prefix}  {self.name}  HP: {self.hp}  ATK: {self.atk}", style=style)
+        panel = CachedRenderable(Panel(line, title="敌人状态", style=style))
+        self._status_cache = (self.hp, self.atk, panel)
+        return panel
+
+
+NORMAL_NAMES = [
+    ('史莱姆', 25, 7, 10), ('蝙蝠', 30, 8, 10), ('哥布林', 35, 9, 12),
+    ('骷髅兵', 40, 10, 12), ('狼人', 45, 11, 15), ('石像鬼', 50, 12, 15),
+    ('暗影刺客', 35, 13, 15), ('剧毒蜘蛛', 30, 14, 15)
+]
+BOSS_NAMES = [
+    ('骷髅王', 90, 16, 45), ('炎魔', 110, 18, 50)
+]
+ELITE_NAMES = [
+    ('精英史莱姆', 40, 12, 20), ('精英蝙蝠', 45, 13, 20), ('精英哥布林', 50, 14, 20)
+]
+# 隐藏Boss
+GREED_BOSS = ('贪婪宝箱', 150, 25, 100)  # 更高的血量、攻击和灵魂奖励
+
+# ---------- 地牢系统 ----------
+class SpawnTable:
+    """一条路线上某一档怪物的出怪表：属性已按路线倍率折算好，按权重 O(1) 抽样"""
+    __slots__ = ('_table', 'is_boss', 'is_elite')
+
+    def __init__(self, entries, weights, is_boss=False, is_elite=False):
+        self._table = AliasTable(entries, weights)
+        self.is_boss = is_boss
+        self.is_elite = is_elite
+
+    def spawn(self, rand):
+        """用 rand 抽一只怪物；只有一种怪物时不消耗随机数"""
+        table = self._table
+        entry = table.items[0] if len(table) == 1 else table.sample(rand)
+        return Monster(*entry, is_boss=self.is_boss, is_elite=self.is_elite)
+
+
+class DungeonPath:
+    # 各档怪物的名单及是否为 Boss/精英
+    TIERS = {
+        'normal': (NORMAL_NAMES, False, False),
+        'elite': (ELITE_NAMES, False, True),
+        'boss': (BOSS_NAMES, True, False),
+        'greed': ([GREED_BOSS], True, False),
+    }
+
+    def __init__(self, name, difficulty, rewards_multiplier, weights=None):
+        self.name = name
+        self.difficulty = difficulty  # 难度倍率
+        self.rewards_multiplier = rewards_multiplier  # 奖励倍率
+        self.weights = weights or {}  # 怪物名 -> 出现权重，未列出的为 1
+        self.compile()
+
+    def compile(self):
+        """按难度、奖励倍率和权重生成各档出怪表，修改这些参数后需重新调用"""
+        self.spawns = {}
+        for tier, (entries, is_boss, is_elite) in self.TIERS.items():
+            scaled = [self.scale(*entry) for entry in entries]
+            weights = [self.weights.get(entry[0], 1) for entry in entries]
+            self.spawns[tier] = SpawnTable(scaled, weights, is_boss, is_elite)
+
+    def scale(self, name, hp, atk, souls):
+        """根据路线难度折算怪物属性"""
+        return (name, int(hp * self.difficulty), int(atk * self.difficulty),
+                int(souls * self.rewards_multiplier))
+
+    def spawn(self, tier):
+        """生成一只 tier 档（normal/elite/boss/greed）的怪物"""
+        return self.spawns[tier].spawn(rng)
+
+PATHS = {
+    'safe': DungeonPath('安全通道', 1.0, 1.0),
+    'danger': DungeonPath('危险通道', 1.5, 2.0)
+}
+
+def choose_path(hero=None, wave=1):
+    """选择前进路线"""
+    while True:
+        ui.clear()
+        ui.say('\n=== 选择通道 ===')
+        ui.say('1) 安全通道 - 普通难度，普通奖励')
+        ui.say('2) 危险通道 - 50%属性提升，双倍奖励')
+        choice = ui.ask('path', '> ', hero=hero, wave=wave).strip()
+        if choice == '1':
+            return PATHS['safe']
+        elif choice == '2':
+            return PATHS['danger']
+        else:
+            ui.say('请输入 1 或 2')
+
+# ---------- 随机事件 ----------
+def handle_spring(hero):
+    """神秘泉水：回满生命，失去所有血瓶"""
+    hero.hp = hero.max_hp
+    hero.items['血瓶'] = 0
+    ui.log('spring')
+
+def handle_treasure(hero):
+    """幸运藏宝箱：一半概率得血瓶，一半概率得灵魂"""
+    if rng.random() < 0.5:
+        gain = rng.randint(1, 3)
+        hero.items['血瓶'] += gain
+        ui.log('treasure_potions', count=gain)
+    else:
+        gain = rng.randint(10, 30)
+        hero.souls += gain
+        ui.log('treasure_souls', amount=gain)
+
+def handle_merchant(hero):
+    """流浪商人：花费已在 random_event 中扣除"""
+    hero.items['血瓶'] += 1
+    ui.log('merchant')
+
+def handle_altar_event(hero):
+    """处理祭坛事件"""
+    ui.say('\n1) 献祭30灵魂 - 永久+5攻击')
+    ui.say('2) 献祭20%生命 - 获得诅咒加成(每层诅咒提升10%伤害)')
+    choice = ui.ask('event_choice', '选择(1/2)> ', hero=hero, event='神秘祭坛').strip()
+    
+    if choice == '1':
+        if hero.souls >= 30:
+            hero.souls -= 30
+            hero.atk += 5
+            hero.event_flags['altar_sacrifice'] += 1
+            hero.refresh_stats()
+            ui.log('altar_power')
+        else:
+            ui.say('灵魂不足！')
+    elif choice == '2':
+        life_cost = int(hero.hp * 0.2)
+        hero.hp -= life_cost
+        hero.event_flags['curse_level'] += 1
+        hero.event_flags['altar_sacrifice'] += 1
+        hero.refresh_stats()
+        ui.log('altar_curse', amount=life_cost, level=hero.event_flags['curse_level'])
+
+def handle_demon_pact(hero):
+    """处理恶魔契约事件"""
+    ui.say('\n恶魔被你的献祭吸引而来...')
+    ui.say('1) 签订契约 - 攻击翻倍，但受到伤害增加50%')
+    ui.say('2) 拒绝契约 - 保持现状')
+    choice = ui.ask('event_choice', '选择(1/2)> ', hero=hero, event='恶魔契约').strip()
+    
+    if choice == '1':
+        hero.atk *= 2
+        hero.event_flags['demon_pact'] = True
+        hero.refresh_stats()
+        ui.log('demon_pact')
+    else:
+        ui.log('demon_refused')
+
+def handle_angel_judgment(hero):
+    """处理天使审判事件"""
+    ui.say('\n天使发现了你与恶魔的契约...')
+    if hero.event_flags['curse_level'] > 0:
+        ui.say('1) 寻求救赎 - 移除所有诅咒和恶魔契约，但损失50%当前生命')
+        ui.say('2) 对抗天使 - 保持现状，但永久损失20%最大生命')
+        choice = ui.ask('event_choice', '选择(1/2)> ', hero=hero, event='天使审判').strip()
+        
+        if choice == '1':
+            hero.hp = max(1, hero.hp // 2)
+            hero.event_flags['demon_pact'] = False
+            hero.event_flags['curse_level'] = 0
+            hero.event_flags['holy_blessing'] = True
+            hero.atk = int(hero.atk * 0.5)  # 移除恶魔契约的加成
+            hero.refresh_stats()
+            ui.log('redemption')
+        else:
+            hero.max_hp = int(hero.max_hp * 0.8)
+            hero.hp = min(hero.hp, hero.max_hp)
+            ui.log('fallen')
+    else:
+        hero.event_flags['holy_blessing'] = True
+        hero.max_hp += 20
+        hero.hp += 20
+        ui.log('blessing')
+
+def handle_mirror_event(hero):
+    """处理镜像事件"""
+    if not any(hero.equipment.values()):
+        ui.log('mirror_empty')
+        return
+    
+    if rng.random() < 0.5:
+        # 选择一个已装备的装备
+        equipped = [eq for eq in hero.equipment.values() if eq]
+        if equipped:
+            target = rng.choice(equipped)
+            owned = [i for i, value in enumerate(target.values) if value]
+            if owned:
+                # 复制一个随机词条
+                affix_id = rng.choice(owned)
+                # 词条值存为无符号 16 位，反复强化时封顶
+                target.values[affix_id] = min(0xFFFF, target.values[affix_id] * 2)
+                hero.refresh_stats()
+                ui.log('mirror_boost', item=target.type, affix=target.AFFIX_NAMES[affix_id])
+    else:
+        damage = int(hero.hp * 0.2)
+        hero.hp -= damage
+        ui.log('mirror_hurt', amount=damage)
+
+class GameEvent:
+    """随机事件：desc 可引用 event_flags 中的字段，eligible 为按 event_flags 判断能否出现的条件"""
+    __slots__ = ('title', 'desc', 'handler', 'cost', 'weight', 'eligible')
+
+    def __init__(self, title, desc, handler, cost=0, weight=1, eligible=None):
+        self.title = title
+        self.desc = desc
+        self.handler = handler
+        self.cost = cost
+        self.weight = weight
+        self.eligible = eligible
+
+    def describe(self, hero):
+        return self.desc.format(**hero.event_flags)
+
+
+# 全部随机事件；连锁事件（祭坛 → 恶魔契约 → 天使审判）的条件只能依赖 chain_state() 中的字段
+EVENTS = (
+    GameEvent('神秘祭坛', '献祭30灵魂获得力量，或献祭生命获得诅咒加成。', handle_altar_event,
+              eligible=lambda flags: not flags['altar_sacrifice']),
+    GameEvent('恶魔契约', '已献祭{altar_sacrifice}次，恶魔被吸引而来...', handle_demon_pact,
+              eligible=lambda flags: flags['altar_sacrifice'] and not flags['demon_pact']),
+    GameEvent('天使审判', '你的灵魂已被玷污，是否寻求救赎？', handle_angel_judgment,
+              eligible=lambda flags: flags['demon_pact'] and not flags['holy_blessing']),
+    GameEvent('神秘泉水', '回满生命值，但失去所有血瓶。', handle_spring),
+    GameEvent('幸运藏宝箱', '随机获得1-3个血瓶或10-30灵魂。', handle_treasure),
+    GameEvent('诡异镜像', '50% 概率复制当前装备的一个词条，50% 概率损失20%当前生命。', handle_mirror_event),
+    GameEvent('流浪商人', '15 灵魂换 1 血瓶。', handle_merchant, cost=15),
+)
+
+_event_tables = {}  # 事件链状态 -> 该状态下可触发事件的别名表
+
+
+def chain_state(flags):
+    """决定哪些连锁事件可以出现的状态"""
+    return (flags['altar_sacrifice'] > 0, flags['demon_pact'], flags['holy_blessing'])
+
+
+def event_table(flags):
+    """返回当前事件链状态下的抽样表，每种状态只构建一次"""
+    state = chain_state(flags)
+    table = _event_tables.get(state)
+    if table is None:
+        events = [evt for evt in EVENTS if evt.eligible is None or evt.eligible(flags)]
+        table = _event_tables[state] = AliasTable(events, [evt.weight for evt in events])
+    return table
+
+def random_event(hero):
+    if rng.randrange(100) < 40:
+        evt = event_table(hero.event_flags).sample(rng)
+        ui.say(f'\n🎲 随机事件：{evt.title}')
+        ui.say(textwrap.fill(evt.describe(hero), width=50))
+        if evt.cost:
+            ui.say(f'(需 {evt.cost} 灵魂)')
+        if ui.ask('event', '接受？(y/n) > ', hero=hero, event=evt).strip().lower() == 'y':
+            if evt.cost > hero.souls:
+                ui.say('灵魂不足！')
+            else:
+                hero.souls -= evt.cost
+                evt.handler(hero)
+        else:
+            ui.say('离开。')
+        ui.pause('按 Enter 继续…')
+
+
+# ---------- 主循环 ----------
+REFORGE_COST = 30  # 每次重铸消耗的灵魂碎片
+
+def forge(save):
+    """铁匠铺：重铸仓库中的装备，花费存档中的灵魂碎片；重铸结果和花费写在同一条存档记录里"""
+    storage = save['equipment_storage']
+    while True:
+        ui.clear()
+        ui.say('=== 铁匠铺 ===')
+        ui.say(f'灵魂碎片：{save["fragments"]}')
+        ui.say(f'仓库中共 {len(storage)} 件装备，按装备仓库中显示的编号选择')
+        
+        ui.say(f'\n1) 重铸一件装备 ({REFORGE_COST}碎片)')
+        ui.say('2) 批量重铸：直到指定词条达到目标值')
+        ui.say('0) 返回')
+        
+        choice = ui.ask('menu', '\n> ').strip()
+        if choice == '0':
+            return
+        elif choice in ['1', '2']:
+            picked = pick_stored(storage)
+            if picked is not None and choice == '2':
+                bulk_reforge(save, *picked)
+            elif picked is not None:
+                index, eq = picked
+                if save['fragments'] < REFORGE_COST:
+                    ui.say('灵魂碎片不足！')
+                else:
+                    eq.reforge()
+                    update_save(save, ('add', ['fragments'], -REFORGE_COST),
+                                ('set', ['equipment_storage', index], eq.to_dict()))
+                    ui.say('\n重铸后：')
+                    ui.say(eq)
+            ui.pause('按 Enter 继续...')
+
+def pick_stored(storage):
+    """按仓库编号选出一件装备，返回 (下标, Equipment)；仓库为空或编号无效时返回 None"""
+    if not len(storage):
+        ui.say('没有可重铸的装备！')
+        return None
+    try:
+        index = int(ui.ask('menu', f'装备编号 (1-{len(storage)}) > ')) - 1
+    except ValueError:
+        index = -1
+    if not 0 <= index < len(storage):
+        ui.say('请输入正确编号')
+        return None
+    eq = Equipment.from_dict(storage[index])
+    ui.say(eq)
+    return index, eq
+
+def bulk_reforge(save, index, eq):
+    """批量重铸仓库中第 index 件装备 eq：选定词条和目标值，先显示成功率与期望花费，确认后一次结算"""
+    names = Equipment.AFFIX_NAMES
+    ui.say('  '.join(f'{idx}) {name}' for idx, name in enumerate(names, 1)))
+    try:
+        affix = names[int(ui.ask('menu', '目标词条 > ')) - 1]
+        minimum = int(ui.ask('menu', f'{affix}至少达到 > '))
+    except (IndexError, ValueError):
+        ui.say('请输入正确编号')
+        return
+    if eq.values[Equipment.AFFIX_IDS[affix]] >= minimum:
+        ui.say('已经达到目标，无需重铸')
+        return
+    attempts = save['fragments'] // REFORGE_COST
+    single, success, expected = Equipment.reforge_odds(eq.rarity, affix, minimum, attempts)
+    if not single:
+        ui.say(f'{Equipment.RARITY[eq.rarity]}装备的{affix}最高只有 {3 * (eq.rarity + 1)}')
+        return
+    ui.say(f'单次成功率 {single:.1%}，平均每 {REFORGE_COST / single:.0f} 碎片出一次')
+    ui.say(f'现有碎片最多重铸 {attempts} 次：成功率 {success:.1%}，期望花费 {expected * REFORGE_COST:.0f} 碎片')
+    if not attempts:
+        ui.say('灵魂碎片不足！')
+        return
+    if ui.ask('menu', '开始重铸？(y/n) > ').strip().lower() != 'y':
+        return
+    used = eq.reforge_until(affix, minimum, attempts)
+    update_save(save, ('add', ['fragments'], -used * REFORGE_COST),
+                ('set', ['equipment_storage', index], eq.to_dict()))
+    reached = eq.values[Equipment.AFFIX_IDS[affix]] >= minimum
+    ui.say(f'\n重铸 {used} 次，花费 {used * REFORGE_COST} 碎片，' + ('达成目标！' if reached else '未能达成目标'))
+    ui.say(eq)
+
+def show_records(save):
+    """显示游戏记录"""
+    ui.clear()
+    ui.say('=== 历史记录 ===')
+    ui.say(f'最高波次：{save["records"]["highest_wave"]}')
+    ui.say(f'总Boss击杀：{save["records"]["total_boss_kills"]}')
+    ui.say(f'贪婪宝箱击杀：{save["records"]["greed_boss_kills"]}')
+    ui.say(f'总游戏次数：{save["records"]["total_runs"]}')
+    ui.pause('\n按 Enter 返回...')
+
+# 天赋每级的碎片价格：职业 -> 天赋 -> 价格
+TALENT_COSTS = {
+    'warrior': {'strength': 10, 'vitality': 10, 'shield_master': 15},
+    'mage': {'intelligence': 10, 'spellpower': 12, 'mana_shield': 15},
+}
+
+def talent_tree(save):
+    """天赋树界面"""
+    levels, prices = save['talent_tree'], TALENT_COSTS
+    while True:
+        ui.clear()
+        ui.say('=== 天赋树 ===')
+        ui.say(f'当前灵魂碎片：{save["fragments"]}')
+        ui.say('\n战士天赋：')
+        ui.say(f'1) 力量精通 Lv.{levels["warrior"]["strength"]} - {prices["warrior"]["strength"]}碎片')
+        ui.say(f'2) 生命精通 Lv.{levels["warrior"]["vitality"]} - {prices["warrior"]["vitality"]}碎片')
+        ui.say(f'3) 护盾精通 Lv.{levels["warrior"]["shield_master"]} - {prices["warrior"]["shield_master"]}碎片')
+        ui.say('\n法师天赋：')
+        ui.say(f'4) 智力精通 Lv.{levels["mage"]["intelligence"]} - {prices["mage"]["intelligence"]}碎片')
+        ui.say(f'5) 法术强度 Lv.{levels["mage"]["spellpower"]} - {prices["mage"]["spellpower"]}碎片')
+        ui.say(f'6) 法力护盾 Lv.{levels["mage"]["mana_shield"]} - {prices["mage"]["mana_shield"]}碎片')
+        ui.say('\n0) 返回')
+        
+        choice = ui.ask('menu', '\n> ').strip()
+        if choice == '0':
+            return
+        
+        costs = {
+            '1': ('warrior', 'strength', prices['warrior']['strength']),
+            '2': ('warrior', 'vitality', prices['warrior']['vitality']),
+            '3': ('warrior', 'shield_master', prices['warrior']['shield_master']),
+            '4': ('mage', 'intelligence', prices['mage']['intelligence']),
+            '5': ('mage', 'spellpower', prices['mage']['spellpower']),
+            '6': ('mage', 'mana_shield', prices['mage']['mana_shield'])
+        }
+        
+        if choice in costs:
+            class_name, talent_name, cost = costs[choice]
+            if save['fragments'] >= cost:
+                update_save(save, ('add', ['fragments'], -cost),
+                            ('add', ['talent_tree', class_name, talent_name], 1))
+                ui.say(f'✨ {talent_name.title()} 提升到 Lv.{save["talent_tree"][class_name][talent_name]}')
+            else:
+                ui.say('灵魂碎片不足！')
+            ui.pause('按 Enter 继续...')
+
+class WarehouseIndex:
+    """装备仓库的内存索引：按类型、稀有度、词条筛选和按词条排序都不需要解码装备
+
+    每个筛选条件对应一个标记串，第 i 个字节为 1 表示第 i 件装备符合；
+    多个条件时标记串转成整数按位与一次即可合并，符合数量用 bytes.count 统计。
+    存入装备时用 append() 原地扩展各列，重铸后用 replace() 改写一项；二进制存档读取时用 from_rows() 直接由定长行建立，不逐件解码。
+    """
+    def __init__(self, storage=()):
+        self.size = n = len(storage)
+        self._values = {affix: array('H', bytes(2 * n)) for affix in Equipment.AFFIX_NAMES}
+        self._flag_bytes = {}                           # (维度, 取值) -> 标记串
+        self._masks = {}                                # (维度, 取值) -> 标记串转成的整数，用到时才转换
+        self._orders = {}                               # 词条 -> (数值降序, 低字节列, 高字节列, 已算出的各档)
+        self._matrix = None                             # 评分用的 n×词条 数值矩阵（numpy）
+        self._last = (None, None, 0)                    # 最近一次的 (条件, 标记串, 数量)，翻页时复用
+        for i, item in enumerate(storage):
+            keys = [('type', item['type']), ('rarity', item['rarity'])]
+            for affix, value in item['affixes'].items():
+                keys.append(('affix', affix))
+                self._values[affix][i] = value
+            for key in keys:
+                if key not in self._flag_bytes:
+                    self._flag_bytes[key] = bytearray(n)
+                self._flag_bytes[key][i] = 1
+
+    @classmethod
+    def from_rows(cls, rows, count, types, affixes):
+        """由二进制存档的定长行建立索引：各列按步长切片取出，标记串用 bytes.translate 生成"""
+        index = cls()
+        index.size = count
+        stride = 2 + 2 * len(affixes)
+        raw = bytes(rows[:count * stride])
+        for dim, column, names in (('type', raw[0::stride], types),
+                                   ('rarity', raw[1::stride], range(len(Equipment.RARITY)))):
+            for code, name in enumerate(names):
+                flags = column.translate(_one_hot(code))
+                if 1 in flags:
+                    index._flag_bytes[(dim, name)] = bytearray(flags)
+        for i, affix in enumerate(affixes):
+            if affix not in index._values:
+                continue  # 旧存档中已经取消的词条
+            column = bytearray(2 * count)
+            column[0::2] = raw[2 + 2 * i::stride]
+            column[1::2] = raw[3 + 2 * i::stride]
+            values = index._values[affix] = array('H', column)
+            if sys.byteorder == 'big':
+                values.byteswap()
+            flags = _nonzero_flags(values)
+            if 1 in flags:
+                index._flag_bytes[('affix', affix)] = bytearray(flags)
+        return index
+
+    def append(self, item):
+        """存入一件装备：各列末尾加一项，依赖旧数据的缓存作废"""
+        keys = {('type', item['type']), ('rarity', item['rarity'])}
+        keys.update(('affix', affix) for affix in item['affixes'])
+        for affix, values in self._values.items():
+            values.append(item['affixes'].get(affix, 0))
+        for key in keys:
+            if key not in self._flag_bytes:
+                self._flag_bytes[key] = bytearray(self.size)
+        for key, flags in self._flag_bytes.items():
+            flags.append(key in keys)
+        self.size += 1
+        self._invalidate()
+
+    def replace(self, index, item):
+        """替换第 index 件装备（如重铸后）：改写各列的这一项，依赖旧数据的缓存作废"""
+        keys = {('type', item['type']), ('rarity', item['rarity'])}
+        keys.update(('affix', affix) for affix in item['affixes'])
+        for affix, values in self._values.items():
+            values[index] = item['affixes'].get(affix, 0)
+        for key in keys:
+            if key not in self._flag_bytes:
+                self._flag_bytes[key] = bytearray(self.size)
+        for key, flags in self._flag_bytes.items():
+            flags[index] = key in keys
+        self._invalidate()
+
+    def _invalidate(self):
+        self._masks.clear()
+        self._orders.clear()
+        self._matrix = None
+        self._last = (None, None, 0)
+
+    def _mask(self, key):
+        if key not in self._masks:
+            self._masks[key] = int.from_bytes(self._flag_bytes.get(key, b''), 'little')
+        return self._masks[key]
+
+    def _flags(self, filters):
+        """把若干 (维度, 取值) 条件合并为标记串，返回 (标记串, 符合数量)"""
+        filters = tuple(filters)
+        if self._last[0] != filters:
+            if not filters:
+                flags = b'\x01' * self.size
+            elif len(filters) == 1:
+                flags = self._flag_bytes.get(filters[0], bytes(self.size))
+            else:
+                combined = self._mask(filters[0])
+                for key in filters[1:]:
+                    combined &= self._mask(key)
+                flags = combined.to_bytes(self.size, 'little')
+            self._last = (filters, flags, flags.count(1))
+        return self._last[1], self._last[2]
+
+    def _buckets(self, affix):
+        """按词条数值从高到低逐档生成标记串（整数形式），算过的档缓存起来
+
+        词条数值只有少数几种，每档用 bytes.translate 在 C 中一次算出，翻页通常只用到最高的几档。
+        """
+        cached = self._orders.get(affix)
+        if cached is None:
+            values = self._values[affix]
+            raw = values.tobytes()
+            low, high = (raw[0::2], raw[1::2]) if sys.byteorder == 'little' else (raw[1::2], raw[0::2])
+            cached = self._orders[affix] = (sorted(set(values), reverse=True), low, high, [])
+        distinct, low, high, masks = cached
+        yield from masks
+        for value in distinct[len(masks):]:
+            mask = (int.from_bytes(low.translate(_one_hot(value & 0xFF)), 'little')
+                    & int.from_bytes(high.translate(_one_hot(value >> 8)), 'little'))
+            masks.append(mask)
+            yield mask
+
+    def select(self, filters=(), sort_affix=None, offset=0, limit=10):
+        """返回 (符合条件的总数, 本页装备在仓库中的下标列表)
+
+        按词条排序时同值的下标小的在前：从数值最高的一档起，每档与筛选条件按位与后数出件数，
+        整档都在 offset 之前就直接跳过，不逐件检查。
+        """
+        flags, total = self._flags(filters)
+        if sort_affix is None:
+            return total, _flag_positions(flags, offset, limit)
+        page = []
+        if offset >= total:
+            return total, page
+        selected = int.from_bytes(flags, 'little') if filters else None
+        for mask in self._buckets(sort_affix):
+            hits = (mask if selected is None else mask & selected).to_bytes(self.size, 'little')
+            count = hits.count(1)
+            if offset >= count:
+                offset -= count
+                continue
+            page += _flag_positions(hits, offset, limit - len(page))
+            offset = 0
+            if len(page) == limit:
+                break
+        return total, page
+
+    def scores(self, affix_weights):
+        """给全部装备打分：仓库的词条数值矩阵 (n×词条) 与每点词条的分值做一次矩阵乘法（需要 numpy）"""
+        import numpy as np
+        if self._matrix is None:
+            # 各词条的数值列本来就是连续的 uint16，直接按缓冲区拼成矩阵，不逐件解码
+            self._matrix = np.column_stack([np.frombuffer(self._values[affix], dtype=np.uint16)
+                                            for affix in Equipment.AFFIX_NAMES])
+        return self._matrix @ np.asarray(affix_weights, dtype=float)
+
+    def best(self, affix_weights, type_, limit=1):
+        """该部位评分最高的 limit 件 [(下标, 评分)]，同分时下标小的在前"""
+        import numpy as np
+        scores = self.scores(affix_weights)
+        flags = self._flag_bytes.get(('type', type_))
+        if flags is None or not scores.size:
+            return []
+        scores[np.frombuffer(flags, dtype=np.uint8) == 0] = -np.inf
+        count = min(limit, flags.count(1))
+        # 第 count 高的分数作为门槛：高于门槛的全取，等于门槛的按下标补足
+        kth = -np.partition(-scores, count - 1)[count - 1]
+        above = np.flatnonzero(scores > kth).tolist()
+        top = above + np.flatnonzero(scores == kth)[:count - len(above)].tolist()
+        top.sort(key=lambda i: (-scores[i], i))
+        return [(i, float(scores[i])) for i in top]
+
+_NONZERO_FLAGS = b'\x00' + b'\x01' * 255  # bytes.translate 表：非零字节变为 1
+
+def _one_hot(code):
+    """bytes.translate 表：等于 code 的字节变为 1，其余变为 0"""
+    return bytes(code) + b'\x01' + bytes(255 - code)
+
+def _nonzero_flags(values):
+    """uint16 数组中非零元素的标记串：高低字节按整数或在一起，再把非零字节变为 1"""
+    raw = values.tobytes()
+    merged = int.from_bytes(raw[0::2], 'little') | int.from_bytes(raw[1::2], 'little')
+    return merged.to_bytes(len(values), 'little').translate(_NONZERO_FLAGS)
+
+def _flag_positions(flags, offset, limit):
+    """标记串中从第 offset 个起、最多 limit 个为 1 的位置"""
+    page, pos = [], -1
+    for _ in range(offset + limit):
+        pos = flags.find(1, pos + 1)
+        if pos < 0:
+            break
+        page.append(pos)
+    return page[offset:]
+
+def warehouse_index(storage):
+    """仓库的筛选排序索引：二进制存档读取时已经建好并随存入更新，普通列表当场建立"""
+    # 普通列表也有 index 属性（list.index 方法），不能按属性是否存在来判断
+    if isinstance(storage, list):
+        return WarehouseIndex(storage)
+    return storage.index
+
+def _cycle(options, current):
+    """在 [None, *options] 中切换到下一个取值"""
+    choices = [None, *options]
+    return choices[(choices.index(current) + 1) % len(choices)]
+
+def best_in_slot(save, index):
+    """按两个职业的开局属性权重，列出仓库中武器和护甲评分最高的装备"""
+    storage = save['equipment_storage']
+    try:
+        for hero in (Warrior(save), Mage(save)):
+            weights = hero.affix_weights()
+            ui.say(f'\n【{hero.name}】')
+            for type_ in Equipment.TYPES:
+                best = index.best(weights, type_)
+                if not best:
+                    ui.say(f'{type_}：仓库中没有')
+                    continue
+                i, score = best[0]
+                ui.say(f'{type_}（第 {i + 1} 件，评分 {score:.1f}）：\n{Equipment.from_dict(storage[i])}')
+    except ImportError:
+        ui.say('最佳配装需要安装 numpy')
+
+def equipment_storage(save):
+    """装备仓库界面：分页显示，只解码和渲染当前页的装备"""
+    storage = save['equipment_storage']
+    page_size = 10
+    page = 0
+    type_filter = rarity_filter = affix_filter = sort_affix = None
+    index = warehouse_index(storage)
+    while True:
+        ui.clear()
+        ui.say('=== 装备仓库 ===')
+        filters = [key for key in (('type', type_filter), ('rarity', rarity_filter),
+                                   ('affix', affix_filter)) if key[1] is not None]
+        if not filters and sort_affix is None:
+            total = len(storage)
+            start = page * page_size
+            shown = list(range(start, min(start + page_size, total)))
+            items = storage[start:start + page_size]
+        else:
+            total, shown = index.select(filters, sort_affix, page * page_size, page_size)
+            items = [storage[i] for i in shown]
+        pages = max(1, (total + page_size - 1) // page_size)
+        
+        labels = []
+        if type_filter is not None:
+            labels.append(type_filter)
+        if rarity_filter is not None:
+            labels.append(Equipment.RARITY[rarity_filter])
+        if affix_filter is not None:
+            labels.append(f'含{affix_filter}')
+        if sort_affix is not None:
+            labels.append(f'按{sort_affix}排序')
+        ui.say(f'共 {total} 件  第 {page + 1}/{pages} 页' + (f"  [{' '.join(labels)}]" if labels else ''))
+        if not total:
+            ui.say('仓库是空的...' if not filters else '没有符合条件的装备')
+        for idx, eq_data in zip(shown, items):
+            ui.say(f'\n{idx + 1}) {Equipment.from_dict(eq_data)}')
+        
+        ui.say('\nn) 下一页  p) 上一页  t) 类型  r) 稀有度  a) 词条  s) 排序  c) 清除筛选  b) 最佳配装')
+        ui.say('0) 返回')
+        choice = ui.ask('menu', '\n> ').strip().lower()
+        if choice == '0':
+            return
+        elif choice == 'b':
+            best_in_slot(save, index)
+            ui.pause('按 Enter 继续...')
+            continue
+        elif choice == 'n':
+            page = min(page + 1, pages - 1)
+            continue
+        elif choice == 'p':
+            page = max(page - 1, 0)
+            continue
+        elif choice == 't':
+            type_filter = _cycle(Equipment.TYPES, type_filter)
+        elif choice == 'r':
+            rarity_filter = _cycle(range(len(Equipment.RARITY)), rarity_filter)
+        elif choice == 'a':
+            affix_filter = _cycle(Equipment.AFFIX_NAMES, affix_filter)
+        elif choice == 's':
+            sort_affix = _cycle(Equipment.AFFIX_NAMES, sort_affix)
+        elif choice == 'c':
+            type_filter = rarity_filter = affix_filter = sort_affix = None
+        page = 0  # 条件变化后回到第一页
+
+def show_menu(title, options, show_souls=None):
+    """通用菜单显示函数"""
+    ui.menu(title, options, show_souls)
+
+def run(seed=None):
+    """主菜单循环；给定 seed 时第 n 局冒险使用种子 f'{seed}:{n}'，否则每局随机取种子"""
+    save = load_save()
+    adventures = 0
+    while True:
+        ui.clear()
+        options = [
+            "开始冒险",
+            "商店",
+            "铁匠铺",
+            "天赋树",
+            "装备仓库",
+            "历史记录",
+            "退出"
+        ]
+        show_menu("主菜单", options, save["fragments"])
+        choice = ui.ask('menu', '> ').strip()
+        if choice == '1':
+            update_save(save, ('add', ['records', 'total_runs'], 1))
+            play(save, None if seed is None else f'{seed}:{adventures}')
+            adventures += 1
+        elif choice == '2':
+            shop(save)
+        elif choice == '3':
+            forge(save)
+        elif choice == '4':
+            talent_tree(save)
+        elif choice == '5':
+            equipment_storage(save)
+        elif choice == '6':
+            show_records(save)
+        elif choice == '7':
+            sys.exit()
+        else:
+            ui.say('请输入 1-7')
+
+class RunResult:
+    """一局冒险的结构化结果"""
+    def __init__(self, hero, wave, cleared, fragments):
+        self.hero_class = hero.name
+        self.wave = wave                        # 阵亡或通关时的关卡数
+        self.cleared = cleared                  # 是否通关
+        self.boss_kills = hero.boss_kills
+        self.defeated_greed = hero.defeated_greed
+        self.fragments = fragments              # 本局获得的灵魂碎片
+        self.souls = hero.souls
+        self.hp = hero.hp
+        self.equipment = {slot: eq.to_dict() if eq else None
+                          for slot, eq in hero.equipment.items()}
+
+    def to_dict(self):
+        """将结果转换为可序列化的字典"""
+        return dict(self.__dict__)
+
+# ---------- 回放录制 ----------
+REPLAY_VERSION = 1
+# 决策类型在回放文件中的单字符代号，每条输入记为 代号+原始输入，如 'cA'
+KIND_CODES = {'hero_class': 'h', 'path': 'p', 'combat': 'c', 'event': 'e',
+              'event_choice': 'x', 'equip': 'q', 'store': 's', 'retry': 'r', 'menu': 'm'}
+CODE_KINDS = {code: kind for kind, code in KIND_CODES.items()}
+
+
+class Recorder:
+    """包装当前的 ui，把每个决策的输入依次记下来，其余调用原样转发"""
+    def __init__(self, inner):
+        self.inner = inner
+        self.inputs = []
+        self.result = None
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+    def ask(self, kind, prompt, **ctx):
+        answer = self.inner.ask(kind, prompt, **ctx)
+        self.inputs.append(KIND_CODES[kind] + answer)
+        if 'result' in ctx:
+            self.result = ctx['result']
+        return answer
+
+
+def new_seed():
+    """随机取一个 64 位种子"""
+    return int.from_bytes(os.urandom(8), 'little')
+
+
+def write_replay(path, seed, save, inputs, result):
+    """写回放文件：种子、开局时的存档（不含仓库）、输入序列和结局"""
+    data = {
+        'version': REPLAY_VERSION,
+        'seed': seed,
+        'save': {k: v for k, v in save.items() if k != 'equipment_storage'},
+        'inputs': inputs,
+        'result': result.to_dict() if result is not None else None,
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+
+
+def read_replay(path):
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    if data.get('version') != REPLAY_VERSION:
+        raise ValueError(f'不支持的回放版本：{data.get("version")}')
+    return data
+
+
+def play(save, seed=None, replay_file=None):
+    """用独立种子开始一局冒险并录制输入；无论正常结束、退出还是中断都会写出回放
+
+    replay_file 默认为当前 ui 的 replay_file。
+    """
+    seed = new_seed() if seed is None else seed
+    start_save = json.loads(json.dumps({k: v for k, v in save.items() if k != 'equipment_storage'}))
+    rng.seed(seed)
+    recorder = Recorder(session_ui())
+    replay_file = replay_file or getattr(recorder.inner, 'replay_file', REPLAY_FILE)
+    set_ui(recorder)
+    try:
+        recorder.result = game(save)
+        return recorder.result
+    finally:
+        set_ui(recorder.inner)
+        write_replay(replay_file, seed, start_save, recorder.inputs, recorder.result)
+
+def offer_equipment(hero, equip, title='获得装备'):
+    """展示掉落装备并询问是否装备"""
+    ui.log('equipment', title=title, item=equip)
+    if not ui.headless:  # 评分建议只给玩家看，无头模拟不必计算
+        weights = hero.affix_weights()
+        current = hero.equipment[equip.type]
+        new_score, old_score = equip.score(weights), current.score(weights) if current else 0
+        advice = '建议装备' if current is None or new_score > old_score else '建议保留当前装备'
+        ui.say(f'评分 {new_score:.1f}（当前{equip.type} {old_score:.1f}），{advice}')
+    if ui.ask('equip', '是否装备？(y/n) > ', hero=hero, equip=equip).lower() == 'y':
+        hero.equip(equip)
+
+def spawn_monster(hero, wave, path):
+    """生成第 wave 关的怪物：每层第 4 关为 Boss，第 2 关为精英，满足条件时第 11 关换成隐藏Boss"""
+    # 判断当前关是否是Boss或精英
+    is_boss = wave % 4 == 0
+    is_elite = wave % 2 == 0 and not is_boss
+    
+    # 检查隐藏Boss触发条件
+    if wave == 11 and hero.items['血瓶'] >= 5 and not hero.defeated_greed:
+        # 在第三层第3关触发隐藏Boss
+        ui.say('\n💎 宝箱散发出贪婪的气息...')
+        ui.say('你的血瓶引来了隐藏Boss！')
+        monster = path.spawn('greed')
+        ui.pause('按 Enter 继续...')
+    # 从当前路线的出怪表生成对应的怪物，属性已按路线折算
+    elif is_boss:
+        monster = path.spawn('boss')
+    elif is_elite:
+        monster = path.spawn('elite')
+    else:
+        monster = path.spawn('normal')
+    return monster
+
+def combat_turn(hero, monster, cmd):
+    """结算玩家输入 cmd 对应的一个战斗回合，返回 (战斗是否结束, 本回合攻击造成的伤害)
+
+    喝血瓶和无效输入不会引来反击；攻击击杀或逃跑成功时怪物也不再反击。
+    """
+    dmg = 0
+    if cmd == '1':
+        if not hero.use_item('1'):
+            ui.say('❌ 没有血瓶!')
+        return False, 0
+    elif cmd == 'A':
+        dmg = hero.power()
+        if '暴击' in hero.talents and rng.randrange(4) == 0:
+            dmg *= 2
+            ui.log('crit')
+        if isinstance(hero, Mage):
+            dmg += hero.magic_damage()
+        monster.hp -= dmg
+        ui.log('attack', amount=dmg)
+        if monster.hp <= 0:
+            return True, dmg
+    elif cmd == 'R':
+        if rng.randrange(2):
+            ui.log('flee')
+            return True, 0
+        else:
+            ui.log('flee_failed')
+    else:
+        return False, 0
+
+    m_dmg = monster.atk
+    if '护盾' in hero.talents:
+        m_dmg = max(1, m_dmg - 5)
+    
+    # 恶魔契约效果：受到的伤害增加50%
+    if hero.event_flags['demon_pact']:
+        m_dmg = int(m_dmg * 1.5)
+    
+    # 反伤
+    if hero.thorns > 0:
+        thorns_dmg = hero.thorns
+        monster.hp -= thorns_dmg
+        ui.log('thorns', amount=thorns_dmg)
+    
+    hero.hp -= m_dmg
+    ui.log('counter', monster=monster.name, amount=m_dmg)
+    return hero.hp <= 0, dmg
+
+def game(save):
+    while True:
+        ui.clear()
+        ui.say('=== 职业选择 ===')
+        ui.say('1) 战士')
+        ui.say('2) 法师')
+        c = ui.ask('hero_class', '> ', save=save).strip()
+        if c == '1':
+            hero = Warrior(save)
+            break
+        elif c == '2':
+            hero = Mage(save)
+            break
+        else:
+            ui.say('请输入 1 或 2')
+
+    floor = 1  # 当前层数
+    wave = 0   # 当前层内的关卡数
+    current_path = None  # 当前选择的路线
+    
+    while True:
+        wave += 1
+        
+        # 每层开始时选择路线
+        if wave == 1 or wave % 4 == 0:
+            current_path = choose_path(hero, wave)
+            hero.hp = hero.max_hp  # 进入新层时回满血
+            floor = (wave - 1) // 4 + 1
+            if floor > 1:
+                ui.say(f'\n🏰 欢迎来到第 {floor} 层!')
+                ui.pause('按 Enter 继续...')
+        
+        monster = spawn_monster(hero, wave, current_path)
+
+        ui.battle(f'--- 第 {floor} 层 {wave % 4 or 4}/{4} 关 [{current_path.name}] ---', hero, monster)
+
+        dmg = 0  # 最后一次攻击造成的伤害，击杀后的吸血按它计算
+        while monster.hp > 0 and hero.hp > 0:
+            potions = f'({hero.items["血瓶"]})' if hero.items['血瓶'] else '(无)'
+            cmd = ui.ask('combat', f'\n[A]攻击  [R]逃跑  [1]血瓶{potions}\n> ',
+                         hero=hero, monster=monster).strip().upper()
+            over, dealt = combat_turn(hero, monster, cmd)
+            dmg = dealt or dmg
+            if over:
+                break
+        ui.end_battle()
+
+        if monster.hp <= 0:
+            ui.log('kill', monster=monster.name)
+            hero.collect(monster.souls)
+            
+            # 装备掉落
+            if monster.is_boss:
+                hero.boss_kills += 1
+                if monster.name == GREED_BOSS[0]:
+                    hero.defeated_greed = True
+                    hero.items['血瓶'] += 3
+                    ui.log('greed_potions')
+                    # 贪婪宝箱必定掉落史诗装备
+                    type_ = rng.choice(Equipment.TYPES)
+                    offer_equipment(hero, Equipment(type_, 2), '获得传说装备')  # 史诗品质
+                else:
+                    hero.items['血瓶'] += 1
+                    ui.log('boss_potion')
+                    # Boss必定掉落稀有或史诗装备
+                    rarity = rng.randint(1, 2)
+                    type_ = rng.choice(Equipment.TYPES)
+                    offer_equipment(hero, Equipment(type_, rarity))
+            elif monster.is_elite:
+                # 精英40%掉落装备
+                if rng.random() < 0.4:
+                    rarity = rng.randint(0, 1)  # 普通或稀有
+                    type_ = rng.choice(Equipment.TYPES)
+                    offer_equipment(hero, Equipment(type_, rarity))
+            elif rng.random() < 0.2:  # 普通怪20%掉落
+                type_ = rng.choice(Equipment.TYPES)
+                offer_equipment(hero, Equipment(type_, 0))  # 普通品质
+            
+            # 血瓶掉落
+            elif rng.randrange(2) == 0:
+                hero.items['血瓶'] += 1
+                ui.log('potion_drop')
+            
+            # 吸血效果
+            if '吸血' in hero.talents or hero.lifesteal > 0:
+                heal = min(10 + int(hero.lifesteal * dmg), hero.max_hp - hero.hp)
+                hero.hp += heal
+                ui.log('lifesteal', amount=heal)
+            if monster.is_boss and wave < 12:  # 最后一层boss不需要选择
+                random_event(hero)
+                ui.say('\n🚪 你在前方发现了两个通道...')
+                ui.pause('按 Enter 继续...')
+            else:
+                ui.pause('按 Enter 继续…')
+
+        if hero.hp <= 0:
+            fragments = wave * 5 + hero.souls // 2
+            update_save(save, ('add', ['fragments'], fragments), persist=ui.persist)
+            if ui.persist:
+                save_writer.flush()
+            ui.say(f'\n💀 你阵亡在第 {wave} 关！')
+            ui.say(f'获得灵魂碎片 {fragments}，累计 {save["fragments"]}')
+            result = RunResult(hero, wave, False, fragments)
+            if ui.ask('retry', '输入 q 重新开始 > ', result=result).strip().lower() == 'q':
+                return result
+            else:
+                sys.exit()
+
+        if wave >= 12:  # 3层×4关=12关
+            # 更新记录
+            changes = [
+                ('set', ['records', 'highest_wave'], max(save['records']['highest_wave'], wave)),
+                ('add', ['records', 'total_boss_kills'], hero.boss_kills),
+            ]
+            if hero.defeated_greed:
+                changes.append(('add', ['records', 'greed_boss_kills'], 1))
+            
+            # 计算通关奖励（考虑难度加成）
+            base_fragments = 150
+            total_multiplier = sum(PATHS[p].rewards_multiplier for p in ['safe', 'danger']) / 2
+            
+            # 额外奖励：击败隐藏Boss
+            if hero.defeated_greed:
+                base_fragments += 100
+            
+            fragments = int(base_fragments * total_multiplier) + hero.souls
+            changes.append(('add', ['fragments'], fragments))
+            
+            # 存储装备到仓库
+            for eq in hero.equipment.values():
+                if eq and (eq.rarity >= 1 or ui.ask('store', f'是否保存{eq.type}到仓库？(y/n) > ',
+                                                    hero=hero, equip=eq).lower() == 'y'):
+                    changes.append(('append', ['equipment_storage'], eq.to_dict()))
+                    ui.say(f'已将{eq.RARITY[eq.rarity]}{eq.type}存入仓库')
+            
+            update_save(save, *changes, persist=ui.persist)
+            if ui.persist:
+                save_writer.flush()
+            
+            ui.say(f'\n🎉 恭喜通关地牢三层！')
+            ui.say(f'获得灵魂碎片 {fragments}，累计 {save["fragments"]}')
+            
+            # 显示结局
+            ui.say('\n=== 你的旅程 ===')
+            if hero.defeated_greed:
+                ui.say('🏆 隐藏成就：击败贪婪宝箱！')
+            
+            if hero.boss_kills == 0:
+                ui.say('🏃 "逃跑大师"')
+                ui.say('你成功通过了地牢，但没有击败任何一个Boss...')
+                ui.say('也许下次可以更勇敢一点？')
+            elif hero.boss_kills <= 2:
+                ui.say('⚔️ "初出茅庐"')
+                ui.say(f'你击败了{hero.boss_kills}个Boss，展现出了不错的实力。')
+                ui.say('继续历练，你会变得更强！')
+            elif hero.boss_kills == 3:
+                ui.say('👑 "地牢征服者"')
+                ui.say('你击败了所有Boss，证明了自己的实力！')
+                ui.say('但是否还有更强大的对手在等待着你？')
+            elif hero.boss_kills >= 4:
+                ui.say('💎 "传说英雄"')
+                ui.say(f'你总共击败了{hero.boss_kills}个Boss，包括隐藏的贪婪宝箱！')
+                ui.say('你的名字将被永远铭记在地牢的历史上！')
+            
+            ui.pause('按 Enter 返回主菜单…')
+            return RunResult(hero, wave, True, fragments)
+
+# ---------- 性能统计 ----------
+# 计时的阶段 -> 本模块中的函数名；run 的独占耗时即主菜单循环本身
+MODULE_PHASES = {
+    'run': 'run',
+    'game': 'game',
+    'wave_setup': 'spawn_monster',
+    'combat_turn': 'combat_turn',
+    'random_event': 'random_event',
+    'load_save': 'load_save',
+    'save_save': 'save_save',
+    'update_save': 'update_save',
+}
+# 计时的阶段 -> ui 对象上的方法名；input 是等待玩家输入的时间
+UI_PHASES = {
+    'input': ('ask', 'pause'),
+    'clear': ('clear',),
+    'render': ('say', 'log', 'menu', 'battle', 'end_battle', 'redraw'),
+}
+
+
+class Instruments:
+    """可选的分阶段计时：enable() 时把各阶段的函数替换为计时包装，未启用时没有任何额外开销
+
+    每个阶段统计调用次数、总耗时、单次最长耗时和独占耗时（扣除嵌套在其中的其它阶段，
+    例如菜单循环的独占耗时不含等待输入和渲染）。
+    """
+    def __init__(self):
+        self.enabled = False
+        self.phases = {}    # 阶段 -> [次数, 总耗时, 独占耗时, 单次最长]
+        self._stack = []    # 正在计时的各层阶段中嵌套阶段已用掉的时间
+        self._patched = []  # (对象, 属性名, 原值)，disable() 时还原
+        self._started = None
+
+    def enable(self, target_ui=None):
+        """开始计时；target_ui 默认为当前的 ui"""
+        if self.enabled:
+            return
+        module = sys.modules[__name__]
+        for phase, name in MODULE_PHASES.items():
+            self._patch(module, name, phase)
+        target_ui = target_ui or ui
+        for phase, names in UI_PHASES.items():
+            for name in names:
+                if hasattr(target_ui, name):
+                    self._patch(target_ui, name, phase)
+        self._started = time.perf_counter()
+        self.enabled = True
+
+    def disable(self):
+        """停止计时并还原被替换的函数，已有的统计保留"""
+        for obj, name, original in reversed(self._patched):
+            if original is None:
+                delattr(obj, name)  # ui 的方法原本来自类，删掉实例上的包装即可
+            else:
+                setattr(obj, name, original)
+        self._patched.clear()
+        self.enabled = False
+
+    def _patch(self, obj, name, phase):
+        self._patched.append((obj, name, vars(obj).get(name)))
+        setattr(obj, name, self.wrap(phase, getattr(obj, name)))
+
+    def wrap(self, phase, func):
+        """返回把每次调用计入 phase 的包装函数"""
+        stats = self.phases.setdefault(phase, [0, 0.0, 0.0, 0.0])
+        stack = self._stack
+        clock = time.perf_counter
+
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            stack.append(0.0)
+            start = clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = clock() - start
+                nested = stack.pop()
+                if stack:
+                    stack[-1] += elapsed
+                stats[0] += 1
+                stats[1] += elapsed
+                stats[2] += elapsed - nested
+                if elapsed > stats[3]:
+                    stats[3] = elapsed
+        return timed
+
+    def report(self):
+        """把统计结果整理为可序列化的字典，耗时单位为毫秒"""
+        phases = {
+            phase: {'calls': calls, 'total_ms': total * 1e3, 'self_ms': own * 1e3,
+                    'max_ms': longest * 1e3, 'avg_us': total / calls * 1e6 if calls else 0.0}
+            for phase, (calls, total, own, longest) in self.phases.items()
+        }
+        wall = time.perf_counter() - self._started if self._started is not None else 0.0
+        return {'wall_s': wall, 'phases': phases, 'save_writer': save_writer.stats()}
+
+    def dump(self, path=PROFILE_FILE):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, ensure_ascii=False, indent=2)
+
+
+instruments = Instruments()
+
+# ========================= 商店 =========================
+# 商店每级的碎片价格
+SHOP_PRICES = {'atk+5': 20, 'hp+20': 15, 'potion+1': 10}
+
+def shop(save):
+    prices = SHOP_PRICES
+    while True:
+        ui.clear()
+        ui.say('=== 商店 ===')
+        ui.say(f'你拥有灵魂碎片：{save["fragments"]}')
+        for idx, (k, v) in enumerate(prices.items(), 1):
+            level = save['shop'][k]
+            ui.say(f'{idx}) {k}（已{level}级）- {v} 碎片')
+        ui.say('0) 返回')
+        choice = ui.ask('menu', '> ').strip()
+        if choice == '0':
+            return
+        try:
+            idx = int(choice)
+            key = list(prices.keys())[idx - 1]
+            cost = prices[key]
+            if save['fragments'] >= cost:
+                update_save(save, ('add', ['fragments'], -cost), ('add', ['shop', key], 1))
+                ui.say(f'✔ 已购买 {key}！')
+            else:
+                ui.say('❌ 碎片不足！')
+            ui.pause('按 Enter 继续…')
+        except (IndexError, ValueError):
+            ui.say('请输入正确编号')
+
+def main(argv=None):
+    """命令行入口：解析参数后运行游戏"""
+    global ui, profile_store
+    import argparse
+    parser = argparse.ArgumentParser(description='Roguelike 地牢小游戏')
+    parser.add_argument('--db', help='使用 SQLite 数据库保存存档（可多人共用一个文件）')
+    parser.add_argument('--profile', default='default', help='数据库中的玩家档案名')
+    parser.add_argument('--plain', action='store_true', help='纯文本界面：只用 ANSI 颜色，不加载 rich，启动更快')
+    parser.add_argument('--seed', help='固定随机种子，相同种子和相同输入得到相同的冒险')
+    parser.add_argument('--instrument', action='store_true',
+                        help=f'统计各阶段耗时，退出时写入 {os.path.basename(PROFILE_FILE)}')
+    parser.add_argument('--cprofile', action='store_true',
+                        help=f'用 cProfile 运行整个会话，退出时写入 {os.path.basename(CPROFILE_FILE)}')
+    parser.add_argument('--auto', action='store_true',
+                        help='自动战斗：战斗回合和拾取装备由策略决定，每关只显示一段汇总')
+    parser.add_argument('--auto-potion', type=float, default=0.35, help='自动战斗时血量低于该比例喝血瓶')
+    parser.add_argument('--auto-flee', type=float, default=0.0, help='自动战斗时没有血瓶且血量低于该比例就逃跑')
+    parser.add_argument('--auto-equip', choices=('rarity', 'score'), default='rarity',
+                        help='自动换装规则：品质不低于当前（rarity）或评分更高（score）')
+    parser.add_argument('--auto-path', choices=('1', '2'),
+                        help='自动战斗时每层自动选择安全（1）或危险（2）通道，默认仍由玩家选择')
+    parser.add_argument('--auto-events', action='store_true',
+                        help='自动战斗时随机事件也由策略决定（付得起就接受）')
+    args = parser.parse_args(argv)
+    if args.plain:
+        ui = PlainUI()
+    if args.db:
+        import profiledb
+        profile_store = profiledb.SQLiteProfileStore(args.db, args.profile)
+    if args.instrument:
+        instruments.enable()
+    if args.auto:  # 在计时之后包装，统计的仍是实际的输入和绘制次数
+        import sim
+        kinds = sim.AutoBattleUI.AUTO_KINDS
+        if args.auto_path:
+            kinds += sim.AutoBattleUI.PATH_KINDS
+        if args.auto_events:
+            kinds += sim.AutoBattleUI.EVENT_KINDS
+        ui = sim.AutoBattleUI(ui, sim.Policy(path=args.auto_path or '1', potion_threshold=args.auto_potion,
+                                             flee_below=args.auto_flee, equip_rule=args.auto_equip), kinds)
+    if args.cprofile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        run(args.seed)
+    except KeyboardInterrupt:
+        save_writer.flush()
+        print('\n游戏被强制退出')
+    finally:
+        if args.cprofile:
+            profiler.disable()
+            profiler.dump_stats(CPROFILE_FILE)
+        if args.instrument:
+            save_writer.flush()
+            instruments.dump()
@@ -0,0 +1,214 @@
+# markov.py
+"""精确战斗结算：把一场战斗看作 (英雄血量, 怪物血量, 血瓶数) 上的马尔可夫链，直接求出
+胜率、获胜时的期望剩余血量和期望回合数，不需要抽样
+
+规则与 combat_turn 相同：25% 天赋暴击、法师魔法飞弹、护盾 -5 减伤、恶魔契约 1.5 倍受伤、
+反伤和击杀后的吸血；英雄按 sim.Policy 的默认策略行动：血量低于阈值且有血瓶时喝药，否则攻击。
+喝药让血瓶数减一，攻击让怪物血量减少，因此状态图无环，每个状态只需按转移概率求一次。
+
+同一属性表对同一攻击力的怪物共用一张状态表（LRU 缓存），不同的开局血量、怪物血量都能复用已算过的状态。
+"""
+import functools, sys, time
+from collections import namedtuple
+
+import dungeon
+
+# 战斗中不变的英雄属性；血量和血瓶数是链的状态，不在其中
+HeroSheet = namedtuple('HeroSheet', 'max_hp power crit magic_chance magic_dmg shield demon thorns lifesteal leech')
+# win：获胜且存活的概率；hp_left：获胜时的期望剩余血量；turns：期望回合数（含喝药回合）
+Outcome = namedtuple('Outcome', 'win hp_left turns')
+
+
+def hero_sheet(hero):
+    """从 Character 提取战斗属性表"""
+    is_mage = isinstance(hero, dungeon.Mage)
+    return HeroSheet(
+        max_hp=hero.max_hp,
+        power=hero.power(),
+        crit='暴击' in hero.talents,
+        magic_chance=min(1.0, hero.magic_chance) if is_mage else 0.0,
+        magic_dmg=int((10 + hero.attrs['智力'] * 3) * (1 + hero.spell_power)) if is_mage else 0,
+        shield='护盾' in hero.talents,
+        demon=bool(hero.event_flags['demon_pact']),
+        thorns=hero.thorns,
+        lifesteal=hero.lifesteal,
+        leech='吸血' in hero.talents or hero.lifesteal > 0,
+    )
+
+
+class FightModel:
+    """一张属性表对一种怪物攻击力的战斗链，状态值按需计算并缓存在 _values 中"""
+    __slots__ = ('sheet', 'threshold', 'counter', 'attacks', '_values')
+
+    def __init__(self, sheet, monster_atk, potion_threshold=0.35):
+        self.sheet = sheet
+        self.threshold = sheet.max_hp * potion_threshold
+        counter = max(1, monster_atk - 5) if sheet.shield else monster_atk
+        self.counter = int(counter * 1.5) if sheet.demon else counter
+        # 一次攻击的伤害分布 [(概率, 伤害)]：先判定暴击，再判定魔法飞弹，两者独立
+        crit = 0.25 if sheet.crit else 0.0
+        attacks = {}
+        for p_crit, base in ((1 - crit, sheet.power), (crit, sheet.power * 2)):
+            for p_magic, extra in ((1 - sheet.magic_chance, 0), (sheet.magic_chance, sheet.magic_dmg)):
+                if p_crit * p_magic:
+                    attacks[base + extra] = attacks.get(base + extra, 0.0) + p_crit * p_magic
+        self.attacks = [(p, dmg) for dmg, p in attacks.items()]
+        if self.counter <= 0 and max(attacks) + sheet.thorns <= 0:
+            raise ValueError('双方都无法造成伤害，战斗不会结束')
+        self._values = {}
+
+    def outcome(self, hp, monster_hp, potions=0):
+        """从给定状态开始的战斗结果"""
+        if monster_hp <= 0:
+            return Outcome(1.0, hp, 0.0)
+        if hp <= 0:
+            return Outcome(0.0, 0.0, 0.0)
+        win, hp_win, turns = self._value(hp, monster_hp, potions)
+        return Outcome(win, hp_win / win if win else 0.0, turns)
+
+    def _end(self, hp, dmg):
+        """怪物死亡时结算吸血，返回 (是否存活, 最终血量)"""
+        sheet = self.sheet
+        if sheet.leech:
+            hp += min(10 + int(sheet.lifesteal * dmg), sheet.max_hp - hp)
+        return hp > 0, hp
+
+    def _value(self, h, m, p):
+        """返回 (获胜概率, 获胜时剩余血量的期望之和 E[hp·1胜], 期望回合数)
+
+        用显式栈代替递归，战斗再长也不受递归深度限制，也不必改动整个进程共享的递归上限。
+        栈帧为 (英雄血量, 怪物血量, 血瓶数, 下一个攻击分支, 已累加的三项)：遇到还没求出的
+        后继时记下进度并压入后继，后继求出后从断点继续，累加顺序与逐层递归相同。
+        """
+        values = self._values
+        root = (h, m, p)
+        if root in values:
+            return values[root]
+        sheet, threshold, counter, attacks = self.sheet, self.threshold, self.counter, self.attacks
+        thorns, max_hp, branches = sheet.thorns, sheet.max_hp, len(attacks)
+        lookup = values.get
+        stack = [(h, m, p, 0, 0.0, 0.0, 0.0)]
+        while stack:
+            h, m, p, i, win, hp_win, turns = stack[-1]
+            if p and h < threshold:
+                child = (h + min(40, max_hp - h), m, p - 1)
+                value = lookup(child)
+                if value is None:
+                    stack.append((*child, 0, 0.0, 0.0, 0.0))
+                    continue
+                values[(h, m, p)] = (value[0], value[1], value[2] + 1)
+                stack.pop()
+                continue
+            hurt = h - counter
+            while i < branches:
+                prob, dmg = attacks[i]
+                left = m - dmg
+                if left <= 0:  # 击杀，不再反击
+                    alive, final = self._end(h, dmg)
+                else:
+                    left -= thorns
+                    if hurt > 0 and left > 0:
+                        value = lookup((hurt, left, p))
+                        if value is None:
+                            break
+                        win += prob * value[0]
+                        hp_win += prob * value[1]
+                        turns += prob * value[2]
+                        i += 1
+                        continue
+                    # 反伤打死怪物时照常吸血，之后血量仍不大于 0 才算阵亡
+                    alive, final = self._end(hurt, dmg) if left <= 0 else (False, hurt)
+                if alive:
+                    win += prob
+                    hp_win += prob * final
+                i += 1
+            if i < branches:
+                stack[-1] = (h, m, p, i, win, hp_win, turns)
+                stack.append((hurt, left, p, 0, 0.0, 0.0, 0.0))
+                continue
+            values[(h, m, p)] = (win, hp_win, turns + 1)
+            stack.pop()
+        return values[root]
+
+
+@functools.lru_cache(maxsize=1024)
+def model(sheet, monster_atk, potion_threshold=0.35):
+    """按 (属性表, 怪物攻击力, 喝药阈值) 缓存的 FightModel"""
+    return FightModel(sheet, monster_atk, potion_threshold)
+
+
+def solve(hero, monster, potion_threshold=0.35):
+    """hero 以当前血量和血瓶迎战 monster 的精确结果"""
+    return model(hero_sheet(hero), monster.atk, potion_threshold).outcome(
+        hero.hp, monster.hp, hero.items['血瓶'])
+
+
+def floor_table(hero, path, potion_threshold=0.35):
+    """hero 以当前状态迎战路线 path 上每种怪物的结果
+
+    返回 {档位: [(怪物名, 血量, 攻击, 出现权重, Outcome)]}，档位同 DungeonPath.TIERS。
+    """
+    sheet = hero_sheet(hero)
+    table = {}
+    for tier, (entries, _, _) in path.TIERS.items():
+        rows = table[tier] = []
+        for entry in entries:
+            name, hp, atk, _ = path.scale(*entry)
+            outcome = model(sheet, atk, potion_threshold).outcome(hero.hp, hp, hero.items['血瓶'])
+            rows.append((name, hp, atk, path.weights.get(entry[0], 1), outcome))
+    return table
+
+
+def tier_win_rate(rows):
+    """按出现权重平均一档怪物的胜率"""
+    total = sum(weight for _, _, _, weight, _ in rows)
+    return sum(weight * outcome.win for _, _, _, weight, outcome in rows) / total
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='按当前存档计算每条路线上各怪物的精确胜率')
+    parser.add_argument('--mage', action='store_true', help='使用法师（默认战士）')
+    parser.add_argument('--potion-threshold', type=float, default=0.35, help='血量低于该比例时喝药')
+    parser.add_argument('--compare', type=int, metavar='N',
+                        help='另用 vcombat 对每种怪物各模拟 N 场，比较结果和耗时（需要 numpy）')
+    args = parser.parse_args(argv)
+
+    save = dungeon.load_save()
+    hero = dungeon.Mage(save) if args.mage else dungeon.Warrior(save)
+    start = time.perf_counter()
+    tables = {key: floor_table(hero, path, args.potion_threshold) for key, path in dungeon.PATHS.items()}
+    elapsed = time.perf_counter() - start
+
+    for key, table in tables.items():
+        print(f'\n== {dungeon.PATHS[key].name} ==')
+        for tier, rows in table.items():
+            for name, hp, atk, _, outcome in rows:
+                print(f'  {name:<8}HP {hp:>4}  ATK {atk:>3}   胜率 {outcome.win:>8.4%}  '
+                      f'剩余血量 {outcome.hp_left:>6.1f}  回合 {outcome.turns:>5.2f}')
+            print(f'  [{tier}] 加权胜率 {tier_win_rate(rows):.4%}')
+    print(f'\n{hero.name} HP {hero.hp}/{hero.max_hp}，血瓶 {hero.items["血瓶"]}：'
+          f'精确求解用时 {elapsed * 1000:.1f} ms')
+
+    if args.compare:
+        import numpy as np
+        import vcombat
+        heroes, _ = vcombat.from_pairs([(hero, dungeon.Monster(*dungeon.NORMAL_NAMES[0]))])
+        heroes = {k: np.repeat(v, args.compare) for k, v in heroes.items()}
+        rng = np.random.default_rng(0)
+        worst = 0.0
+        start = time.perf_counter()
+        for table in tables.values():
+            for rows in table.values():
+                for _, hp, atk, _, outcome in rows:
+                    monsters = {'hp': np.full(args.compare, hp), 'atk': np.full(args.compare, atk)}
+                    result = vcombat.resolve(heroes, monsters, rng, args.potion_threshold)
+                    rate = np.mean(result['won'] & (result['hero_hp'] > 0))
+                    worst = max(worst, abs(rate - outcome.win))
+        mc = time.perf_counter() - start
+        print(f'蒙特卡洛每种怪物 {args.compare} 场：用时 {mc * 1000:.1f} ms，'
+              f'与精确胜率的最大偏差 {worst:.4%}（标准误差上限 {0.5 / args.compare ** 0.5:.4%}）')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
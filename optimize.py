@@ -0,0 +1,228 @@
+# optimize.py
+"""配装优化：给定碎片预算，搜索商店与天赋的加点方案，找出通关率最高的几种
+
+搜索空间是把预算花到买不起任何一级为止的全部方案：战士为商店三项加战士天赋，法师为商店三项加法师天赋。
+先按方案数均匀抽取 --candidates 个候选，再做逐次减半（successive halving）：每轮给所有候选补足同样的
+模拟局数，保留通关率靠前的一半（同分依次比平均到达关卡和平均碎片），下一轮局数翻倍，直到剩下 --top 个。
+
+所有方案的第 i 局使用同一个种子（公共随机数），方案之间比较时方差更小；评估结果按方案缓存，
+之后的轮次只补跑新增的局。模拟分发到进程池，结果只由主种子决定，与进程数无关。
+"""
+import functools, math, os, random, sys, time
+from multiprocessing import Pool
+
+import dungeon
+import sim
+import batch
+
+CLASSES = {'warrior': ('1', '战士'), 'mage': ('2', '法师')}  # 职业 -> (Policy 的职业选项, 名称)
+
+# 每个工作进程各自持有的开局存档、主种子和通道选项（由 _init_worker 设置）
+_worker_save = None
+_worker_seed = None
+_worker_path = None
+
+
+def plan_items(hero_class):
+    """职业可以加点的各项 [(存档中的键路径, 每级价格)]"""
+    items = [(('shop', key), price) for key, price in dungeon.SHOP_PRICES.items()]
+    items += [(('talent_tree', hero_class, name), price)
+              for name, price in dungeon.TALENT_COSTS[hero_class].items()]
+    return items
+
+
+def apply_plan(save, items, levels):
+    """返回在 save 上追加 levels 级后的存档副本，不修改 save"""
+    save = dict(save, shop=dict(save['shop']),
+                talent_tree={name: dict(tree) for name, tree in save['talent_tree'].items()})
+    for (path, _), level in zip(items, levels):
+        target = save
+        for key in path[:-1]:
+            target = target[key]
+        target[path[-1]] += level
+    return save
+
+
+class PlanSpace:
+    """把预算花到买不起任何一级为止的所有加点方案，支持计数、均匀抽样和枚举"""
+    def __init__(self, prices, budget):
+        self.prices = tuple(prices)
+        self.budget = budget
+        self.cheapest = min(self.prices)
+        self._count = functools.lru_cache(maxsize=None)(self._count_from)
+
+    def _count_from(self, i, left):
+        """从第 i 项起、剩余 left 碎片时的方案数"""
+        if i == len(self.prices):
+            return int(left < self.cheapest)
+        price = self.prices[i]
+        return sum(self._count(i + 1, left - k * price) for k in range(left // price + 1))
+
+    def size(self):
+        return self._count(0, self.budget)
+
+    def sample(self, rand):
+        """均匀抽取一个方案：每一项按后续可行方案数加权决定买几级"""
+        levels, left = [], self.budget
+        for i, price in enumerate(self.prices):
+            weights = [self._count(i + 1, left - k * price) for k in range(left // price + 1)]
+            k = rand.choices(range(len(weights)), weights)[0]
+            levels.append(k)
+            left -= k * price
+        return tuple(levels)
+
+    def __iter__(self):
+        def walk(i, left, prefix):
+            if i == len(self.prices):
+                if left < self.cheapest:
+                    yield prefix
+                return
+            for k in range(left // self.prices[i] + 1):
+                yield from walk(i + 1, left - k * self.prices[i], prefix + (k,))
+        return walk(0, self.budget, ())
+
+    def candidates(self, n, rand):
+        """方案总数不超过 n 时返回全部，否则均匀抽取 n 个不同的方案"""
+        if self.size() <= n:
+            return list(self)
+        chosen = set()
+        while len(chosen) < n:
+            chosen.add(self.sample(rand))
+        return sorted(chosen)
+
+
+def _init_worker(save, master_seed, path_choice):
+    global _worker_save, _worker_seed, _worker_path
+    _worker_save, _worker_seed, _worker_path = save, master_seed, path_choice
+
+
+def _init_pool_worker(save, master_seed, path_choice):
+    _init_worker(save, master_seed, path_choice)
+    # 只在工作进程里替换全局 random，不与其它进程共享，每局开始前按 run_seed 重新播种
+    dungeon.rng = random.Random()
+
+
+def _run_task(task):
+    """跑某个方案第 start 到 stop-1 局，返回 (职业, 方案, 局数, 通关数, 到达关卡之和, 碎片之和)"""
+    hero_class, levels, start, stop = task
+    save = apply_plan(_worker_save, plan_items(hero_class), levels)
+    policy = sim.Policy(CLASSES[hero_class][0], _worker_path)
+    cleared = waves = fragments = 0
+    for i in range(start, stop):
+        result = sim.simulate(save, policy, batch.run_seed(_worker_seed, i))
+        cleared += result.cleared
+        waves += result.wave
+        fragments += result.fragments
+    return hero_class, levels, stop - start, cleared, waves, fragments
+
+
+class Evaluator:
+    """按 (职业, 方案) 缓存模拟结果，evaluate 只补跑缺少的局数"""
+    def __init__(self, pool=None, chunk_size=64):
+        self.pool = pool
+        self.chunk_size = chunk_size
+        self.results = {}   # (职业, 方案) -> [局数, 通关数, 到达关卡之和, 碎片之和]
+        self.simulated = 0  # 实际模拟的局数
+        self.reused = 0     # 命中缓存、无需重跑的局数
+
+    def evaluate(self, hero_class, plans, runs):
+        """保证每个方案至少模拟过 runs 局"""
+        tasks = []
+        for levels in plans:
+            done = self.results.setdefault((hero_class, levels), [0, 0, 0, 0])[0]
+            self.reused += min(done, runs)
+            for start in range(done, runs, self.chunk_size):
+                tasks.append((hero_class, levels, start, min(start + self.chunk_size, runs)))
+        chunks = self.pool.imap_unordered(_run_task, tasks) if self.pool else map(_run_task, tasks)
+        for hero_class_, levels, *counts in chunks:
+            stats = self.results[(hero_class_, levels)]
+            for i, value in enumerate(counts):
+                stats[i] += value
+            self.simulated += counts[0]
+
+    def score(self, hero_class, levels):
+        """排序依据：(通关率, 平均到达关卡, 平均碎片)"""
+        runs, cleared, waves, fragments = self.results[(hero_class, levels)]
+        return cleared / runs, waves / runs, fragments / runs
+
+    def interval(self, hero_class, levels, z=1.96):
+        """通关率的 Wilson 置信区间（默认 95%）"""
+        runs, cleared = self.results[(hero_class, levels)][:2]
+        p = cleared / runs
+        center = (p + z * z / (2 * runs)) / (1 + z * z / runs)
+        half = z * math.sqrt(p * (1 - p) / runs + z * z / (4 * runs * runs)) / (1 + z * z / runs)
+        return max(0.0, center - half), min(1.0, center + half)
+
+
+def successive_halving(evaluator, hero_class, plans, min_runs, top):
+    """逐次减半，返回按得分排序的最后 top 个方案"""
+    runs = min_runs
+    while True:
+        evaluator.evaluate(hero_class, plans, runs)
+        plans = sorted(plans, key=lambda levels: evaluator.score(hero_class, levels), reverse=True)
+        if len(plans) <= top:
+            return plans
+        plans = plans[:max(top, math.ceil(len(plans) / 2))]
+        runs *= 2
+
+
+def describe(items, levels):
+    """方案的可读描述，如 atk+5×3 strength×2"""
+    parts = [f'{path[-1]}×{level}' for (path, _), level in zip(items, levels) if level]
+    return ' '.join(parts) or '（不加点）'
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='按碎片预算搜索通关率最高的商店与天赋加点')
+    parser.add_argument('-b', '--budget', type=int, default=60, help='可花费的灵魂碎片')
+    parser.add_argument('--class', dest='classes', choices=list(CLASSES), action='append',
+                        help='只搜索该职业（默认两个职业都搜索）')
+    parser.add_argument('--current', action='store_true', help='在当前存档的加点上追加（默认从全新存档开始）')
+    parser.add_argument('--danger', action='store_true', help='始终选择危险通道')
+    parser.add_argument('--candidates', type=int, default=128, help='初始候选方案数')
+    parser.add_argument('--min-runs', type=int, default=32, help='第一轮每个方案的模拟局数')
+    parser.add_argument('--top', type=int, default=5, help='最终保留并报告的方案数')
+    parser.add_argument('--seed', type=int, default=0, help='主种子')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='进程数（默认 CPU 核数）')
+    args = parser.parse_args(argv)
+
+    base = dungeon.load_save() if args.current else dungeon.new_save()
+    base = dict(base, equipment_storage=[])
+    workers = args.workers or os.cpu_count() or 1
+    rand = random.Random(args.seed)
+    path_choice = '2' if args.danger else '1'
+    start = time.perf_counter()
+    pool = None
+    if workers > 1:
+        pool = Pool(workers, initializer=_init_pool_worker, initargs=(base, args.seed, path_choice))
+    else:
+        _init_worker(base, args.seed, path_choice)
+    evaluator = Evaluator(pool)
+    state = dungeon.rng.getstate()  # 单进程时在本进程模拟，结束后恢复随机数状态
+    try:
+        for hero_class in args.classes or list(CLASSES):
+            items = plan_items(hero_class)
+            space = PlanSpace([price for _, price in items], args.budget)
+            plans = space.candidates(args.candidates, rand)
+            best = successive_halving(evaluator, hero_class, plans, args.min_runs, args.top)
+            print(f'\n== {CLASSES[hero_class][1]}：预算 {args.budget}，共 {space.size()} 种方案，'
+                  f'评估了 {len(plans)} 种 ==')
+            for rank, levels in enumerate(best, 1):
+                runs = evaluator.results[(hero_class, levels)][0]
+                rate, wave, fragments = evaluator.score(hero_class, levels)
+                low, high = evaluator.interval(hero_class, levels)
+                print(f'{rank}. 通关率 {rate:6.1%}  95% 区间 [{low:.1%}, {high:.1%}]  平均关卡 {wave:5.2f}  '
+                      f'平均碎片 {fragments:6.1f}  {runs} 局  {describe(items, levels)}')
+    finally:
+        dungeon.rng.setstate(state)
+        if pool is not None:
+            pool.close()
+            pool.join()
+    elapsed = time.perf_counter() - start
+    print(f'\n模拟 {evaluator.simulated} 局（缓存复用 {evaluator.reused} 局），'
+          f'{workers} 个进程，用时 {elapsed:.1f}s', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,271 @@
+# profiledb.py
+"""SQLite 存档后端：一个数据库文件保存多个玩家档案
+
+接口与 dungeon.load_save / save_save / update_save 相同，把 dungeon.profile_store 设为 SQLiteProfileStore 即可启用：
+  - 数值字段（碎片、商店、天赋、记录等）按键路径存为计数器，变更在一个事务里增量更新；
+  - 装备仓库存为行，按类型/稀有度/词条建索引；仓库界面的筛选、排序、分页和最佳配装都在 SQL 中完成，
+    只读取当前显示的行。
+"""
+import sqlite3
+
+import dungeon
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS counters (
+    profile TEXT NOT NULL,
+    path    TEXT NOT NULL,            -- 以 / 连接的键路径，如 records/total_runs
+    value   NUMERIC NOT NULL,
+    PRIMARY KEY (profile, path)
+);
+CREATE TABLE IF NOT EXISTS equipment (
+    id      INTEGER PRIMARY KEY,
+    profile TEXT NOT NULL,
+    seq     INTEGER NOT NULL,         -- 在该档案仓库中的位置，从 0 开始
+    type    TEXT NOT NULL,
+    rarity  INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS equipment_affix (
+    equipment_id INTEGER NOT NULL REFERENCES equipment(id) ON DELETE CASCADE,
+    affix        TEXT NOT NULL,
+    value        INTEGER NOT NULL
+);
+"""
+
+# 词条索引以装备为首列：按档案筛选词条时只探查该档案的装备，与其它档案的仓库大小无关
+INDEXES = """
+DROP INDEX IF EXISTS equipment_profile;
+DROP INDEX IF EXISTS equipment_affix_item;
+DROP INDEX IF EXISTS equipment_affix_name;
+CREATE UNIQUE INDEX IF NOT EXISTS equipment_position ON equipment (profile, seq);
+CREATE INDEX IF NOT EXISTS equipment_kind ON equipment (profile, type, rarity);
+CREATE INDEX IF NOT EXISTS equipment_affix_key ON equipment_affix (equipment_id, affix, value);
+"""
+
+
+def _flatten(data, prefix=()):
+    """把嵌套的数值字段展开为 (键路径, 值)"""
+    for key, value in data.items():
+        path = prefix + (key,)
+        if isinstance(value, dict):
+            yield from _flatten(value, path)
+        elif isinstance(value, (int, float)):
+            yield '/'.join(path), value
+
+
+class StoredEquipment:
+    """数据库中的装备仓库视图，支持 len、下标读写、切片、迭代和 append
+
+    下标和切片按位置列各只查询需要的行，不会把整个仓库读进内存。
+    视图同时提供 WarehouseIndex 的 select/best 接口，仓库界面直接把它当作索引使用。
+    """
+    PAGE = 500  # 迭代时每次查询的行数
+    _FILTER_ARGS = {'type': 'type_', 'rarity': 'rarity', 'affix': 'affix'}  # select 的筛选维度 -> _where 的参数名
+
+    def __init__(self, conn, profile):
+        self._conn = conn
+        self._profile = profile
+        self._count = conn.execute('SELECT COUNT(*) FROM equipment WHERE profile = ?',
+                                   (profile,)).fetchone()[0]
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._count)
+            rows = self._fetch(start, max(0, stop - start))
+            return rows[::step]
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError('装备仓库下标越界')
+        return self._fetch(index, 1)[0]
+
+    def __iter__(self):
+        for start in range(0, self._count, self.PAGE):
+            yield from self._fetch(start, self.PAGE)
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    @property
+    def index(self):
+        return self
+
+    @property
+    def size(self):
+        return self._count
+
+    def append(self, item):
+        """存入一件装备，在调用方的事务中插入"""
+        cur = self._conn.execute(
+            'INSERT INTO equipment (profile, seq, type, rarity) VALUES (?, '
+            '(SELECT COALESCE(MAX(seq), -1) + 1 FROM equipment WHERE profile = ?), ?, ?)',
+            (self._profile, self._profile, item['type'], item['rarity']))
+        self._conn.executemany(
+            'INSERT INTO equipment_affix (equipment_id, affix, value) VALUES (?, ?, ?)',
+            [(cur.lastrowid, affix, value) for affix, value in item['affixes'].items()])
+        self._count += 1
+
+    def __setitem__(self, index, item):
+        """替换一件装备（如重铸后），在调用方的事务中改写该行和它的词条"""
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError('装备仓库下标越界')
+        (equipment_id,) = self._conn.execute('SELECT id FROM equipment WHERE profile = ? AND seq = ?',
+                                             (self._profile, index)).fetchone()
+        self._conn.execute('UPDATE equipment SET type = ?, rarity = ? WHERE id = ?',
+                           (item['type'], item['rarity'], equipment_id))
+        self._conn.execute('DELETE FROM equipment_affix WHERE equipment_id = ?', (equipment_id,))
+        self._conn.executemany(
+            'INSERT INTO equipment_affix (equipment_id, affix, value) VALUES (?, ?, ?)',
+            [(equipment_id, affix, value) for affix, value in item['affixes'].items()])
+
+    def query(self, type_=None, rarity=None, affix=None, min_value=1, offset=0, limit=-1):
+        """按类型、稀有度、词条筛选装备，例如 query('武器', 2, '吸血')；offset/limit 用于分页"""
+        where, args = self._where(type_, rarity, affix, min_value)
+        rows = self._conn.execute(
+            f'SELECT e.id, e.type, e.rarity FROM equipment e WHERE {where} ORDER BY e.seq LIMIT ? OFFSET ?',
+            args + [limit, offset]).fetchall()
+        return self._with_affixes(rows)
+
+    def select(self, filters=(), sort_affix=None, offset=0, limit=10):
+        """同 WarehouseIndex.select：返回 (符合条件的总数, 本页装备的位置列表)，按词条排序时同值的位置小的在前"""
+        where, args = self._where(**{self._FILTER_ARGS[dim]: value for dim, value in filters})
+        total = self._conn.execute(f'SELECT COUNT(*) FROM equipment e WHERE {where}', args).fetchone()[0]
+        if sort_affix is None:
+            sql = f'SELECT e.seq FROM equipment e WHERE {where} ORDER BY e.seq LIMIT ? OFFSET ?'
+        else:
+            sql = (f'SELECT e.seq FROM equipment e LEFT JOIN equipment_affix s '
+                   f'ON s.equipment_id = e.id AND s.affix = ? WHERE {where} '
+                   f'ORDER BY COALESCE(s.value, 0) DESC, e.seq LIMIT ? OFFSET ?')
+            args = [sort_affix] + args
+        rows = self._conn.execute(sql, args + [limit, offset]).fetchall()
+        return total, [row[0] for row in rows]
+
+    def best(self, affix_weights, type_, limit=1):
+        """同 WarehouseIndex.best：该部位评分最高的 limit 件 [(位置, 评分)]，评分在 SQL 中按词条加权求和"""
+        weights = list(zip(dungeon.Equipment.AFFIX_NAMES, affix_weights))
+        weight = f'CASE a.affix {" ".join(["WHEN ? THEN ?"] * len(weights))} ELSE 0 END'
+        rows = self._conn.execute(
+            f'SELECT e.seq, (SELECT TOTAL(a.value * {weight}) FROM equipment_affix a WHERE a.equipment_id = e.id) '
+            'AS score FROM equipment e WHERE e.profile = ? AND e.type = ? ORDER BY score DESC, e.seq LIMIT ?',
+            [v for pair in weights for v in pair] + [self._profile, type_, limit]).fetchall()
+        return [(seq, score) for seq, score in rows]
+
+    def _where(self, type_=None, rarity=None, affix=None, min_value=1):
+        """筛选条件对应的 WHERE 子句（装备表别名 e）和参数"""
+        where, args = ['e.profile = ?'], [self._profile]
+        if type_ is not None:
+            where.append('e.type = ?')
+            args.append(type_)
+        if rarity is not None:
+            where.append('e.rarity = ?')
+            args.append(rarity)
+        if affix is not None:
+            where.append('EXISTS (SELECT 1 FROM equipment_affix a '
+                         'WHERE a.equipment_id = e.id AND a.affix = ? AND a.value >= ?)')
+            args += [affix, min_value]
+        return ' AND '.join(where), args
+
+    def _fetch(self, offset, limit):
+        rows = self._conn.execute(
+            'SELECT id, type, rarity FROM equipment WHERE profile = ? AND seq >= ? AND seq < ? ORDER BY seq',
+            (self._profile, offset, offset + limit)).fetchall()
+        return self._with_affixes(rows)
+
+    def _with_affixes(self, rows):
+        if not rows:
+            return []
+        items = {row[0]: {'type': row[1], 'rarity': row[2], 'affixes': {}} for row in rows}
+        marks = ','.join('?' * len(items))
+        for equipment_id, affix, value in self._conn.execute(
+                f'SELECT equipment_id, affix, value FROM equipment_affix '
+                f'WHERE equipment_id IN ({marks}) ORDER BY rowid', list(items)):
+            items[equipment_id]['affixes'][affix] = value
+        return list(items.values())
+
+
+class SQLiteProfileStore:
+    """以 SQLite 文件保存指定玩家档案的存档后端"""
+    def __init__(self, path, profile='default'):
+        self.profile = profile
+        self.conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode = WAL')
+        self.conn.execute('PRAGMA foreign_keys = ON')
+        with self.conn:
+            self.conn.executescript(SCHEMA)
+            self._add_positions()
+            self.conn.executescript(INDEXES)
+
+    def load(self):
+        """读取档案；新档案先写入默认值"""
+        save = dungeon.new_save()
+        rows = self.conn.execute('SELECT path, value FROM counters WHERE profile = ?',
+                                 (self.profile,)).fetchall()
+        if not rows:
+            with self.conn:
+                self._write_counters(save)
+        for path, value in rows:
+            *parents, key = path.split('/')
+            target = save
+            for parent in parents:
+                target = target.setdefault(parent, {})
+            target[key] = value
+        if dungeon.migrate_save(save):
+            with self.conn:
+                self._write_counters(save)
+        save['equipment_storage'] = StoredEquipment(self.conn, self.profile)
+        return save
+
+    def save(self, data):
+        """完整写入档案，仓库不是本库的视图时整体替换"""
+        with self.conn:
+            self._write_counters(data)
+            storage = data['equipment_storage']
+            if not isinstance(storage, StoredEquipment):
+                self.conn.execute('DELETE FROM equipment WHERE profile = ?', (self.profile,))
+                view = StoredEquipment(self.conn, self.profile)
+                for item in storage:
+                    view.append(item)
+
+    def update(self, data, changes):
+        """在一个事务内把变更写入数据库并应用到内存中的存档"""
+        with self.conn:
+            for op, path, value in changes:
+                if path[0] == 'equipment_storage':
+                    continue  # 由 StoredEquipment.append / __setitem__ 在同一事务中插入或改写
+                key = '/'.join(path)
+                if op == 'add':
+                    # 计数器不存在时（如后来新增的字段）以增量为初值插入，不会丢失这次增加
+                    self.conn.execute(
+                        'INSERT INTO counters (profile, path, value) VALUES (?, ?, ?) '
+                        'ON CONFLICT (profile, path) DO UPDATE SET value = value + excluded.value',
+                        (self.profile, key, value))
+                else:
+                    self.conn.execute(
+                        'INSERT OR REPLACE INTO counters (profile, path, value) VALUES (?, ?, ?)',
+                        (self.profile, key, value))
+            dungeon.apply_changes(data, changes)
+
+    def close(self):
+        self.conn.close()
+
+    def _add_positions(self):
+        """早期的库没有 seq 列：补上该列，并按插入顺序给每个档案的装备编号"""
+        columns = [row[1] for row in self.conn.execute('PRAGMA table_info(equipment)')]
+        if 'seq' in columns:
+            return
+        self.conn.execute('ALTER TABLE equipment ADD COLUMN seq INTEGER')
+        counts = {}
+        updates = []
+        for equipment_id, profile in self.conn.execute('SELECT id, profile FROM equipment ORDER BY id').fetchall():
+            counts[profile] = counts.get(profile, -1) + 1
+            updates.append((counts[profile], equipment_id))
+        self.conn.executemany('UPDATE equipment SET seq = ? WHERE id = ?', updates)
+
+    def _write_counters(self, data):
+        self.conn.executemany(
+            'INSERT OR REPLACE INTO counters (profile, path, value) VALUES (?, ?, ?)',
+            [(self.profile, path, value) for path, value in _flatten(data)])
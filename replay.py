@@ -0,0 +1,82 @@
+# replay.py
+"""回放：按录制的种子和输入无头重跑一局冒险，并检查结局与录制时一致
+
+交互式游戏每局结束后把种子和全部输入写入 last_run.replay，
+玩家反馈问题时附上这个文件，就能在本地原样重现，也可以当作回归用例。
+"""
+import sys, time
+
+import dungeon
+import sim
+
+
+class ReplayError(AssertionError):
+    """回放与录制时的行为不一致"""
+
+
+class ReplayUI(sim.HeadlessUI):
+    """按顺序返回录制的输入，并核对每次决策的类型"""
+    def __init__(self, inputs):
+        super().__init__(None)
+        self.inputs = inputs
+        self.position = 0
+
+    def ask(self, kind, prompt, **ctx):
+        if self.position >= len(self.inputs):
+            raise ReplayError(f'录制的输入已用完，第 {self.position + 1} 次决策（{kind}）没有输入')
+        entry = self.inputs[self.position]
+        recorded = dungeon.CODE_KINDS[entry[0]]
+        if recorded != kind:
+            raise ReplayError(f'第 {self.position + 1} 次决策应为 {recorded}，实际为 {kind}')
+        self.position += 1
+        # 阵亡后的 retry 只决定是否退出程序，回放时总是正常返回结果
+        return 'q' if kind == 'retry' else entry[1:]
+
+
+def run_replay(data):
+    """重放一份回放数据，返回 (RunResult 或 None, 用掉的输入数)
+
+    录制时有结局的，核对结局和输入是否都恰好用完，不一致时抛出 ReplayError；
+    录制在中途中断（结局为空）的，重放到输入用完为止，返回 None。
+    """
+    ui = ReplayUI(data['inputs'])
+    try:
+        result = sim.simulate(data['save'], seed=data['seed'], ui=ui)
+    except ReplayError:
+        if data['result'] is None and ui.position == len(data['inputs']):
+            return None, ui.position
+        raise
+    if data['result'] is None:
+        raise ReplayError('录制时这一局没有结束，重放却跑完了')
+    actual = result.to_dict()
+    if actual != data['result']:
+        diff = {k: (data['result'].get(k), v) for k, v in actual.items() if data['result'].get(k) != v}
+        raise ReplayError(f'结局不一致（录制值, 重放值）：{diff}')
+    if ui.position != len(data['inputs']):
+        raise ReplayError(f'还有 {len(data["inputs"]) - ui.position} 条录制的输入没有用到')
+    return result, ui.position
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='无头重放录制的冒险并核对结局')
+    parser.add_argument('files', nargs='*', default=[dungeon.REPLAY_FILE], help='回放文件')
+    args = parser.parse_args(argv)
+
+    failed = 0
+    for path in args.files:
+        start = time.perf_counter()
+        try:
+            result, steps = run_replay(dungeon.read_replay(path))
+        except ReplayError as e:
+            failed += 1
+            print(f'✗ {path}：{e}')
+            continue
+        elapsed = (time.perf_counter() - start) * 1000
+        outcome = '未结束' if result is None else '通关' if result.cleared else f'阵亡于第 {result.wave} 关'
+        print(f'✓ {path}：{steps} 次决策，{outcome}，用时 {elapsed:.1f}ms')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,243 @@
+# server.py
+"""多会话游戏服务器：一个进程在本地 TCP 端口上同时为多名玩家运行游戏
+
+每个连接是一个会话，有自己的 ui（输出到该连接的 rich 控制台）、随机数生成器和 SQLite 档案。
+网络读写都在 asyncio 事件循环中完成；游戏逻辑仍是同步代码，每个会话占用线程池中的一个线程，
+等待输入时阻塞在自己的输入队列上，不影响其它会话。输出先缓冲，等待输入前一次发送并等到
+发送缓冲区排空（背压），读得慢的客户端只会拖慢它自己的会话。
+
+    python server.py --port 7777 --db profiles.db
+    telnet 127.0.0.1 7777        # 或 nc 127.0.0.1 7777
+"""
+import asyncio, concurrent.futures, contextlib, os, queue, random, re, sys, threading
+
+import dungeon
+import profiledb
+import sim
+
+PROFILE_NAME = re.compile(r'\w{1,24}')  # 档案名同时用作回放文件名
+
+
+class SessionStream:
+    """会话的输出流：游戏线程写入缓冲区，flush 时交给事件循环发送，并等待发送缓冲区排空
+
+    连接断开或客户端 SEND_TIMEOUT 秒内不读取输出时抛出 EOFError，让会话线程退出。
+    """
+    encoding = 'utf-8'
+    FLUSH_SIZE = 64 * 1024  # 缓冲超过这么多字符时不等输入提示，提前发送
+    SEND_TIMEOUT = 30
+
+    def __init__(self, loop, writer):
+        self.loop = loop
+        self.writer = writer
+        self.closed = False
+        self._buffer = []
+        self._size = 0
+
+    def write(self, text):
+        self._buffer.append(text)
+        self._size += len(text)
+        if self._size >= self.FLUSH_SIZE:
+            self.flush()
+        return len(text)
+
+    def flush(self):
+        if self.closed:
+            raise EOFError('连接已关闭')
+        if not self._buffer:
+            return
+        # 网络终端按 \r\n 换行
+        data = ''.join(self._buffer).replace('\n', '\r\n').encode('utf-8')
+        self._buffer.clear()
+        self._size = 0
+        try:
+            future = asyncio.run_coroutine_threadsafe(self._send(data), self.loop)
+            future.result(self.SEND_TIMEOUT)
+        except (ConnectionError, RuntimeError,
+                concurrent.futures.TimeoutError, concurrent.futures.CancelledError):
+            self.closed = True
+            raise EOFError('连接已断开')
+
+    async def _send(self, data):
+        self.writer.write(data)
+        await self.writer.drain()
+
+    def isatty(self):
+        return True
+
+
+class SessionIO:
+    """把 TerminalUI 的输入输出接到网络会话：输出写入 SessionStream，输入来自事件循环转发的行"""
+    width = 80
+
+    def __init__(self, stream, inbox):
+        self.file = stream
+        self.inbox = inbox
+
+    @property
+    def console(self):
+        if self._console is None:
+            from rich.console import Console
+            self._console = Console(file=self.file, force_terminal=True, width=self.width,
+                                    color_system='256', legacy_windows=False)
+        return self._console
+
+    def _read(self, prompt):
+        self.file.write(prompt)
+        self.file.flush()
+        line = self.inbox.get()
+        if line is None:
+            raise EOFError('客户端已断开')
+        return line
+
+    def _write(self, text):
+        self.file.write(text)  # 等待输入前统一发送
+
+
+class SessionUI(SessionIO, dungeon.TerminalUI):
+    """网络会话的 rich 界面"""
+
+
+class PlainSessionUI(SessionIO, dungeon.PlainUI):
+    """网络会话的纯文本界面"""
+
+
+class GameServer:
+    """接受 TCP 连接，为每个连接在线程池中运行一个游戏会话"""
+    def __init__(self, db, replay_dir, max_sessions=500, plain=False, policy=None, auto_kinds=None):
+        self.db = db
+        self.replay_dir = replay_dir
+        self.max_sessions = max_sessions
+        self.plain = plain
+        self.policy = policy   # 给出 sim.Policy 时所有会话使用自动战斗
+        self.auto_kinds = auto_kinds  # 自动战斗交给策略的决策，None 时为 AutoBattleUI.AUTO_KINDS
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_sessions, thread_name_prefix='session')
+        self.active = 0        # 当前连接数，只在事件循环中修改
+        self.online = set()    # 正在游戏的档案名
+        self.lock = threading.Lock()
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle, host, port)
+        host, port = server.sockets[0].getsockname()[:2]
+        print(f'游戏服务器已启动：{host}:{port}，最多 {self.max_sessions} 个会话', flush=True)
+        async with server:
+            await server.serve_forever()
+
+    async def handle(self, reader, writer):
+        if self.active >= self.max_sessions:
+            writer.write('服务器已满，请稍后再试\r\n'.encode('utf-8'))
+            await self._close(writer)
+            return
+        self.active += 1
+        loop = asyncio.get_running_loop()
+        stream = SessionStream(loop, writer)
+        inbox = queue.Queue()
+        pump = asyncio.create_task(self._pump(reader, inbox))
+        try:
+            await loop.run_in_executor(self.executor, self.session, stream, inbox)
+        finally:
+            self.active -= 1
+            stream.closed = True
+            inbox.put(None)  # 服务器停止时让仍在等待输入的会话线程退出
+            pump.cancel()
+            await self._close(writer)
+
+    async def _pump(self, reader, inbox):
+        """把客户端发来的每一行放进会话的输入队列，连接断开时放入 None"""
+        try:
+            while line := await reader.readline():
+                inbox.put(line.decode('utf-8', 'replace').rstrip('\r\n'))
+        except (ConnectionError, ValueError):  # ValueError：单行超过读取缓冲区上限
+            pass
+        finally:
+            inbox.put(None)
+
+    async def _close(self, writer):
+        writer.close()
+        with contextlib.suppress(ConnectionError):
+            await writer.wait_closed()
+
+    def session(self, stream, inbox):
+        """在会话线程中运行：登录档案后进入主菜单，直到玩家退出或断开连接"""
+        ui = (PlainSessionUI if self.plain else SessionUI)(stream, inbox)
+        if self.policy is not None:
+            ui = sim.AutoBattleUI(ui, self.policy, self.auto_kinds)
+        dungeon.ui.bind(ui)
+        dungeon.rng.bind(random.Random())
+        profile = store = None
+        try:
+            profile = self.login(ui)
+            store = profiledb.SQLiteProfileStore(self.db, profile)
+            dungeon.profile_store.bind(store)
+            ui.replay_file = os.path.join(self.replay_dir, f'{profile}.replay')
+            dungeon.run()
+        except (EOFError, SystemExit):
+            pass
+        finally:
+            with self.lock:
+                self.online.discard(profile)
+            if store is not None:
+                store.close()
+            with contextlib.suppress(EOFError):
+                stream.flush()
+
+    def login(self, ui):
+        """询问档案名；同一档案同时只能有一个会话"""
+        ui.say('欢迎来到地牢！输入档案名登录，新名字会自动创建档案。')
+        while True:
+            name = ui.ask('menu', '档案名 > ').strip()
+            if not PROFILE_NAME.fullmatch(name):
+                ui.say('档案名只能由文字、数字和下划线组成，最长 24 个字符')
+                continue
+            with self.lock:
+                if name not in self.online:
+                    self.online.add(name)
+                    return name
+            ui.say('该档案正在游戏中')
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='多会话游戏服务器')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7777, help='监听端口，0 表示任选一个空闲端口')
+    parser.add_argument('--db', default=os.path.join(dungeon.SCRIPT_DIR, 'profiles.db'), help='SQLite 档案数据库')
+    parser.add_argument('--replay-dir', default=os.path.join(dungeon.SCRIPT_DIR, 'replays'),
+                        help='每个档案最近一局的回放文件目录')
+    parser.add_argument('--max-sessions', type=int, default=500, help='同时在线的会话上限')
+    parser.add_argument('--plain', action='store_true', help='会话使用纯文本界面，渲染开销更小')
+    parser.add_argument('--auto', action='store_true',
+                        help='会话使用自动战斗：每关只发送一段汇总，输入往返少一个数量级')
+    parser.add_argument('--auto-potion', type=float, default=0.35, help='自动战斗时血量低于该比例喝血瓶')
+    parser.add_argument('--auto-flee', type=float, default=0.0, help='自动战斗时没有血瓶且血量低于该比例就逃跑')
+    parser.add_argument('--auto-equip', choices=sim.Policy.EQUIP_RULES, default='rarity',
+                        help='自动换装规则：品质不低于当前（rarity）或评分更高（score）')
+    parser.add_argument('--auto-path', choices=('1', '2'),
+                        help='自动战斗时每层自动选择安全（1）或危险（2）通道，默认仍由玩家选择')
+    parser.add_argument('--auto-events', action='store_true',
+                        help='自动战斗时随机事件也由策略决定（付得起就接受）')
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.replay_dir, exist_ok=True)
+    profiledb.SQLiteProfileStore(args.db).close()  # 启动时建好表，数据库不可用时立即报错
+    dungeon.enable_sessions()
+    policy = kinds = None
+    if args.auto:
+        policy = sim.Policy(path=args.auto_path or '1', potion_threshold=args.auto_potion,
+                            flee_below=args.auto_flee, equip_rule=args.auto_equip)
+        kinds = sim.AutoBattleUI.AUTO_KINDS
+        if args.auto_path:
+            kinds += sim.AutoBattleUI.PATH_KINDS
+        if args.auto_events:
+            kinds += sim.AutoBattleUI.EVENT_KINDS
+    server = GameServer(args.db, args.replay_dir, args.max_sessions, args.plain, policy, kinds)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        print('服务器已停止')
+    finally:
+        server.executor.shutdown()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,272 @@
+# sim.py
+"""无头模拟：不读键盘、不打印、不清屏地运行 dungeon.game()，用于批量平衡测试
+
+策略对象也用于交互式游戏的自动战斗（AutoBattleUI）：战斗和装备决策交给策略，每关只输出一段汇总。
+战斗日志（ui.log）在无头模拟中直接丢弃；需要逐条分析时用 JsonlUI 按 JSONL 写出（--log）。
+
+吞吐量：单核跑一局完整的 12 关约 0.4 ms（每秒 2～3 千局）。剖析显示耗时分散在每局约 1300 次
+Python 函数调用上：random 模块约 18%，game 主循环约 18%，属性刷新约 9%，无头 ui 与策略的调度约 8%，
+没有能单独去掉的热点，即使 ui 调度完全免费也只快 2 成左右。每秒数万局要靠多核（batch.py 的进程池
+随进程数线性扩展），只关心单场战斗结果时用 vcombat 的向量化结算或 markov 的精确解。
+"""
+import json, sys, time
+
+import dungeon
+
+
+# ---------- 决策策略 ----------
+class Policy:
+    """默认策略：始终进攻，血量低于阈值时喝血瓶，装备品质不低于当前就换上
+
+    flee_below 大于 0 时，没有血瓶且血量低于该比例就尝试逃跑；equip_rule 为 'score' 时
+    按 Equipment.score 评分更高才换装。子类可覆盖任意决策方法，方法名与 ui.ask 的 kind 一一对应，
+    返回值即玩家的输入。
+    """
+    EQUIP_RULES = ('rarity', 'score')
+
+    def __init__(self, hero_class='1', path='1', potion_threshold=0.35, flee_below=0.0, equip_rule='rarity'):
+        if equip_rule not in self.EQUIP_RULES:
+            raise ValueError(f'未知的换装规则：{equip_rule}')
+        self.hero_class_choice = hero_class  # '1'=战士, '2'=法师
+        self.path_choice = path              # '1'=安全通道, '2'=危险通道
+        self.potion_threshold = potion_threshold
+        self.flee_below = flee_below
+        self.equip_rule = equip_rule
+
+    def hero_class(self, save):
+        return self.hero_class_choice
+
+    def path(self, hero, wave):
+        return self.path_choice
+
+    def combat(self, hero, monster):
+        if hero.items['血瓶'] and hero.hp < hero.max_hp * self.potion_threshold:
+            return '1'
+        if hero.hp < hero.max_hp * self.flee_below:
+            return 'R'
+        return 'A'
+
+    def event(self, hero, event):
+        return 'y' if event.cost <= hero.souls else 'n'
+
+    def event_choice(self, hero, event):
+        return '1'
+
+    def equip(self, hero, equip):
+        current = hero.equipment[equip.type]
+        if current is None:
+            return 'y'
+        if self.equip_rule == 'score':
+            weights = hero.affix_weights()
+            return 'y' if equip.score(weights) > current.score(weights) else 'n'
+        return 'y' if equip.rarity >= current.rarity else 'n'
+
+    def store(self, hero, equip):
+        return 'y'
+
+    def retry(self, result=None):
+        return 'q'
+
+
+class HeadlessUI:
+    """无头输入输出：丢弃所有输出，决策交给策略对象"""
+    headless = True
+    persist = False
+
+    def __init__(self, policy):
+        self.policy = policy
+
+    def say(self, *args, **kwargs):
+        pass
+
+    def log(self, name, **fields):
+        pass
+
+    def menu(self, title, options, show_souls=None):
+        pass
+
+    def battle(self, title, *entities):
+        pass
+
+    def end_battle(self):
+        pass
+
+    def ask(self, kind, prompt, **ctx):
+        return getattr(self.policy, kind)(**ctx)
+
+    def pause(self, prompt=''):
+        pass
+
+    def clear(self):
+        pass
+
+
+class JsonlUI(HeadlessUI):
+    """无头运行并把战斗日志写成 JSONL：每条记录一行，等到下一次决策（每回合一次）时整批写入 file
+
+    context 中的字段附加到每条记录上，例如用 seed 区分不同的局。
+    """
+    def __init__(self, policy, file, **context):
+        super().__init__(policy)
+        self.file = file
+        self.context = context
+        self._lines = []
+
+    def log(self, name, **fields):
+        record = {'type': dungeon.LOG_MESSAGES[name][0], 'name': name, **fields, **self.context}
+        self._lines.append(json.dumps(record, ensure_ascii=False, default=lambda obj: obj.to_dict()))
+
+    def ask(self, kind, prompt, **ctx):
+        self.flush()
+        return super().ask(kind, prompt, **ctx)
+
+    def flush(self):
+        if self._lines:
+            self._lines.append('')
+            self.file.write('\n'.join(self._lines))
+            self._lines = []
+
+
+class AutoBattleUI:
+    """自动战斗：包装交互式 ui，战斗回合和拾取装备由策略作答，其余决策（职业、路线、事件等）仍问玩家
+
+    战斗中不渲染画面，逐回合的日志只用来累计汇总，结束时记一行；掉落、升级等消息和汇总一起缓冲，
+    等到下一次需要玩家作答时一次写出。暂停提示全部跳过；有未读的汇总时不清屏，汇总留在新画面上方。
+    kinds 可以再加上路线（PATH_KINDS）和事件（EVENT_KINDS），这些决策也交给策略，只回显策略的回答。
+    """
+    AUTO_KINDS = ('combat', 'equip')
+    PATH_KINDS = ('path',)
+    EVENT_KINDS = ('event', 'event_choice')
+
+    def __init__(self, inner, policy=None, kinds=None):
+        self.inner = inner
+        self.policy = policy or Policy()
+        self.kinds = kinds or self.AUTO_KINDS
+        self._pending = []  # 缓冲的输出 (方法名, 参数, 关键字参数)
+        self._fight = None  # 进行中的战斗：开战时的状态和逐回合累计的数据
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+    def say(self, *args, **kwargs):
+        if self._fight is None:
+            self._pending.append(('say', args, kwargs))
+
+    def log(self, name, **fields):
+        fight = self._fight
+        if fight is None:
+            self._pending.append(('log', (name,), fields))
+        elif name in ('attack', 'thorns'):
+            fight['dealt'] += fields['amount']
+        elif name == 'counter':
+            fight['taken'] += fields['amount']
+        elif name == 'crit':
+            fight['crits'] += 1
+
+    def menu(self, title, options, show_souls=None):
+        self._flush()
+        self.inner.menu(title, options, show_souls)
+
+    def battle(self, title, hero, monster):
+        self._fight = {'title': title.strip('- '), 'hero': hero, 'monster': monster, 'hp': hero.hp,
+                       'potions': hero.items['血瓶'], 'turns': 0, 'dealt': 0, 'taken': 0, 'crits': 0}
+
+    def end_battle(self):
+        fight, self._fight = self._fight, None
+        hero, monster = fight['hero'], fight['monster']
+        outcome = '击败' if monster.hp <= 0 else '阵亡' if hero.hp <= 0 else '逃离'
+        used = fight['potions'] - hero.items['血瓶']
+        self.say(f"{fight['title']} {monster.name}：{fight['turns']} 回合{outcome}，造成 {fight['dealt']} 伤害"
+                 + (f"（暴击 {fight['crits']} 次）" if fight['crits'] else '')
+                 + f"，受到 {fight['taken']}，HP {fight['hp']}→{max(hero.hp, 0)}/{hero.max_hp}"
+                 + (f'，喝血瓶 {used} 次' if used > 0 else ''))
+
+    def redraw(self, tail=''):
+        """自动战斗不画战斗画面；tail 和其它输出一样缓冲"""
+        if tail:
+            self.say(tail, end='')
+
+    def ask(self, kind, prompt, **ctx):
+        if kind not in self.kinds:
+            self._flush()
+            return self.inner.ask(kind, prompt, **ctx)
+        answer = getattr(self.policy, kind)(**ctx)
+        if kind == 'combat':
+            self._fight['turns'] += 1
+        elif kind == 'equip':
+            self.say('（自动）' + ('装备' if answer == 'y' else '不装备'))
+        else:
+            self.say(f'{prompt.strip()} {answer}（自动）')
+        return answer
+
+    def pause(self, prompt='按 Enter 继续…'):
+        pass
+
+    def clear(self):
+        if self._pending:
+            self._flush()
+        else:
+            self.inner.clear()
+
+    def _flush(self):
+        """把缓冲的输出按顺序交给内层 ui"""
+        pending, self._pending = self._pending, []
+        for name, args, kwargs in pending:
+            getattr(self.inner, name)(*args, **kwargs)
+
+
+# ---------- 模拟入口 ----------
+def simulate(save, policy=None, seed=None, ui=None):
+    """以无头方式跑完一局冒险，返回 dungeon.RunResult
+
+    seed 为整数或字符串，用于重新播种 dungeon.rng；
+    相同的种子和策略与交互式游戏中输入相同选择得到的结果完全一致。
+    存档只在副本上结算，不会写入磁盘，也不会修改传入的 save。
+    ui 可替换默认的 HeadlessUI，例如回放时按录制的输入作答。
+    """
+    if seed is not None:
+        dungeon.rng.seed(seed)
+    run_save = dict(save, records=dict(save['records']), equipment_storage=[])
+    previous = dungeon.set_ui(ui or HeadlessUI(policy or Policy()))
+    try:
+        return dungeon.game(run_save)
+    finally:
+        dungeon.set_ui(previous)
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='无头批量模拟冒险')
+    parser.add_argument('-n', '--runs', type=int, default=1000, help='模拟局数')
+    parser.add_argument('--seed', type=int, default=0, help='起始种子，第 i 局使用 seed+i')
+    parser.add_argument('--mage', action='store_true', help='使用法师（默认战士）')
+    parser.add_argument('--danger', action='store_true', help='始终选择危险通道')
+    parser.add_argument('--log', metavar='FILE', help='把每局的战斗日志按 JSONL 写入 FILE，每条记录带 seed 字段')
+    args = parser.parse_args(argv)
+
+    save = dungeon.load_save()
+    policy = Policy('2' if args.mage else '1', '2' if args.danger else '1')
+    log_file = open(args.log, 'w', encoding='utf-8') if args.log else None
+    cleared = boss_kills = fragments = 0
+    start = time.perf_counter()
+    for i in range(args.runs):
+        if log_file is None:
+            result = simulate(save, policy, args.seed + i)
+        else:
+            ui = JsonlUI(policy, log_file, seed=args.seed + i)
+            result = simulate(save, seed=args.seed + i, ui=ui)
+            ui.flush()
+        cleared += result.cleared
+        boss_kills += result.boss_kills
+        fragments += result.fragments
+    elapsed = time.perf_counter() - start
+    if log_file is not None:
+        log_file.close()
+
+    print(f'模拟 {args.runs} 局，用时 {elapsed:.2f}s（{args.runs / elapsed:.0f} 局/秒）')
+    print(f'通关率 {cleared / args.runs:.1%}，平均Boss击杀 {boss_kills / args.runs:.2f}，'
+          f'平均碎片 {fragments / args.runs:.1f}')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,57 @@
+# tests/conftest.py
+"""测试公共设置：把仓库根目录加入导入路径，存档文件重定向到临时目录，按脚本作答的界面"""
+import os, sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import dungeon
+import sim
+
+SAVE_FILES = {'SAVE_FILE': 'save.json', 'BINARY_SAVE_FILE': 'save.bin', 'JOURNAL_FILE': 'save.journal'}
+
+
+@pytest.fixture
+def save_dir(tmp_path, monkeypatch):
+    """存档、二进制存档和日志都写到 tmp_path，测试结束前写完后台队列"""
+    for name, file in SAVE_FILES.items():
+        monkeypatch.setattr(dungeon, name, str(tmp_path / file))
+    monkeypatch.setattr(dungeon, '_journal_entries', 0)
+    yield tmp_path
+    dungeon.save_writer.flush()
+
+
+@pytest.fixture
+def rng_state():
+    """测试可以随意播种 dungeon.rng，结束后恢复原来的状态"""
+    state = dungeon.rng.getstate()
+    yield dungeon.rng
+    dungeon.rng.setstate(state)
+
+
+class ScriptedUI(sim.HeadlessUI):
+    """按给定的顺序回答菜单输入，记下所有输出"""
+    def __init__(self, answers):
+        super().__init__(sim.Policy())
+        self.answers = list(answers)
+        self.output = []
+
+    def say(self, *args, **kwargs):
+        self.output.append(' '.join(map(str, args)))
+
+    def ask(self, kind, prompt, **ctx):
+        return self.answers.pop(0)
+
+
+@pytest.fixture
+def scripted_ui():
+    """ui = scripted_ui(answers) 换上按 answers 作答的界面，测试结束后恢复原来的界面"""
+    previous = []
+
+    def install(answers):
+        ui = ScriptedUI(answers)
+        previous.append(dungeon.set_ui(ui))
+        return ui
+    yield install
+    for ui in reversed(previous):
+        dungeon.set_ui(ui)
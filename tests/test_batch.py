@@ -0,0 +1,21 @@
+# tests/test_batch.py
+"""批量模拟：结果与进程数无关，且不改动调用方的随机数"""
+import dungeon
+import batch
+
+
+def test_same_stats_for_any_worker_count():
+    save = dungeon.new_save()
+    one, runs_one = batch.run_batch(save, 300, master_seed=7, workers=1, chunk_size=64, keep_runs=True)
+    two, runs_two = batch.run_batch(save, 300, master_seed=7, workers=2, chunk_size=64, keep_runs=True)
+    assert one.to_dict() == two.to_dict()
+    assert runs_one == runs_two
+
+
+def test_in_process_batch_keeps_caller_rng():
+    rng = dungeon.rng
+    rng.seed(5)
+    state = rng.getstate()
+    batch.run_batch(dungeon.new_save(), 50, workers=1)
+    assert dungeon.rng is rng
+    assert rng.getstate() == state
@@ -0,0 +1,98 @@
+# tests/test_combat.py
+"""战斗结算：markov 的精确解、vcombat 的批量结算与逐回合的 combat_turn 抽样一致"""
+import sys, threading
+
+import pytest
+
+import dungeon
+import sim
+import markov
+
+RUNS = 4000
+
+
+def mage():
+    """暴击、魔法飞弹和吸血天赋"""
+    hero = dungeon.Mage(dungeon.new_save())
+    hero.talents = ['暴击', '吸血']
+    hero.items['血瓶'] = 1
+    return hero, dungeon.Monster('测试怪', 100, 15, 0)
+
+
+def warrior():
+    """护盾、反伤、装备吸血和恶魔契约"""
+    hero = dungeon.Warrior(dungeon.new_save())
+    hero.talents = ['护盾', '暴击']
+    hero.items['血瓶'] = 2
+    hero.thorns = 3
+    hero.lifesteal = 0.2
+    hero.event_flags['demon_pact'] = True
+    return hero, dungeon.Monster('测试怪', 130, 20, 0)
+
+
+def monte_carlo(setup, runs=RUNS):
+    """按 game() 的战斗循环用默认策略打 runs 场，返回 (胜率, 获胜时的平均剩余血量, 平均回合数)"""
+    policy = sim.Policy()
+    previous = dungeon.set_ui(sim.HeadlessUI(policy))
+    wins = hp_left = turns = 0
+    try:
+        for _ in range(runs):
+            hero, monster = setup()
+            dmg = 0
+            while monster.hp > 0 and hero.hp > 0:
+                turns += 1
+                over, dealt = dungeon.combat_turn(hero, monster, policy.combat(hero, monster))
+                dmg = dealt or dmg
+                if over:
+                    break
+            if monster.hp <= 0 and ('吸血' in hero.talents or hero.lifesteal > 0):
+                hero.hp += min(10 + int(hero.lifesteal * dmg), hero.max_hp - hero.hp)
+            if monster.hp <= 0 and hero.hp > 0:
+                wins += 1
+                hp_left += hero.hp
+    finally:
+        dungeon.set_ui(previous)
+    return wins / runs, hp_left / wins, turns / runs
+
+
+@pytest.mark.parametrize('setup', [mage, warrior])
+def test_markov_matches_combat_turn(setup, rng_state):
+    rng_state.seed(11)
+    hero, monster = setup()
+    exact = markov.solve(hero, monster)
+    assert 0.2 < exact.win < 0.9  # 胜负都有足够的样本
+    win, hp_left, turns = monte_carlo(setup)
+    assert win == pytest.approx(exact.win, abs=0.03)
+    assert hp_left == pytest.approx(exact.hp_left, rel=0.05)
+    assert turns == pytest.approx(exact.turns, rel=0.05)
+
+
+def test_long_fight_keeps_recursion_limit(monkeypatch):
+    """回合数远超递归上限的战斗也能求解，且不改动进程共享的递归上限"""
+    def refuse(limit):
+        raise AssertionError('markov 不应修改递归上限')
+    monkeypatch.setattr(sys, 'setrecursionlimit', refuse)
+    hero = dungeon.Warrior(dungeon.new_save())
+    hero.max_hp = hero.hp = 100_000
+    monster = dungeon.Monster('木桩', 20 * hero.power() * sys.getrecursionlimit(), 1, 0)
+    results = []
+    # 在默认栈大小的线程里求解，与服务器会话线程相同
+    thread = threading.Thread(target=lambda: results.append(markov.solve(hero, monster)))
+    thread.start()
+    thread.join()
+    assert results[0].win == 1.0
+    assert results[0].turns == pytest.approx(monster.hp / hero.power(), abs=1)
+
+
+@pytest.mark.parametrize('setup', [mage, warrior])
+def test_vcombat_matches_markov(setup):
+    np = pytest.importorskip('numpy')
+    import vcombat
+    hero, monster = setup()
+    exact = markov.solve(hero, monster)
+    heroes, monsters = vcombat.from_pairs([setup() for _ in range(RUNS)])
+    result = vcombat.resolve(heroes, monsters, rng=np.random.default_rng(11))
+    alive = result['won'] & (result['hero_hp'] > 0)
+    assert alive.mean() == pytest.approx(exact.win, abs=0.03)
+    assert result['hero_hp'][alive].mean() == pytest.approx(exact.hp_left, rel=0.05)
+    assert result['turns'].mean() == pytest.approx(exact.turns, rel=0.05)
@@ -0,0 +1,122 @@
+# tests/test_profiledb.py
+"""SQLite 存档后端：仓库界面只读取显示的行，计数器增量不丢失，旧库自动补上位置列"""
+import sqlite3
+
+import pytest
+
+import dungeon
+import profiledb
+
+
+def random_items(count):
+    return [dungeon.Equipment(dungeon.rng.choice(dungeon.Equipment.TYPES), dungeon.rng.randrange(3)).to_dict()
+            for _ in range(count)]
+
+
+@pytest.fixture
+def store(tmp_path, rng_state):
+    """档案 a 有 600 件装备，另一个档案 b 有 200 件"""
+    rng_state.seed(8)
+    path = str(tmp_path / 'profiles.db')
+    store = profiledb.SQLiteProfileStore(path, 'a')
+    store.items = random_items(600)
+    store.save(dict(store.load(), equipment_storage=store.items))
+    other = profiledb.SQLiteProfileStore(path, 'b')
+    other.save(dict(other.load(), equipment_storage=random_items(200)))
+    other.close()
+    yield store
+    store.close()
+
+
+def test_views_match_warehouse_index(store):
+    view = store.load()['equipment_storage']
+    assert dungeon.warehouse_index(view) is view
+    expected = dungeon.WarehouseIndex(store.items)
+    affixes = dungeon.Equipment.AFFIX_NAMES
+    for filters in ((), [('type', '护甲')], [('rarity', 1), ('affix', affixes[2])]):
+        for sort_affix in (None, *affixes):
+            for offset in (0, 30):
+                assert view.select(filters, sort_affix, offset) == expected.select(filters, sort_affix, offset)
+    for hero in (dungeon.Warrior(dungeon.new_save()), dungeon.Mage(dungeon.new_save())):
+        weights = hero.affix_weights()
+        for type_ in dungeon.Equipment.TYPES:
+            best = view.best(weights, type_, limit=3)
+            assert best == pytest.approx(expected.best(weights, type_, limit=3))
+    assert view[123] == store.items[123]
+    assert view.query('武器', 2, affixes[0], offset=1, limit=2) == [
+        item for item in store.items
+        if item['type'] == '武器' and item['rarity'] == 2 and affixes[0] in item['affixes']][1:3]
+
+
+def test_warehouse_screen_reads_only_displayed_rows(store, monkeypatch, scripted_ui):
+    save = store.load()
+    fetched = []
+    with_affixes = profiledb.StoredEquipment._with_affixes
+    monkeypatch.setattr(profiledb.StoredEquipment, '_with_affixes',
+                        lambda self, rows: fetched.append(len(rows)) or with_affixes(self, rows))
+    # 翻页、按类型筛选、按词条排序、再翻页、最佳配装、返回
+    ui = scripted_ui(['n', 't', 's', 'n', 'b', '0'])
+    dungeon.equipment_storage(save)
+    assert not ui.answers
+    assert '共 600 件  第 2/60 页' in ui.output
+    weapons = sum(item['type'] == '武器' for item in store.items)
+    assert any(line.startswith(f'共 {weapons} 件') for line in ui.output)
+    # 显示了 6 页（最佳配装之后重画当前页）各 10 件，最佳配装两个职业各两件
+    assert sum(fetched) == 6 * 10 + 4
+
+
+def test_add_to_missing_counter(store):
+    save = store.load()
+    store.conn.execute("DELETE FROM counters WHERE profile = 'a' AND path = 'records/greed_boss_kills'")
+    store.update(save, [('add', ['records', 'greed_boss_kills'], 2), ('add', ['fragments'], 5)])
+    loaded = store.load()
+    assert loaded['records']['greed_boss_kills'] == 2
+    assert loaded['fragments'] == 5
+
+
+def test_reforged_item_replaces_row(store):
+    save = store.load()
+    item = {'type': '护甲', 'rarity': 2, 'affixes': {'反伤': 9, '吸血': 3}}
+    store.update(save, [('add', ['fragments'], 30), ('set', ['equipment_storage', 5], item)])
+    view = store.load()['equipment_storage']
+    assert len(view) == 600
+    assert view[5] == item and view[4] == store.items[4]
+    assert 5 in view.select([('affix', '反伤')], limit=600)[1]
+
+
+def test_old_database_gets_positions(tmp_path, rng_state):
+    rng_state.seed(1)
+    path = str(tmp_path / 'old.db')
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE counters (profile TEXT NOT NULL, path TEXT NOT NULL, value NUMERIC NOT NULL,
+                               PRIMARY KEY (profile, path));
+        CREATE TABLE equipment (id INTEGER PRIMARY KEY, profile TEXT NOT NULL, type TEXT NOT NULL,
+                                rarity INTEGER NOT NULL);
+        CREATE TABLE equipment_affix (equipment_id INTEGER NOT NULL REFERENCES equipment(id) ON DELETE CASCADE,
+                                      affix TEXT NOT NULL, value INTEGER NOT NULL);
+        CREATE INDEX equipment_affix_name ON equipment_affix (affix, value);
+    """)
+    items = {'a': random_items(30), 'b': random_items(20)}
+    for i in range(30):  # 两个档案交替插入
+        for profile in ('a', 'b'):
+            if i < len(items[profile]):
+                item = items[profile][i]
+                cur = conn.execute('INSERT INTO equipment (profile, type, rarity) VALUES (?, ?, ?)',
+                                   (profile, item['type'], item['rarity']))
+                conn.executemany('INSERT INTO equipment_affix VALUES (?, ?, ?)',
+                                 [(cur.lastrowid, affix, value) for affix, value in item['affixes'].items()])
+    conn.commit()
+    conn.close()
+    for profile in ('a', 'b'):
+        store = profiledb.SQLiteProfileStore(path, profile)
+        view = store.load()['equipment_storage']
+        assert list(view) == items[profile]
+        assert view[len(view) - 1] == items[profile][-1]
+        view.append(items[profile][0])
+        assert view[len(items[profile])] == items[profile][0]
+        store.close()
+    conn = sqlite3.connect(path)
+    names = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    conn.close()
+    assert 'equipment_affix_name' not in names and 'equipment_affix_key' in names
@@ -0,0 +1,169 @@
+# tests/test_save.py
+"""存档：二进制快照与依赖存档的批量工具"""
+import json, pickle, re, threading
+
+import pytest
+
+import dungeon
+import batch
+
+
+def binary_save(save_dir, items=dungeon.BINARY_THRESHOLD):
+    """写入一份仓库足够大、会存成二进制的存档，返回重新读取的结果"""
+    save = dungeon.new_save()
+    save['equipment_storage'] = [dungeon.Equipment(dungeon.Equipment.TYPES[i % 2], i % 3).to_dict()
+                                 for i in range(items)]
+    dungeon.save_save(save)
+    assert (save_dir / 'save.bin').exists()
+    return dungeon.load_save()
+
+
+def test_equipment_rows_pickle(save_dir):
+    storage = binary_save(save_dir)['equipment_storage']
+    assert isinstance(storage, dungeon.EquipmentRows)
+    storage.append({'type': '武器', 'rarity': 2, 'affixes': {'力量': 9}})
+    copy = pickle.loads(pickle.dumps(storage))
+    assert isinstance(copy, dungeon.EquipmentRows)
+    assert copy == storage
+    assert copy.index.select([('affix', '力量')], '力量', 0, 1) == storage.index.select([('affix', '力量')], '力量', 0, 1)
+    assert json.loads(json.dumps(storage.to_list())) == list(storage)
+
+
+def test_unknown_affix_rejected(save_dir):
+    storage = binary_save(save_dir)['equipment_storage']
+    with pytest.raises(ValueError):
+        storage.append({'type': '武器', 'rarity': 2, 'affixes': {'攻击': 9}})
+    with pytest.raises(ValueError):
+        dungeon.encode_binary_save(dict(dungeon.new_save(),
+                                        equipment_storage=[{'type': '武器', 'rarity': 0, 'affixes': {'攻击': 1}}]))
+    assert len(storage) == dungeon.BINARY_THRESHOLD
+
+
+def test_batch_on_binary_save(save_dir, capsys):
+    binary_save(save_dir)
+    outputs = []
+    for workers in ('1', '2'):
+        batch.main(['-n', '40', '-j', workers])
+        outputs.append(json.loads(capsys.readouterr().out))
+    assert outputs[0]['runs'] == 40
+    assert outputs[0] == outputs[1]
+
+
+def test_journal_drops_torn_line(save_dir):
+    save = dungeon.load_save()
+    dungeon.update_save(save, ('add', ['fragments'], 5))
+    dungeon.update_save(save, ('add', ['fragments'], 7), ('add', ['records', 'total_runs'], 1))
+    dungeon.save_writer.flush()
+    # 模拟写到一半时崩溃：最后一条记录只写进了一部分
+    with open(save_dir / 'save.journal', 'a', encoding='utf-8') as f:
+        f.write('{"seq":3,"changes":[["add",["fra')
+    loaded = dungeon.load_save()
+    assert loaded['fragments'] == 12
+    assert loaded['records']['total_runs'] == 1
+    assert loaded['journal_seq'] == 2
+    # 读取时立即写成新快照，残缺的记录不会留在日志里
+    assert (save_dir / 'save.journal').read_text(encoding='utf-8') == ''
+    assert dungeon.load_save() == loaded
+
+
+def test_migrate_v1_save(save_dir):
+    old = {'fragments': 30, 'shop': {'atk+5': 2}, 'records': {'highest_wave': 7}}
+    (save_dir / 'save.json').write_text(json.dumps(old), encoding='utf-8')
+    loaded = dungeon.load_save()
+    assert loaded['version'] == dungeon.SAVE_VERSION
+    assert loaded['fragments'] == 30
+    assert loaded['shop'] == {'atk+5': 2, 'hp+20': 0, 'potion+1': 0}
+    assert loaded['records']['highest_wave'] == 7
+    assert loaded['talent_tree'] == dungeon.new_save()['talent_tree']
+    assert loaded['equipment_storage'] == []
+    # 迁移后的存档已经写回磁盘，下次读取不再迁移
+    assert json.loads((save_dir / 'save.json').read_text(encoding='utf-8'))['version'] == dungeon.SAVE_VERSION
+    assert not dungeon.migrate_save(dungeon.load_save())
+
+
+def test_binary_round_trip_append_and_compact(save_dir, rng_state):
+    rng_state.seed(2)
+    items = [dungeon.Equipment(dungeon.rng.choice(dungeon.Equipment.TYPES), dungeon.rng.randrange(3)).to_dict()
+             for _ in range(dungeon.BINARY_THRESHOLD)]
+    save = dungeon.new_save()
+    save['equipment_storage'] = items
+    dungeon.save_save(save)
+    assert not (save_dir / 'save.json').exists()
+    save = dungeon.load_save()
+    assert isinstance(save['equipment_storage'], dungeon.EquipmentRows)
+    assert list(save['equipment_storage']) == items
+
+    # 追加只写日志，重新读取时在二进制快照上重放
+    item = {'type': '护甲', 'rarity': 1, 'affixes': {'生命': 12, '反伤': 3}}
+    dungeon.update_save(save, ('append', ['equipment_storage'], item), ('add', ['fragments'], 4))
+    dungeon.save_writer.flush()
+    assert (save_dir / 'save.journal').read_text(encoding='utf-8').count('\n') == 1
+    loaded = dungeon.load_save()
+    assert list(loaded['equipment_storage']) == items + [item]
+    assert loaded['fragments'] == 4
+
+    # 日志累计 COMPACT_EVERY 条记录（含读取时重放的那条）后合并为快照并清空日志
+    for _ in range(dungeon.COMPACT_EVERY - 1):
+        dungeon.update_save(loaded, ('add', ['fragments'], 1))
+    dungeon.save_writer.flush()
+    assert (save_dir / 'save.journal').read_text(encoding='utf-8') == ''
+    with open(save_dir / 'save.bin', 'rb') as f:
+        snapshot = dungeon.decode_binary_save(f.read())
+    assert snapshot['fragments'] == 3 + dungeon.COMPACT_EVERY
+    assert dungeon.load_save() == loaded
+
+
+def test_writer_counters_under_concurrency(save_dir):
+    """多个线程同时提交记录、快照并 flush，每次提交要么写盘要么计入合并"""
+    writer = dungeon.SaveWriter()
+    writer.DEBOUNCE = 0
+    snapshot = dungeon.encode_snapshot(dungeon.new_save())
+
+    def work(i):
+        for j in range(40):
+            if j % 7 == i:
+                writer.submit_snapshot(snapshot)
+            else:
+                writer.submit('{}')
+            if j % 5 == 0:
+                writer.flush()
+
+    threads = [threading.Thread(target=work, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    writer.flush()
+    stats = writer.stats()
+    assert stats['submitted'] == 160
+    assert stats['writes'] + stats['coalesced'] == stats['submitted']
+
+
+@pytest.mark.parametrize('items', [10, dungeon.BINARY_THRESHOLD])
+def test_forge_menu_reforges_stored_item(save_dir, rng_state, scripted_ui, items):
+    """从主菜单进入铁匠铺，重铸仓库里的装备并花费存档中的碎片，重新读取后结果仍在"""
+    rng_state.seed(5)
+    save = dungeon.new_save()
+    save['fragments'] = 40 * dungeon.REFORGE_COST
+    save['equipment_storage'] = [dungeon.Equipment('武器', 0, {'生命': 1}).to_dict() for _ in range(items)]
+    dungeon.save_save(save)
+    strength = str(dungeon.Equipment.AFFIX_NAMES.index('力量') + 1)
+    # 主菜单 3) 铁匠铺：批量重铸最后一件直到力量 ≥ 2，再单次重铸第一件，返回后退出
+    ui = scripted_ui(['3', '2', str(items), strength, '2', 'y', '1', '1', '0', '7'])
+    with pytest.raises(SystemExit):
+        dungeon.run()
+    assert not ui.answers
+    spent = int(re.search(r'花费 (\d+) 碎片，', '\n'.join(ui.output)).group(1))
+    dungeon.save_writer.flush()
+
+    loaded = dungeon.load_save()
+    storage = loaded['equipment_storage']
+    assert 0 < spent < 40 * dungeon.REFORGE_COST
+    assert loaded['fragments'] == 40 * dungeon.REFORGE_COST - spent - dungeon.REFORGE_COST
+    assert storage[items - 1]['affixes'].get('力量', 0) >= 2
+    assert storage[0] != save['equipment_storage'][0]
+    assert list(storage[1:items - 1]) == save['equipment_storage'][1:items - 1]
+    # 二进制存档：读取时重放到定长行上，索引和重新编码的快照都看到重铸后的词条
+    assert items - 1 in dungeon.warehouse_index(storage).select([('affix', '力量')], limit=items)[1]
+    snapshot = dungeon.decode_binary_save(dungeon.encode_binary_save(loaded))
+    assert list(snapshot['equipment_storage']) == list(storage)
@@ -0,0 +1,25 @@
+# tests/test_sim.py
+"""无头模拟：同一种子和策略得到逐位相同的结果"""
+import io
+
+import dungeon
+import sim
+
+
+def test_simulate_is_deterministic(rng_state):
+    save = dungeon.new_save()
+    for seed in (1, 'abc', 12345):
+        first = vars(sim.simulate(save, seed=seed))
+        assert vars(sim.simulate(save, seed=seed)) == first
+    assert save == dungeon.new_save()  # 只在副本上结算
+
+
+def test_jsonl_log_is_deterministic(rng_state):
+    logs = []
+    for _ in range(2):
+        out = io.StringIO()
+        ui = sim.JsonlUI(sim.Policy(hero_class='2', path='2'), out, seed=3)
+        sim.simulate(dungeon.new_save(), seed=3, ui=ui)
+        ui.flush()
+        logs.append(out.getvalue())
+    assert logs[0] and logs[0] == logs[1]
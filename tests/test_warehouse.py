@@ -0,0 +1,57 @@
+# tests/test_warehouse.py
+"""仓库索引：矩阵评分选出的最佳装备与逐件 Equipment.score 一致"""
+import pytest
+
+import dungeon
+
+
+def test_best_matches_brute_force(rng_state):
+    pytest.importorskip('numpy')
+    rng_state.seed(4)
+    storage = [dungeon.Equipment(dungeon.rng.choice(dungeon.Equipment.TYPES), dungeon.rng.randrange(3)).to_dict()
+               for _ in range(500)]
+    index = dungeon.WarehouseIndex(storage)
+    for hero in (dungeon.Warrior(dungeon.new_save()), dungeon.Mage(dungeon.new_save())):
+        weights = hero.affix_weights()
+        scores = [dungeon.Equipment.from_dict(item).score(weights) for item in storage]
+        for type_ in dungeon.Equipment.TYPES:
+            # 同分时下标小的在前；分数取整到 1e-9，避免求和顺序不同带来的误差影响排序
+            expected = sorted((i for i, item in enumerate(storage) if item['type'] == type_),
+                              key=lambda i: (-round(scores[i], 9), i))[:5]
+            best = index.best(weights, type_, limit=5)
+            assert [i for i, _ in best] == expected
+            assert [score for _, score in best] == pytest.approx([scores[i] for i in expected])
+
+
+def test_index_built_on_load_matches_list(rng_state):
+    rng_state.seed(9)
+    storage = [dungeon.Equipment(dungeon.rng.choice(dungeon.Equipment.TYPES), dungeon.rng.randrange(3)).to_dict()
+               for _ in range(600)]
+    storage[3]['affixes']['力量'] = 300  # 镜像事件翻倍后的大数值
+    payload = dungeon.encode_binary_save(dict(dungeon.new_save(), equipment_storage=storage[:500]))
+    rows = dungeon.decode_binary_save(payload)['equipment_storage']
+    for item in storage[500:]:
+        rows.append(item)  # 存入的装备同步进读取时建好的索引
+    expected = dungeon.WarehouseIndex(storage)
+    assert dungeon.warehouse_index(rows) is rows.index
+    affixes = dungeon.Equipment.AFFIX_NAMES
+    for filters in ((), [('type', '武器')], [('rarity', 2), ('affix', affixes[1])]):
+        for sort_affix in (None, *affixes):
+            for offset in (0, 10, 250):
+                assert (rows.index.select(filters, sort_affix, offset)
+                        == expected.select(filters, sort_affix, offset))
+        # 按数值降序、同值时下标小的在前
+        values = [item['affixes'].get(affixes[0], 0) for item in storage]
+        total, page = expected.select(filters, affixes[0], 0, len(storage))
+        assert page == sorted(page, key=lambda i: (-values[i], i))
+
+
+def test_warehouse_screen_on_list_storage(rng_state, scripted_ui):
+    """JSON 存档的仓库是普通列表，筛选和排序时当场建立索引"""
+    rng_state.seed(6)
+    save = dungeon.new_save()
+    save['equipment_storage'] = [dungeon.Equipment('护甲', i % 3).to_dict() for i in range(30)]
+    ui = scripted_ui(['r', 's', '0'])  # 按稀有度筛选、按词条排序、返回
+    dungeon.equipment_storage(save)
+    assert not ui.answers
+    assert any(line.startswith('共 10 件') and '按' in line for line in ui.output)
@@ -0,0 +1,134 @@
+# vcombat.py
+"""NumPy 批量战斗结算：把大量英雄/怪物对战存为数组，逐回合同步推进
+
+与 game() 中的战斗循环使用相同的规则：power() 攻击力、25% 天赋暴击、
+法师魔法飞弹、护盾 -5 减伤、恶魔契约 1.5 倍受伤、反伤和击杀后的吸血。
+英雄的操作固定为 sim.Policy 的默认行为：血量低于阈值且有血瓶时喝药，否则攻击。
+随机数来自 numpy Generator，因此与单局游戏统计分布一致但不逐位相同。
+"""
+import sys, time
+
+import numpy as np
+
+import dungeon
+
+HERO_FIELDS = ('hp', 'max_hp', 'power', 'crit', 'magic_chance', 'magic_dmg',
+               'shield', 'demon', 'thorns', 'lifesteal', 'lifesteal_talent', 'potions')
+MONSTER_FIELDS = ('hp', 'atk')
+
+
+def from_pairs(pairs):
+    """把 (Character, Monster) 列表转换为 resolve() 需要的两组数组"""
+    hero_cols = {field: [] for field in HERO_FIELDS}
+    monster_cols = {field: [] for field in MONSTER_FIELDS}
+    for hero, monster in pairs:
+        is_mage = isinstance(hero, dungeon.Mage)
+        hero_cols['hp'].append(hero.hp)
+        hero_cols['max_hp'].append(hero.max_hp)
+        hero_cols['power'].append(hero.power())
+        hero_cols['crit'].append('暴击' in hero.talents)
+        hero_cols['magic_chance'].append(hero.magic_chance if is_mage else 0.0)
+        hero_cols['magic_dmg'].append(
+            int((10 + hero.attrs['智力'] * 3) * (1 + hero.spell_power)) if is_mage else 0)
+        hero_cols['shield'].append('护盾' in hero.talents)
+        hero_cols['demon'].append(hero.event_flags['demon_pact'])
+        hero_cols['thorns'].append(hero.thorns)
+        hero_cols['lifesteal'].append(hero.lifesteal)
+        hero_cols['lifesteal_talent'].append('吸血' in hero.talents)
+        hero_cols['potions'].append(hero.items['血瓶'])
+        monster_cols['hp'].append(monster.hp)
+        monster_cols['atk'].append(monster.atk)
+    return ({k: np.asarray(v) for k, v in hero_cols.items()},
+            {k: np.asarray(v) for k, v in monster_cols.items()})
+
+
+def resolve(heroes, monsters, rng=None, potion_threshold=0.35, max_turns=1000):
+    """同步推进所有战斗直到每一场分出胜负，返回结果数组字典
+
+    heroes/monsters 为字段名到等长数组的字典（字段见 HERO_FIELDS/MONSTER_FIELDS）。
+    结果包含 won（怪物被击败）、hero_hp、monster_hp、potions、turns、last_dmg；
+    won 且 hero_hp > 0 才算英雄存活，和 game() 的判定顺序一致。
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    hp = np.array(heroes['hp'], dtype=np.int64)
+    max_hp = np.asarray(heroes['max_hp'], dtype=np.int64)
+    power = np.asarray(heroes['power'], dtype=np.int64)
+    crit = np.asarray(heroes['crit'], dtype=bool)
+    magic_chance = np.asarray(heroes['magic_chance'], dtype=np.float64)
+    magic_dmg = np.asarray(heroes['magic_dmg'], dtype=np.int64)
+    thorns = np.asarray(heroes['thorns'], dtype=np.int64)
+    lifesteal = np.asarray(heroes['lifesteal'], dtype=np.float64)
+    potions = np.array(heroes['potions'], dtype=np.int64)
+    monster_hp = np.array(monsters['hp'], dtype=np.int64)
+    n = monster_hp.size
+
+    # 反击伤害在整场战斗中不变，预先算好
+    counter = np.asarray(monsters['atk'], dtype=np.int64)
+    counter = np.where(heroes['shield'], np.maximum(1, counter - 5), counter)
+    counter = np.where(heroes['demon'], (counter * 1.5).astype(np.int64), counter)
+
+    turns = np.zeros(n, dtype=np.int64)
+    last_dmg = np.zeros(n, dtype=np.int64)
+    active = np.flatnonzero((monster_hp > 0) & (hp > 0))
+    for _ in range(max_turns):
+        if not active.size:
+            break
+        turns[active] += 1
+
+        # 喝药的回合怪物不反击
+        drink = (potions[active] > 0) & (hp[active] < max_hp[active] * potion_threshold)
+        drinkers = active[drink]
+        hp[drinkers] += np.minimum(40, max_hp[drinkers] - hp[drinkers])
+        potions[drinkers] -= 1
+
+        attackers = active[~drink]
+        dmg = power[attackers].copy()
+        dmg[crit[attackers] & (rng.random(attackers.size) < 0.25)] *= 2
+        dmg += np.where(rng.random(attackers.size) < magic_chance[attackers], magic_dmg[attackers], 0)
+        monster_hp[attackers] -= dmg
+        last_dmg[attackers] = dmg
+
+        # 本回合没被打死的怪物先吃反伤再反击
+        struck = attackers[monster_hp[attackers] > 0]
+        monster_hp[struck] -= thorns[struck]
+        hp[struck] -= counter[struck]
+
+        active = active[(monster_hp[active] > 0) & (hp[active] > 0)]
+
+    # 击杀后的吸血在死亡判定之前结算
+    won = monster_hp <= 0
+    leech = won & (np.asarray(heroes['lifesteal_talent'], dtype=bool) | (lifesteal > 0))
+    heal = np.minimum(10 + (lifesteal * last_dmg).astype(np.int64), max_hp - hp)
+    hp = np.where(leech, hp + heal, hp)
+
+    return {'won': won, 'hero_hp': hp, 'monster_hp': monster_hp, 'potions': potions,
+            'turns': turns, 'last_dmg': last_dmg}
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='批量战斗结算基准')
+    parser.add_argument('-n', '--fights', type=int, default=1_000_000, help='战斗场数')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--mage', action='store_true', help='使用法师（默认战士）')
+    args = parser.parse_args(argv)
+
+    save = dungeon.load_save()
+    hero = dungeon.Mage(save) if args.mage else dungeon.Warrior(save)
+    heroes, _ = from_pairs([(hero, dungeon.Monster(*dungeon.NORMAL_NAMES[0]))])
+    heroes = {k: np.repeat(v, args.fights) for k, v in heroes.items()}
+    rng = np.random.default_rng(args.seed)
+    table = np.array([(hp, atk) for _, hp, atk, _ in dungeon.NORMAL_NAMES])
+    picks = table[rng.integers(len(table), size=args.fights)]
+    monsters = {'hp': picks[:, 0], 'atk': picks[:, 1]}
+
+    start = time.perf_counter()
+    result = resolve(heroes, monsters, rng)
+    elapsed = time.perf_counter() - start
+    print(f'{args.fights} 场战斗，用时 {elapsed:.3f}s（{args.fights / elapsed:,.0f} 场/秒）')
+    print(f'胜率 {np.mean(result["won"] & (result["hero_hp"] > 0)):.2%}，'
+          f'平均回合 {result["turns"].mean():.2f}')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])